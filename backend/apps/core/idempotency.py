@@ -0,0 +1,193 @@
+"""
+``Idempotency-Key`` support for mutating API requests.
+
+A client that may retry a POST, PUT or PATCH sends the same
+``Idempotency-Key`` header on every attempt. The first response is stored in
+the cache (Redis) for ``IDEMPOTENCY_KEY_TTL`` seconds and repeats of the
+request are answered from it without running the view again. Keys are
+scoped to the authenticated principal, the API key if one was used and the
+user otherwise, so two clients can use the same key. Anonymous requests are
+not deduplicated.
+
+While the first request is still running, a lock taken with ``cache.add``
+(``SET NX``) makes duplicates wait for its response instead of executing
+concurrently; if it ends without a stored response, one of them runs
+instead. The lock is renewed while the view runs, so a view slower than
+``IDEMPOTENCY_LOCK_TIMEOUT`` does not let a duplicate in; the timeout only
+frees keys of workers that died. Reusing a key for a different request is an
+error.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .redis_client import RedisError
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+METHODS = {'POST', 'PUT', 'PATCH'}
+MAX_KEY_LENGTH = 255
+# Response headers worth replaying
+REPLAYED_HEADERS = ('Location', 'Content-Language')
+# Returned by ``_wait_for`` when the lock went away without a response
+RELEASED = object()
+
+
+def _principal(request):
+    """Return ``key:<id>`` or ``user:<id>`` for the caller, ``None`` if anonymous."""
+    api_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user, auth = api_request.user, api_request.auth
+    except APIException:
+        # The view rejects the credentials itself
+        return None
+    if not user or not user.is_authenticated:
+        return None
+    # API keys are model instances, JWTs are tokens without a primary key
+    if getattr(auth, 'pk', None) is not None:
+        return f'key:{auth.pk}'
+    return f'user:{user.pk}'
+
+
+class _LockRenewal:
+    """Keep an idempotency lock alive from a thread while the view runs."""
+
+    def __init__(self, lock_key):
+        self.lock_key = lock_key
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        timeout = settings.IDEMPOTENCY_LOCK_TIMEOUT
+        while not self.stopped.wait(timeout / 3):
+            try:
+                cache.touch(self.lock_key, timeout)
+            except RedisError:
+                logger.warning("Could not renew idempotency lock", exc_info=True)
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method, request.get_full_path()):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(stored):
+    response = HttpResponse(stored['content'], status=stored['status'],
+                            content_type=stored['content_type'])
+    for name, value in stored['headers'].items():
+        response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _mismatch():
+    return JsonResponse({"error": "Idempotency-Key was already used for a different request."}, status=422)
+
+
+class IdempotencyMiddleware:
+    """
+    Replay stored responses of repeated mutating ``/api/`` requests that
+    carry an ``Idempotency-Key`` header. Without Redis requests run normally.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.META.get(HEADER)
+        if not key or request.method not in METHODS or not request.path.startswith('/api/'):
+            return self.get_response(request)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({"error": f"Idempotency-Key may be at most {MAX_KEY_LENGTH} characters."},
+                                status=400)
+
+        principal = _principal(request)
+        if principal is None:
+            return self.get_response(request)
+
+        cache_key = f'idempotency:{principal}:{hashlib.sha256(key.encode()).hexdigest()}'
+        lock_key = f'{cache_key}:lock'
+        fingerprint = _fingerprint(request)
+        try:
+            while True:
+                stored = cache.get(cache_key)
+                if stored is not None or cache.add(lock_key, fingerprint, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                    break
+                stored = self._wait_for(cache_key, lock_key)
+                if stored is None:
+                    return JsonResponse({"error": "A request with this Idempotency-Key is in progress."},
+                                        status=409)
+                if stored is not RELEASED:
+                    break
+                # The first request stored nothing (a server error or a
+                # stream), so this one may run instead
+        except RedisError:
+            logger.warning("Idempotency store unavailable, running request without it", exc_info=True)
+            return self.get_response(request)
+        if stored is not None:
+            return _replay(stored) if stored['fingerprint'] == fingerprint else _mismatch()
+
+        try:
+            with _LockRenewal(lock_key):
+                response = self.get_response(request)
+            self._store(cache_key, fingerprint, response)
+            return response
+        finally:
+            try:
+                cache.delete(lock_key)
+            except RedisError:
+                logger.warning("Could not release idempotency lock", exc_info=True)
+
+    def _wait_for(self, cache_key, lock_key):
+        """
+        Poll for the response of the request holding the lock. Returns
+        ``RELEASED`` if the lock is released without a stored response, and
+        ``None`` if it is still held after ``IDEMPOTENCY_WAIT_TIMEOUT``.
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return stored
+            if cache.get(lock_key) is None:
+                # The response is stored before the lock is released
+                return cache.get(cache_key) or RELEASED
+        return None
+
+    def _store(self, cache_key, fingerprint, response):
+        # Server errors and streams are not stored; retrying those may succeed
+        if response.status_code >= 500 or response.streaming:
+            return
+        stored = {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'content_type': response.get('Content-Type', 'application/json'),
+            'content': response.content,
+            'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+        }
+        try:
+            cache.set(cache_key, stored, settings.IDEMPOTENCY_KEY_TTL)
+        except RedisError:
+            logger.warning("Could not store idempotent response", exc_info=True)
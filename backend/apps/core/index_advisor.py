@@ -0,0 +1,251 @@
+"""
+Query-plan-driven index advisor.
+
+Walks every registered viewset, builds the queries its ``filterset_fields``,
+``ordering_fields`` and ``search_fields`` can produce with values sampled from
+the table, and asks Postgres for their plans. A candidate is reported when the
+planner still needs a sequential scan (or a sort) with ``enable_seqscan`` off,
+which means no usable index exists whatever the current table size.
+
+Candidates are ranked by the plan cost at the table's real size and, when the
+``pg_stat_statements`` extension is installed, by how much time matching
+statements actually spend.
+"""
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DatabaseError, connection, transaction
+from django.db.models import ForeignKey
+
+SAMPLE_PERCENT = 1
+
+
+@dataclass
+class Candidate:
+    model: type
+    columns: list
+    reason: str
+    kind: str = 'btree'
+    viewsets: set = field(default_factory=set)
+    cost: float = 0.0
+    calls: int = 0
+    total_ms: float = 0.0
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def score(self):
+        return self.cost * (1 + self.calls) + self.total_ms * 1000
+
+    def index_name(self):
+        name = '_'.join([self.model._meta.model_name[:10]] + [c[:8] for c in self.columns]) + '_idx'
+        return name[:30]
+
+    def migration_line(self):
+        fields = [self.field_name(c) for c in self.columns]
+        if self.kind == 'trigram':
+            return (f"GinIndex(fields={fields!r}, opclasses=['gin_trgm_ops'], "
+                    f"name={self.index_name()!r})  # requires pg_trgm")
+        return f"models.Index(fields={fields!r}, name={self.index_name()!r})"
+
+    def field_name(self, column):
+        for model_field in self.model._meta.concrete_fields:
+            if model_field.column == column:
+                return model_field.name
+        return column.lstrip('-')
+
+    def as_dict(self):
+        return {
+            'table': self.table,
+            'columns': self.columns,
+            'kind': self.kind,
+            'reason': self.reason,
+            'viewsets': sorted(self.viewsets),
+            'plan_cost': round(self.cost, 2),
+            'calls': self.calls,
+            'total_ms': round(self.total_ms, 2),
+            'score': round(self.score, 2),
+            'suggestion': self.migration_line(),
+        }
+
+
+def registered_viewsets(routers):
+    """Yield each distinct viewset class registered on ``routers``."""
+    seen = set()
+    for router in routers:
+        for _prefix, viewset, _basename in router.registry:
+            if viewset not in seen and getattr(viewset, 'queryset', None) is not None:
+                seen.add(viewset)
+                yield viewset
+
+
+def local_field(model, name):
+    """Return the concrete field for ``name`` on ``model``, or None for lookups across relations."""
+    name = name.lstrip('-^=@$')
+    if '__' in name:
+        return None
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def existing_indexes(table):
+    """Return the column lists of every index on ``table``."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [c['columns'] for c in constraints.values() if c.get('index') or c.get('unique') or c.get('primary_key')]
+
+
+def is_covered(columns, indexes):
+    return any(index[:len(columns)] == columns for index in indexes)
+
+
+def sample_value(model, model_field):
+    """
+    Pick a non-null value of ``model_field``, preferring a random table sample.
+
+    A foreign key that is null everywhere is sampled from the referenced
+    table instead, so the plan is that of an equality lookup, not IS NULL.
+    Returns ``None`` when there is nothing to sample.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model_field.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {column} FROM {table} TABLESAMPLE SYSTEM (%s) WHERE {column} IS NOT NULL LIMIT 1",
+            [SAMPLE_PERCENT],
+        )
+        row = cursor.fetchone()
+    if row:
+        return row[0]
+    attname = model_field.attname
+    value = (model._base_manager.exclude(**{f'{attname}__isnull': True})
+             .values_list(attname, flat=True).first())
+    if value is None and isinstance(model_field, ForeignKey):
+        target = model_field.target_field
+        value = model_field.related_model._base_manager.values_list(target.attname, flat=True).first()
+    return value
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(queryset, seqscan=True):
+    """Return the root plan node of ``queryset`` as a dict."""
+    with transaction.atomic():
+        if not seqscan:
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        output = queryset.explain(format='json')
+    plan = json.loads(output) if isinstance(output, str) else output
+    return plan[0]['Plan']
+
+
+def needs_index(plan, table, for_sort=False):
+    """True if ``plan`` scans ``table`` sequentially (or sorts it) despite seqscan being discouraged."""
+    for node in plan_nodes(plan):
+        if for_sort and node.get('Node Type') in ('Sort', 'Incremental Sort'):
+            return True
+        if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') == table:
+            if for_sort or 'Filter' in node:
+                return True
+    return False
+
+
+def table_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [table])
+        row = cursor.fetchone()
+    return max(row[0], 0) if row else 0
+
+
+def statement_stats(table, column):
+    """Return ``(calls, total_ms)`` of statements touching ``table.column``, or zeros."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+        if cursor.fetchone() is None:
+            return 0, 0.0
+        pattern = f'%"{table}"%"{column}"%'
+        # The column was renamed in pg_stat_statements 1.8 (Postgres 13)
+        for time_column in ('total_exec_time', 'total_time'):
+            try:
+                with transaction.atomic():
+                    cursor.execute(
+                        f"SELECT COALESCE(SUM(calls), 0), COALESCE(SUM({time_column}), 0) "
+                        f"FROM pg_stat_statements WHERE query ILIKE %s",
+                        [pattern],
+                    )
+                    calls, total = cursor.fetchone()
+                return int(calls), float(total)
+            except DatabaseError:
+                # Unknown column, or the view is not readable by this role
+                continue
+    return 0, 0.0
+
+
+def analyse_viewset(viewset, candidates):
+    """Add index candidates for one viewset to ``candidates`` (keyed by table and columns)."""
+    base = viewset.queryset.all()
+    model = base.model
+    table = model._meta.db_table
+    indexes = existing_indexes(table)
+    name = viewset.__name__
+
+    def consider(columns, reason, queryset, kind='btree', for_sort=False):
+        key = (table, tuple(columns), kind)
+        if key in candidates:
+            candidates[key].viewsets.add(name)
+            return
+        if kind == 'btree' and is_covered(columns, indexes):
+            return
+        if not needs_index(explain(queryset, seqscan=False), table, for_sort=for_sort):
+            return
+        candidate = Candidate(model=model, columns=columns, reason=reason, kind=kind, viewsets={name})
+        candidate.cost = explain(queryset)['Total Cost']
+        candidate.calls, candidate.total_ms = statement_stats(table, columns[0].lstrip('-'))
+        candidates[key] = candidate
+
+    filter_fields = [f for f in (local_field(model, n) for n in getattr(viewset, 'filterset_fields', []) or []) if f]
+    ordering_fields = [f for f in (local_field(model, n) for n in getattr(viewset, 'ordering_fields', []) or []) if f]
+    search_fields = [f for f in (local_field(model, n) for n in getattr(viewset, 'search_fields', []) or []) if f]
+
+    samples = {}
+    for model_field in filter_fields:
+        value = sample_value(model, model_field)
+        if value is None:
+            continue
+        samples[model_field] = value
+        queryset = base.filter(**{model_field.attname: value})
+        consider([model_field.column], f"filter on {model_field.name}", queryset)
+
+    for model_field in ordering_fields:
+        queryset = base.order_by(f'-{model_field.attname}')[:20]
+        consider([model_field.column], f"ordering by {model_field.name}", queryset, for_sort=True)
+        for filter_field, value in samples.items():
+            if filter_field == model_field:
+                continue
+            queryset = base.filter(**{filter_field.attname: value}).order_by(f'-{model_field.attname}')[:20]
+            consider([filter_field.column, model_field.column],
+                     f"filter on {filter_field.name} ordered by {model_field.name}", queryset, for_sort=True)
+
+    for model_field in search_fields:
+        queryset = base.filter(**{f'{model_field.attname}__icontains': 'sample'})
+        consider([model_field.column], f"search on {model_field.name} (ILIKE '%...%')", queryset, kind='trigram')
+
+
+def advise(routers):
+    """Return index candidates for every viewset on ``routers``, best first."""
+    candidates = {}
+    for viewset in registered_viewsets(routers):
+        analyse_viewset(viewset, candidates)
+    rows = {}
+    for candidate in candidates.values():
+        rows.setdefault(candidate.table, table_rows(candidate.table))
+    return sorted(candidates.values(), key=lambda c: c.score, reverse=True), rows
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.core.index_advisor import advise
+
+
+class Command(BaseCommand):
+    help = "Suggest missing indexes from the query plans of every registered viewset"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['text', 'json'], default='text',
+                            help="Report format (default: text)")
+        parser.add_argument('--limit', type=int, default=0,
+                            help="Only report the N highest ranked candidates")
+
+    def handle(self, *args, **options):
+        from config.urls import router as api_router
+        from apps.dpp.urls import router as dpp_router
+
+        candidates, rows = advise([dpp_router, api_router])
+        if options['limit']:
+            candidates = candidates[:options['limit']]
+
+        if options['format'] == 'json':
+            report = [dict(c.as_dict(), table_rows=int(rows[c.table])) for c in candidates]
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        if not candidates:
+            self.stdout.write(self.style.SUCCESS("No missing indexes found"))
+            return
+
+        for rank, candidate in enumerate(candidates, start=1):
+            data = candidate.as_dict()
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{rank}. {data['table']} ({', '.join(data['columns'])}) - {data['reason']}"
+            ))
+            self.stdout.write(
+                f"   rows ~{int(rows[candidate.table])}, plan cost {data['plan_cost']}, "
+                f"calls {data['calls']}, total {data['total_ms']} ms"
+            )
+            self.stdout.write(f"   used by: {', '.join(data['viewsets'])}")
+            self.stdout.write(f"   {data['suggestion']}")
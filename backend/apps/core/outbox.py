@@ -0,0 +1,103 @@
+"""
+Lease and back-off bookkeeping shared by the outbox tables.
+
+An outbox row is written in the transaction of the change it reports and
+handled later by a worker. Rows have ``attempts``, ``next_attempt_at``,
+``failed_at``, ``last_error`` and a timestamp set once they are done
+(``sent_at``, ``delivered_at``). Workers claim due rows by pushing their
+``next_attempt_at`` a lease into the future, so several workers can run side
+by side and one that dies leaves its rows to be picked up again when the
+lease runs out. Failures are retried with exponential back-off until
+``<PREFIX>_MAX_ATTEMPTS``.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+__all__ = ['Outbox']
+
+# Due rows, soonest first; ``{table}`` and ``{done}`` are filled in quoted
+CLAIM_SQL = """
+UPDATE {table} SET attempts = attempts + 1, next_attempt_at = %(lease_until)s
+WHERE id IN (
+    SELECT id FROM {table}
+    WHERE {done} IS NULL AND failed_at IS NULL AND next_attempt_at <= %(now)s
+    ORDER BY next_attempt_at
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id
+"""
+
+
+class Outbox:
+    """
+    Outbox of ``model``, whose rows are done once ``done_field`` is set.
+
+    Timings are read from the ``<prefix>_LEASE``, ``<prefix>_BACKOFF_BASE``,
+    ``<prefix>_BACKOFF_MAX`` and ``<prefix>_MAX_ATTEMPTS`` settings.
+    ``claim_sql`` replaces the default claim query, e.g. to keep an order; it
+    is formatted with the quoted ``table`` and ``done`` names plus the
+    tables of the models in ``tables``, and must lease rows with the
+    ``now``, ``lease_until`` and ``limit`` parameters and return their ids.
+    """
+
+    def __init__(self, model, done_field, prefix, claim_sql=CLAIM_SQL, tables=None):
+        self.model = model
+        self.done_field = done_field
+        self.prefix = prefix
+        self.claim_sql = claim_sql
+        self.tables = tables or {}
+
+    def setting(self, name):
+        return getattr(settings, f'{self.prefix}_{name}')
+
+    def backoff(self, attempts):
+        """Delay before attempt ``attempts + 1``, doubling up to a cap, with jitter."""
+        delay = min(self.setting('BACKOFF_BASE') * 2 ** (attempts - 1), self.setting('BACKOFF_MAX'))
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def claim(self, limit):
+        """Lease up to ``limit`` due rows; returns them as a queryset in primary key order."""
+        now = timezone.now()
+        quote = connection.ops.quote_name
+        sql = self.claim_sql.format(
+            table=quote(self.model._meta.db_table),
+            done=quote(self.model._meta.get_field(self.done_field).column),
+            **{name: quote(model._meta.db_table) for name, model in self.tables.items()},
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, {
+                'now': now,
+                'lease_until': now + timedelta(seconds=self.setting('LEASE')),
+                'limit': limit,
+            })
+            ids = [row[0] for row in cursor.fetchall()]
+        return self.model.objects.filter(pk__in=ids).order_by('pk')
+
+    def complete(self, done, failed, **done_values):
+        """
+        Mark ``done`` rows, also setting ``done_values`` on them, and
+        reschedule or give up on ``failed`` ``(row, error)`` pairs.
+        """
+        now = timezone.now()
+        self.model.objects.filter(pk__in=[row.pk for row in done]).update(
+            **{self.done_field: now, 'last_error': ''}, **done_values
+        )
+        for row, error in failed:
+            row.last_error = error[:2000]
+            if row.attempts >= self.setting('MAX_ATTEMPTS'):
+                row.failed_at = now
+            else:
+                row.next_attempt_at = now + self.backoff(row.attempts)
+        self.model.objects.bulk_update([row for row, _ in failed], ['last_error', 'failed_at', 'next_attempt_at'])
+
+    def purge(self, before):
+        """Drop done and abandoned rows older than ``before``."""
+        return self.model.objects.filter(
+            Q(**{f'{self.done_field}__lt': before}) | Q(failed_at__lt=before)
+        ).delete()[0]
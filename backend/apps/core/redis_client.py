@@ -0,0 +1,90 @@
+"""
+Shared access to the Redis server that backs the default cache.
+
+The cache API is enough for plain key/value caching, but counters,
+HyperLogLogs and bitmaps need the raw client. Everything goes through
+``get_redis()`` so the connection pool configured in ``CACHES`` is reused.
+
+``Subscription`` follows a pub/sub channel from a daemon thread, for
+process-local state that other processes invalidate.
+"""
+import logging
+import threading
+import time
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+__all__ = ['get_redis', 'RedisError', 'Subscription']
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis():
+    """Return the raw Redis client used by the default cache."""
+    return get_redis_connection('default')
+
+
+class Subscription:
+    """
+    Follow ``channel`` from a daemon thread named ``name``, reconnecting
+    with exponential backoff.
+
+    Once subscribed, ``on_connect(redis)`` runs, e.g. to rebuild state from
+    keys; messages published meanwhile are passed to ``on_message(data)``
+    before ``on_ready()`` is called, and every later one as it arrives.
+    ``on_disconnect()`` runs when the subscription is lost, since messages
+    sent while disconnected are lost too.
+    """
+
+    def __init__(self, channel, name, on_message, on_connect=None, on_ready=None, on_disconnect=None):
+        self.channel = channel
+        self.name = name
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.on_ready = on_ready
+        self.on_disconnect = on_disconnect
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        """Start following the channel from this process, once."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._listen, name=self.name, daemon=True)
+                self.thread.start()
+
+    def _deliver(self, message):
+        if message['type'] == 'message':
+            self.on_message(message['data'].decode())
+
+    def _listen(self):
+        delay = 1
+        while True:
+            pubsub = None
+            try:
+                redis = get_redis()
+                pubsub = redis.pubsub()
+                pubsub.subscribe(self.channel)
+                if self.on_connect is not None:
+                    self.on_connect(redis)
+                message = pubsub.get_message(timeout=0)
+                while message is not None:
+                    self._deliver(message)
+                    message = pubsub.get_message(timeout=0)
+                if self.on_ready is not None:
+                    self.on_ready()
+                delay = 1
+                for message in pubsub.listen():
+                    self._deliver(message)
+            except Exception:  # noqa: BLE001 - the thread must outlive any Redis failure
+                logger.warning("Subscription to %s lost, reconnecting", self.channel, exc_info=True)
+            finally:
+                if self.on_disconnect is not None:
+                    self.on_disconnect()
+                if pubsub is not None:
+                    pubsub.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
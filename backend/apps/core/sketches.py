@@ -0,0 +1,148 @@
+"""
+Small probabilistic data structures used on hot request paths.
+
+``CountMinSketch`` and ``LocalBloomFilter`` hash with Python's built-in
+``hash`` and are therefore only meaningful inside one process.
+``BloomFilter`` uses a stable digest so its bit array can be shared between
+processes (e.g. mirrored in a Redis bitmap).
+"""
+import hashlib
+import math
+
+
+class CountMinSketch:
+    """
+    Approximate frequency counter with bounded memory.
+
+    Estimates never undercount. With ``width`` w and ``depth`` d the
+    overestimate is at most ``2N / w`` with probability ``1 - 2**-d``, where N
+    is the total count added.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def indexes(self, key):
+        """Return the counter index of ``key`` in every row."""
+        h1 = hash(key)
+        h2 = hash((key, 0x9E3779B9)) | 1
+        width = self.width
+        return [(h1 + i * h2) % width for i in range(self.depth)]
+
+    def add(self, key, count=1, indexes=None):
+        """
+        Add ``count`` occurrences of ``key`` and return the new estimate.
+
+        ``indexes`` may be passed to reuse hashes computed for a sketch of the
+        same shape.
+        """
+        estimate = None
+        for row, index in zip(self.rows, indexes or self.indexes(key)):
+            value = row[index] = row[index] + count
+            if estimate is None or value < estimate:
+                estimate = value
+        return estimate
+
+    def estimate(self, key, indexes=None):
+        """Return the estimated count for ``key``."""
+        return min(row[index] for row, index in zip(self.rows, indexes or self.indexes(key)))
+
+    def merge(self, other, sign=1):
+        """Add (or with ``sign=-1`` subtract) another sketch of the same shape."""
+        for row, other_row in zip(self.rows, other.rows):
+            for index, value in enumerate(other_row):
+                if value:
+                    row[index] += sign * value
+
+    def clear(self):
+        for row in self.rows:
+            row[:] = [0] * self.width
+
+
+def stable_offsets(key, size_bits, num_hashes):
+    """
+    Bloom filter bit offsets for ``key``, identical in every process.
+
+    Uses double hashing over a single blake2b digest.
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:], 'big') | 1
+    return [(h1 + i * h2) % size_bits for i in range(num_hashes)]
+
+
+class BloomFilter:
+    """
+    Set membership filter with no false negatives.
+
+    Bits are stored most-significant-bit first inside each byte, which matches
+    Redis ``GETBIT``/``SETBIT`` offsets, so ``bits`` can be loaded from or
+    written to a Redis string unchanged.
+    """
+
+    def __init__(self, size_bits, num_hashes, bits=None):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        nbytes = (size_bits + 7) // 8
+        if bits is None:
+            self.bits = bytearray(nbytes)
+        else:
+            self.bits = bytearray(bits[:nbytes])
+            self.bits.extend(bytes(nbytes - len(self.bits)))
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01):
+        """Build a filter sized for ``capacity`` items at ``error_rate`` false positives."""
+        size_bits, num_hashes = cls.optimal_size(capacity, error_rate)
+        return cls(size_bits, num_hashes)
+
+    @staticmethod
+    def optimal_size(capacity, error_rate):
+        capacity = max(int(capacity), 1)
+        size_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, int(round(size_bits / capacity * math.log(2))))
+        return size_bits, num_hashes
+
+    def offsets(self, key):
+        """Return the bit offsets for ``key``."""
+        return stable_offsets(key, self.size_bits, self.num_hashes)
+
+    def add(self, key, offsets=None):
+        """Add ``key``. Returns ``True`` if it was (probably) not present before."""
+        added = False
+        bits = self.bits
+        for offset in offsets or self.offsets(key):
+            mask = 0x80 >> (offset & 7)
+            if not bits[offset >> 3] & mask:
+                bits[offset >> 3] |= mask
+                added = True
+        return added
+
+    def contains(self, key, offsets=None):
+        bits = self.bits
+        return all(bits[offset >> 3] & (0x80 >> (offset & 7)) for offset in offsets or self.offsets(key))
+
+    def __contains__(self, key):
+        return self.contains(key)
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+
+
+class LocalBloomFilter(BloomFilter):
+    """
+    Bloom filter hashed with Python's built-in ``hash``.
+
+    Several times cheaper than ``BloomFilter`` but only valid inside one
+    process, so its bits must never be shared.
+    """
+
+    def offsets(self, key):
+        h1 = hash(key)
+        h2 = hash((key, 0x9E3779B9)) | 1
+        size = self.size_bits
+        return [(h1 + i * h2) % size for i in range(self.num_hashes)]
@@ -0,0 +1,70 @@
+import pytest
+from rest_framework.routers import DefaultRouter
+from apps.core import index_advisor
+from apps.core.index_advisor import Candidate, advise, is_covered, local_field, needs_index, sample_value
+from apps.dpp.models import Organization, SupplyChainEvent
+from apps.dpp.views import SupplyChainEventViewSet
+
+EVENTS = SupplyChainEvent._meta.db_table
+
+
+def seq_scan(table, **extra):
+    return dict({'Node Type': 'Seq Scan', 'Relation Name': table}, **extra)
+
+
+def test_needs_index_only_for_filtered_scans_and_sorts():
+    """Test which plans count as missing an index"""
+    filtered = {'Node Type': 'Limit', 'Plans': [seq_scan(EVENTS, Filter='(location = x)')]}
+    sorted_scan = {'Node Type': 'Sort', 'Plans': [seq_scan(EVENTS)]}
+
+    assert needs_index(filtered, EVENTS)
+    assert not needs_index(seq_scan(EVENTS), EVENTS)
+    assert not needs_index(filtered, 'other_table')
+    assert needs_index(sorted_scan, EVENTS, for_sort=True)
+    assert not needs_index({'Node Type': 'Index Scan', 'Relation Name': EVENTS}, EVENTS, for_sort=True)
+
+
+def test_existing_index_prefixes_cover_candidates():
+    """Test that a candidate is covered by any index starting with its columns"""
+    indexes = [['product_instance_id', 'date'], ['id']]
+
+    assert is_covered(['product_instance_id'], indexes)
+    assert is_covered(['product_instance_id', 'date'], indexes)
+    assert not is_covered(['date'], indexes)
+
+
+def test_candidate_suggestions():
+    """Test the migration line suggested for each kind of index"""
+    btree = Candidate(model=SupplyChainEvent, columns=['organization_id', 'date'], reason='')
+    trigram = Candidate(model=SupplyChainEvent, columns=['location'], reason='', kind='trigram')
+
+    assert btree.migration_line() == ("models.Index(fields=['organization', 'date'], "
+                                      f"name={btree.index_name()!r})")
+    assert len(btree.index_name()) <= 30
+    assert "opclasses=['gin_trgm_ops']" in trigram.migration_line()
+    assert local_field(SupplyChainEvent, '-date').name == 'date'
+    assert local_field(SupplyChainEvent, 'organization__name') is None
+    assert local_field(SupplyChainEvent, 'missing') is None
+
+
+@pytest.mark.django_db
+def test_null_foreign_keys_are_sampled_from_the_referenced_table():
+    """Test that an empty foreign key column still yields an equality lookup"""
+    organization = Organization.objects.create(name='E-Bikes Ltd')
+
+    assert sample_value(SupplyChainEvent, SupplyChainEvent._meta.get_field('organization')) == organization.pk
+    assert sample_value(SupplyChainEvent, SupplyChainEvent._meta.get_field('location')) is None
+
+
+@pytest.mark.django_db
+def test_advise_reports_unindexed_search(monkeypatch):
+    """Test that an ILIKE search without a trigram index is reported once per column"""
+    monkeypatch.setattr(index_advisor, 'statement_stats', lambda table, column: (0, 0.0))
+    router = DefaultRouter()
+    router.register('events', SupplyChainEventViewSet)
+
+    candidates, rows = advise([router])
+
+    found = {(c.table, tuple(c.columns), c.kind) for c in candidates}
+    assert (EVENTS, ('location',), 'trigram') in found
+    assert EVENTS in rows
@@ -6,10 +6,14 @@ from .models import (
     Certificate, 
     Product, 
     ProductMaterial, 
+    ProductComponent,
     ProductInstance, 
     SupplyChainEvent, 
     RepairRecord, 
-    RecyclingInstruction
+    RecyclingInstruction,
+    Recall,
+    RecallNotification,
+    WebhookSubscription
 )
 
 
@@ -18,6 +22,13 @@ class ProductMaterialInline(admin.TabularInline):
     extra = 1
 
 
+class ProductComponentInline(admin.TabularInline):
+    model = ProductComponent
+    fk_name = 'parent'
+    raw_id_fields = ('component',)
+    extra = 1
+
+
 class ProductInstanceInline(admin.TabularInline):
     model = ProductInstance
     extra = 0
@@ -66,7 +77,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'manufacturer', 'category', 'model_number', 'sku', 'is_active')
     list_filter = ('is_active', 'is_hazardous', 'manufacturer', 'category', 'created_at')
     search_fields = ('name', 'description', 'model_number', 'sku', 'barcode')
-    inlines = [ProductMaterialInline, ProductInstanceInline]
+    inlines = [ProductMaterialInline, ProductComponentInline, ProductInstanceInline]
     fieldsets = (
         (None, {
             'fields': ('name', 'description', 'manufacturer', 'category')
@@ -112,4 +123,26 @@ class RepairRecordAdmin(admin.ModelAdmin):
 class RecyclingInstructionAdmin(admin.ModelAdmin):
     list_display = ('product', 'recyclability_rating', 'created_at')
     list_filter = ('recyclability_rating', 'created_at')
-    search_fields = ('product__name', 'disassembly_steps', 'recyclable_parts', 'hazardous_parts') 
\ No newline at end of file
+    search_fields = ('product__name', 'disassembly_steps', 'recyclable_parts', 'hazardous_parts')
+
+
+class RecallNotificationInline(admin.TabularInline):
+    model = RecallNotification
+    extra = 0
+    readonly_fields = ('organization', 'affected_count', 'recipients', 'created_at')
+
+
+@admin.register(Recall)
+class RecallAdmin(admin.ModelAdmin):
+    list_display = ('manufacturing_batch', 'manufacturer', 'product', 'status', 'notified_at', 'created_at')
+    list_filter = ('status', 'manufacturer', 'created_at')
+    search_fields = ('manufacturing_batch', 'reason')
+    inlines = [RecallNotificationInline]
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('url', 'organization', 'is_active', 'created_at')
+    list_filter = ('is_active', 'organization')
+    search_fields = ('url',)
+    readonly_fields = ('secret',)
@@ -0,0 +1,163 @@
+"""
+Buffered scan analytics.
+
+Public scans are counted in Redis on the request path (hash counters plus
+HyperLogLogs for unique visitors) and flushed periodically into the hourly
+rollup tables by the ``flush_scan_analytics`` management command. No database
+write happens per scan.
+
+Redis layout, per epoch hour ``H``::
+
+    dpp:scans:H:products      hash   product_id  -> scans
+    dpp:scans:H:serials       hash   instance_id -> scans
+    dpp:scans:H:pv:<id>       HLL    visitors of a product
+    dpp:scans:H:sv:<id>       HLL    visitors of an instance
+    dpp:scans:pending         set    hours waiting to be flushed
+"""
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.redis_client import get_redis, RedisError
+from .models import ProductScanRollup, SerialScanRollup
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'dpp:scans'
+PENDING_KEY = f'{KEY_PREFIX}:pending'
+
+# Buckets are kept well past the flush interval in case the job is down.
+BUCKET_TTL = 60 * 60 * 24 * 3
+
+
+def current_hour(now=None):
+    """Return the epoch hour for ``now`` (defaults to the current time)."""
+    return int((now if now is not None else time.time()) // 3600)
+
+
+def hour_to_datetime(hour):
+    """Convert an epoch hour into an aware UTC datetime."""
+    return datetime.fromtimestamp(hour * 3600, tz=dt_timezone.utc)
+
+
+def visitor_id(request):
+    """
+    Derive an anonymous visitor identifier from the client address and agent.
+
+    Only a short digest is fed into the HyperLogLog, the raw address is never
+    stored.
+    """
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    address = forwarded.split(',')[0].strip() if forwarded else request.META.get('REMOTE_ADDR', '')
+    agent = request.META.get('HTTP_USER_AGENT', '')
+    return hashlib.blake2b(f'{address}|{agent}'.encode(), digest_size=8).hexdigest()
+
+
+def _bucket_keys(hour):
+    prefix = f'{KEY_PREFIX}:{hour}'
+    return f'{prefix}:products', f'{prefix}:serials', f'{prefix}:pv:', f'{prefix}:sv:'
+
+
+def record_scan(instance, request):
+    """
+    Count one scan of ``instance``.
+
+    All commands are sent in a single pipelined round trip. Redis errors are
+    logged and swallowed, analytics must never break the scan itself.
+    """
+    if not getattr(settings, 'DPP_SCAN_ANALYTICS_ENABLED', True):
+        return
+    hour = current_hour()
+    products_key, serials_key, pv_prefix, sv_prefix = _bucket_keys(hour)
+    visitor = visitor_id(request)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(products_key, instance.product_id, 1)
+        pipe.hincrby(serials_key, instance.pk, 1)
+        pipe.pfadd(f'{pv_prefix}{instance.product_id}', visitor)
+        pipe.pfadd(f'{sv_prefix}{instance.pk}', visitor)
+        pipe.expire(products_key, BUCKET_TTL)
+        pipe.expire(serials_key, BUCKET_TTL)
+        pipe.expire(f'{pv_prefix}{instance.product_id}', BUCKET_TTL)
+        pipe.expire(f'{sv_prefix}{instance.pk}', BUCKET_TTL)
+        pipe.sadd(PENDING_KEY, hour)
+        pipe.execute()
+    except RedisError:
+        logger.warning("Could not record scan analytics for instance %s", instance.pk, exc_info=True)
+
+
+def _read_bucket(redis, counters_key, hll_prefix):
+    counts = {int(k): int(v) for k, v in redis.hgetall(counters_key).items()}
+    if not counts:
+        return {}
+    pipe = redis.pipeline(transaction=False)
+    for object_id in counts:
+        pipe.pfcount(f'{hll_prefix}{object_id}')
+    uniques = pipe.execute()
+    return {object_id: (scans, unique) for (object_id, scans), unique in zip(counts.items(), uniques)}
+
+
+def flush_hour(hour, redis=None):
+    """
+    Move one closed hour from Redis into the rollup tables.
+
+    Returns a ``(products, serials)`` tuple with the number of rows written.
+    """
+    redis = redis or get_redis()
+    products_key, serials_key, pv_prefix, sv_prefix = _bucket_keys(hour)
+    products = _read_bucket(redis, products_key, pv_prefix)
+    serials = _read_bucket(redis, serials_key, sv_prefix)
+    bucket = hour_to_datetime(hour)
+
+    with transaction.atomic():
+        ProductScanRollup.objects.bulk_create(
+            [
+                ProductScanRollup(product_id=pid, hour=bucket, scan_count=scans, unique_visitors=unique)
+                for pid, (scans, unique) in products.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'hour'],
+            update_fields=['scan_count', 'unique_visitors'],
+        )
+        SerialScanRollup.objects.bulk_create(
+            [
+                SerialScanRollup(product_instance_id=iid, hour=bucket, scan_count=scans, unique_visitors=unique)
+                for iid, (scans, unique) in serials.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product_instance', 'hour'],
+            update_fields=['scan_count', 'unique_visitors'],
+        )
+
+    keys = [products_key, serials_key]
+    keys += [f'{pv_prefix}{pid}' for pid in products]
+    keys += [f'{sv_prefix}{iid}' for iid in serials]
+    pipe = redis.pipeline(transaction=False)
+    for start in range(0, len(keys), 1000):
+        pipe.delete(*keys[start:start + 1000])
+    pipe.srem(PENDING_KEY, hour)
+    pipe.execute()
+    return len(products), len(serials)
+
+
+def flush_closed_hours(now=None, grace_seconds=None):
+    """
+    Flush every pending hour that ended at least ``grace_seconds`` ago.
+
+    Scans are always counted in the current hour, so once the grace period has
+    passed a bucket can no longer change and flushing it is final.
+    """
+    if grace_seconds is None:
+        grace_seconds = getattr(settings, 'DPP_SCAN_ANALYTICS_FLUSH_GRACE', 60)
+    now = now if now is not None else time.time()
+    redis = get_redis()
+    flushed = []
+    for raw in sorted(int(h) for h in redis.smembers(PENDING_KEY)):
+        if (raw + 1) * 3600 + grace_seconds > now:
+            continue
+        flushed.append((raw, *flush_hour(raw, redis=redis)))
+    return flushed
@@ -0,0 +1,242 @@
+"""
+Streaming detection of cloned serial numbers on the public scan path.
+
+A cloned QR code shows up as one serial scanned at an impossible rate or from
+many distant places. Each worker process keeps a bounded-memory detector:
+
+* a sliding-window count-min sketch of scans per serial,
+* a sliding-window count-min sketch of distinct coarse locations per serial,
+  where a (serial, location) pair only counts once per window thanks to a
+  rotating Bloom filter.
+
+Memory is fixed by the sketch sizes, not by the number of serials, and an
+observation costs a handful of list updates. Only when a serial crosses a
+threshold is it written to Redis, where the API reads flags from all workers.
+Thresholds apply to the traffic one worker sees.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.core.redis_client import get_redis, RedisError
+from apps.core.sketches import CountMinSketch, LocalBloomFilter
+
+logger = logging.getLogger(__name__)
+
+FLAGGED_KEY = 'dpp:anomalies:serials'
+DETAILS_KEY_PREFIX = 'dpp:anomalies:serial:'
+
+RATE = 'rate'
+LOCATIONS = 'locations'
+
+
+class SlidingWindowSketch:
+    """
+    Count-min sketch over a sliding window made of ``slots`` sub-windows.
+
+    An aggregate sketch holds the sum of all live slots; when a slot expires
+    its counts are subtracted, so reads never touch more than one sketch.
+    """
+
+    def __init__(self, window_seconds, slots=6, width=2048, depth=4):
+        self.slot_seconds = window_seconds / slots
+        self.slots = [CountMinSketch(width, depth) for _ in range(slots)]
+        self.total = CountMinSketch(width, depth)
+        self.current_slot = None
+
+    def _advance(self, now):
+        slot = int(now // self.slot_seconds)
+        if self.current_slot is None:
+            self.current_slot = slot
+            return
+        expired = min(slot - self.current_slot, len(self.slots))
+        for step in range(1, expired + 1):
+            sketch = self.slots[(self.current_slot + step) % len(self.slots)]
+            self.total.merge(sketch, sign=-1)
+            sketch.clear()
+        if expired:
+            self.current_slot = slot
+
+    def add(self, key, now, count=1):
+        """Count ``key`` at time ``now`` and return its estimate over the window."""
+        self._advance(now)
+        indexes = self.total.indexes(key)
+        self.slots[self.current_slot % len(self.slots)].add(key, count, indexes)
+        return self.total.add(key, count, indexes)
+
+    def estimate(self, key, now):
+        self._advance(now)
+        return self.total.estimate(key)
+
+
+class ScanAnomalyDetector:
+    """
+    Flags serial numbers whose scan rate or location spread is implausible.
+
+    ``publish`` is called with ``(serial_number, details)`` whenever a serial
+    is flagged; it defaults to storing the flag in Redis.
+    """
+
+    def __init__(self, window_seconds=600, max_scans=50, max_locations=5,
+                 width=2048, depth=4, pair_capacity=200_000, max_tracked=1000,
+                 republish_seconds=60, publish=None):
+        self.window_seconds = window_seconds
+        self.max_scans = max_scans
+        self.max_locations = max_locations
+        self.republish_seconds = republish_seconds
+        self.max_tracked = max_tracked
+        self.rates = SlidingWindowSketch(window_seconds, width=width, depth=depth)
+        self.locations = SlidingWindowSketch(window_seconds, width=width, depth=depth)
+        # Two generations of seen (serial, location) pairs, swapped every window
+        self.pair_capacity = pair_capacity
+        self.seen_pairs = LocalBloomFilter.for_capacity(pair_capacity)
+        self.previous_pairs = LocalBloomFilter.for_capacity(pair_capacity)
+        self.pairs_generation = None
+        self.flagged = OrderedDict()
+        self.publish = publish or publish_flag
+        self.lock = threading.Lock()
+
+    def _rotate_pairs(self, now):
+        generation = int(now // self.window_seconds)
+        if generation != self.pairs_generation:
+            if self.pairs_generation is not None and generation == self.pairs_generation + 1:
+                self.previous_pairs, self.seen_pairs = self.seen_pairs, self.previous_pairs
+            else:
+                self.previous_pairs.clear()
+            self.seen_pairs.clear()
+            self.pairs_generation = generation
+
+    def observe(self, serial_number, location=None, now=None):
+        """
+        Record one scan. Returns the list of triggered reasons (usually empty).
+        """
+        now = now if now is not None else time.time()
+        with self.lock:
+            scans = self.rates.add(serial_number, now)
+            # The location spread only changes when a new pair shows up
+            spread = None
+            if location is not None:
+                self._rotate_pairs(now)
+                pair = (serial_number, location)
+                offsets = self.seen_pairs.offsets(pair)
+                if not self.previous_pairs.contains(pair, offsets) and self.seen_pairs.add(pair, offsets):
+                    spread = self.locations.add(serial_number, now)
+
+            reasons = []
+            if scans > self.max_scans:
+                reasons.append(RATE)
+            if spread is not None and spread > self.max_locations:
+                reasons.append(LOCATIONS)
+            if not reasons:
+                return reasons
+
+            if spread is None:
+                spread = self.locations.estimate(serial_number, now)
+            previous = self.flagged.pop(serial_number, None)
+            self.flagged[serial_number] = details = {
+                'serial_number': serial_number,
+                'reasons': reasons,
+                'scans_in_window': scans,
+                'locations_in_window': spread,
+                'window_seconds': self.window_seconds,
+                'first_flagged_at': previous['first_flagged_at'] if previous else now,
+                'last_flagged_at': now,
+                'published_at': previous['published_at'] if previous else None,
+            }
+            while len(self.flagged) > self.max_tracked:
+                self.flagged.popitem(last=False)
+            should_publish = (details['published_at'] is None
+                              or now - details['published_at'] >= self.republish_seconds)
+            if should_publish:
+                details['published_at'] = now
+
+        if should_publish:
+            self.publish(serial_number, details)
+        return reasons
+
+    def recent_flags(self):
+        """Flags known to this process, most recent first."""
+        with self.lock:
+            return [dict(details) for details in reversed(self.flagged.values())]
+
+
+def publish_flag(serial_number, details):
+    """Store a flag in Redis so every worker's detections are visible to the API."""
+    retention = getattr(settings, 'DPP_ANOMALY_RETENTION', 60 * 60 * 24)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zadd(FLAGGED_KEY, {serial_number: details['last_flagged_at']})
+        pipe.set(f'{DETAILS_KEY_PREFIX}{serial_number}', json.dumps(details), ex=retention)
+        pipe.zremrangebyscore(FLAGGED_KEY, '-inf', details['last_flagged_at'] - retention)
+        pipe.execute()
+    except RedisError:
+        logger.warning("Could not publish anomaly flag for %s", serial_number, exc_info=True)
+
+
+def get_flagged_serials(limit=100):
+    """Return recently flagged serials from Redis, most recent first."""
+    retention = getattr(settings, 'DPP_ANOMALY_RETENTION', 60 * 60 * 24)
+    redis = get_redis()
+    serials = redis.zrevrangebyscore(FLAGGED_KEY, '+inf', time.time() - retention, start=0, num=limit)
+    if not serials:
+        return []
+    values = redis.mget([DETAILS_KEY_PREFIX.encode() + serial for serial in serials])
+    return [json.loads(value) for value in values if value]
+
+
+def scan_location(request):
+    """
+    Coarse location of a scan.
+
+    Apps may send ``lat``/``lon``, which are snapped to a one-degree grid
+    (about 100 km). Otherwise a country header set by the edge proxy is used,
+    and as a last resort the client's /16 network.
+    """
+    params = request.query_params if hasattr(request, 'query_params') else request.GET
+    try:
+        lat, lon = float(params['lat']), float(params['lon'])
+    except (KeyError, TypeError, ValueError):
+        lat = lon = math.nan
+    # NaN fails both comparisons, so non-finite or out-of-range values fall through
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return f"geo:{round(lat)}:{round(lon)}"
+    country = request.META.get('HTTP_CF_IPCOUNTRY') or request.META.get('HTTP_X_COUNTRY_CODE')
+    if country:
+        return f"cc:{country.upper()}"
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    address = forwarded.split(',')[0].strip() if forwarded else request.META.get('REMOTE_ADDR', '')
+    if '.' in address:
+        return 'net:' + '.'.join(address.split('.')[:2])
+    if ':' in address:
+        return 'net:' + ':'.join(address.split(':')[:3])
+    return None
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """Return this process's detector, configured from settings on first use."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = ScanAnomalyDetector(
+                    window_seconds=getattr(settings, 'DPP_ANOMALY_WINDOW', 600),
+                    max_scans=getattr(settings, 'DPP_ANOMALY_MAX_SCANS', 50),
+                    max_locations=getattr(settings, 'DPP_ANOMALY_MAX_LOCATIONS', 5),
+                )
+    return _detector
+
+
+def observe_scan(serial_number, request):
+    """Feed one public scan into the detector."""
+    if not getattr(settings, 'DPP_ANOMALY_DETECTION_ENABLED', True):
+        return []
+    return get_detector().observe(serial_number, scan_location(request))
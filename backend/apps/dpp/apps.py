@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class DppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.dpp'
-    verbose_name = 'Digital Product Passport' 
\ No newline at end of file
+    verbose_name = 'Digital Product Passport' 
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,217 @@
+"""
+Prefix autocomplete over product, material and organization names.
+
+Every prefix of every word-aligned suffix of a name gets a Redis sorted set
+whose members are ``"<id>|<name>"`` scored by popularity, so a lookup is one
+``ZREVRANGE`` and never touches the database. ``"Lithium battery"`` is found
+by ``"lit"`` and by ``"bat"``.
+
+Each indexed object also has a small hash holding its current member and
+score. Renames and deletes use it to remove the old prefixes, and signal
+driven updates use it to keep the popularity computed by the last build.
+
+Builds trim sorted sets to the most popular ``DPP_AUTOCOMPLETE_MAX_PER_PREFIX``
+members, which bounds memory for short prefixes; the long tail of a one
+letter prefix is never shown anyway. Signal driven updates do not trim: a
+new object has no popularity yet and would be cut straight away, so sets
+may grow past the limit by the objects written since the last build.
+
+Without Redis, suggestions come from the database with the same word start
+matching, only slower.
+"""
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.core.redis_client import get_redis, RedisError
+from .models import Material, Organization, Product, ProductInstance, ProductScanRollup
+
+logger = logging.getLogger(__name__)
+
+MIN_PREFIX = 1
+MAX_PREFIX = 20
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.lower().split())
+
+
+def prefixes(name):
+    """Return the set of indexed prefixes for ``name``."""
+    text = normalize(name)
+    result = set()
+    for start, char in enumerate(text):
+        if char == ' ' or (start and text[start - 1] != ' '):
+            continue
+        suffix = text[start:start + MAX_PREFIX]
+        for end in range(MIN_PREFIX, len(suffix) + 1):
+            result.add(suffix[:end].rstrip())
+    return result
+
+
+def _product_popularity():
+    scans = (
+        ProductScanRollup.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('scan_count'))
+        .values('total')
+    )
+    instances = (
+        ProductInstance.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(scans), Value(0)) + Coalesce(Subquery(instances), Value(0))
+
+
+class AutocompleteIndex:
+    """
+    Autocomplete index of one model, identified by ``kind`` in the URL.
+    """
+
+    def __init__(self, kind, model, popularity):
+        self.kind = kind
+        self.model = model
+        self.popularity = popularity
+
+    def _prefix_key(self, prefix):
+        return f'dpp:ac:{self.kind}:p:{prefix}'
+
+    def _item_key(self, pk):
+        return f'dpp:ac:{self.kind}:item:{pk}'
+
+    def _queue_index(self, pipe, pk, name, score, old, trim):
+        member = f'{pk}|{name}'
+        old_member = old.get(b'member', b'').decode()
+        new_prefixes = prefixes(name)
+        if old_member and old_member != member:
+            for prefix in prefixes(old_member.split('|', 1)[1]):
+                pipe.zrem(self._prefix_key(prefix), old_member)
+        limit = settings.DPP_AUTOCOMPLETE_MAX_PER_PREFIX
+        for prefix in new_prefixes:
+            key = self._prefix_key(prefix)
+            pipe.zadd(key, {member: score})
+            if trim:
+                pipe.zremrangebyrank(key, 0, -(limit + 1))
+        pipe.hset(self._item_key(pk), mapping={'member': member, 'score': score})
+
+    def index(self, obj, score=None):
+        """Add or update ``obj``, keeping its popularity unless ``score`` is given."""
+        redis = get_redis()
+        old = redis.hgetall(self._item_key(obj.pk))
+        if score is None:
+            score = float(old.get(b'score', 0))
+        pipe = redis.pipeline(transaction=False)
+        self._queue_index(pipe, obj.pk, obj.name, score, old, trim=False)
+        pipe.execute()
+
+    def remove(self, pk):
+        redis = get_redis()
+        old_member = redis.hget(self._item_key(pk), 'member')
+        pipe = redis.pipeline(transaction=False)
+        if old_member:
+            old_member = old_member.decode()
+            for prefix in prefixes(old_member.split('|', 1)[1]):
+                pipe.zrem(self._prefix_key(prefix), old_member)
+        pipe.delete(self._item_key(pk))
+        pipe.execute()
+
+    def build(self, chunk_size=2000):
+        """
+        Index every row with its current popularity and drop entries of rows
+        that no longer exist. Safe to run while the index is being served.
+        """
+        redis = get_redis()
+        rows = (
+            self.model.objects
+            .annotate(popularity=self.popularity)
+            .order_by()
+            .values_list('pk', 'name', 'popularity')
+            .iterator(chunk_size=chunk_size)
+        )
+        seen = set()
+        chunk = []
+        for row in rows:
+            seen.add(row[0])
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                self._build_chunk(redis, chunk)
+                chunk = []
+        if chunk:
+            self._build_chunk(redis, chunk)
+
+        stale = []
+        prefix = self._item_key('')
+        for key in redis.scan_iter(match=f'{prefix}*', count=1000):
+            pk = key.decode()[len(prefix):]
+            if not pk.isdigit() or int(pk) not in seen:
+                stale.append(pk)
+        for pk in stale:
+            self.remove(pk)
+        return len(seen)
+
+    def _build_chunk(self, redis, chunk):
+        pipe = redis.pipeline(transaction=False)
+        for pk, _name, _score in chunk:
+            pipe.hgetall(self._item_key(pk))
+        olds = pipe.execute()
+        pipe = redis.pipeline(transaction=False)
+        for (pk, name, score), old in zip(chunk, olds):
+            self._queue_index(pipe, pk, name, float(score or 0), old, trim=True)
+        pipe.execute()
+
+    def suggest(self, query, limit=10):
+        """Return up to ``limit`` ``{"id", "name"}`` suggestions, most popular first."""
+        text = normalize(query)
+        if len(text) < MIN_PREFIX:
+            return []
+        members = get_redis().zrevrange(self._prefix_key(text[:MAX_PREFIX]), 0, limit - 1)
+        suggestions = []
+        for member in members:
+            pk, name = member.decode().split('|', 1)
+            # Queries longer than the indexed prefixes are checked here
+            if len(text) > MAX_PREFIX and text not in normalize(name):
+                continue
+            suggestions.append({'id': int(pk), 'name': name})
+        return suggestions
+
+    def suggest_from_database(self, query, limit=10):
+        """Fallback used when Redis is unavailable, matching word starts like the index."""
+        words = normalize(query).split()
+        if not words:
+            return []
+        pattern = r'(^|\s)' + r'\s+'.join(re.escape(word) for word in words)
+        return [
+            {'id': pk, 'name': name}
+            for pk, name in self.model.objects.filter(name__iregex=pattern)
+            .order_by('name').values_list('pk', 'name')[:limit]
+        ]
+
+
+INDEXES = {
+    'products': AutocompleteIndex('products', Product, _product_popularity()),
+    'materials': AutocompleteIndex('materials', Material, Count('product_instances')),
+    'organizations': AutocompleteIndex('organizations', Organization, Count('manufactured_products')),
+}
+INDEX_FOR_MODEL = {index.model: index for index in INDEXES.values()}
+
+
+def suggest(kind, query, limit=10):
+    index = INDEXES[kind]
+    try:
+        return index.suggest(query, limit)
+    except RedisError:
+        logger.warning("Autocomplete index unavailable, falling back to the database", exc_info=True)
+        return index.suggest_from_database(query, limit)
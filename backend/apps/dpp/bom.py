@@ -0,0 +1,272 @@
+"""
+Hierarchical bill of materials.
+
+Products are composed of other products through ``ProductComponent`` edges.
+Trees, rollups and where-used lookups are each one recursive CTE, so their
+cost does not depend on the number of levels. Cycles are rejected on write
+and the CTEs additionally refuse to revisit a product on the current path.
+
+Rollups treat a product's own ``weight`` and ``carbon_footprint`` as what it
+adds on top of its components (for an e-bike: the frame and the assembly
+emissions), scaled by how many units of it the root contains.
+
+Results are cached per product under that product's generation numbers:
+trees and rollups under its "down" generation, where-used lists under its
+"up" generation. After commit, a change bumps only what can see it. A
+product or its materials bump the down generation of the product and of
+every product that contains it. A component edge bumps the parent side
+upwards and the component side downwards. So a catalog write leaves every
+unrelated tree cached. Readers never clear entries, they stop finding them,
+so a result computed from data a concurrent change just replaced is never
+served after the bump. A global generation drops everything at once.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Material, Product, ProductComponent, ProductMaterial
+
+GENERATION_KEY = 'dpp:bom:generation'
+
+
+def _tables():
+    quote = connection.ops.quote_name
+    return {
+        'component': quote(ProductComponent._meta.db_table),
+        'product': quote(Product._meta.db_table),
+        'product_material': quote(ProductMaterial._meta.db_table),
+        'material': quote(Material._meta.db_table),
+    }
+
+
+# Every product reachable from the root, once per path, with the number of
+# units per root unit. The root itself is the depth 0 row.
+DESCENDANTS_CTE = """
+WITH RECURSIVE tree(product_id, parent_id, quantity, total_quantity, depth, path) AS (
+    SELECT %(root)s::bigint, NULL::bigint, 1::numeric, 1::numeric, 0, ARRAY[%(root)s::bigint]
+    UNION ALL
+    SELECT c.component_id, c.parent_id, c.quantity, t.total_quantity * c.quantity,
+           t.depth + 1, t.path || c.component_id
+    FROM {component} c
+    JOIN tree t ON c.parent_id = t.product_id
+    WHERE NOT c.component_id = ANY(t.path) AND t.depth < %(max_depth)s
+)
+"""
+
+TREE_SQL = DESCENDANTS_CTE + """
+SELECT t.product_id, t.quantity, t.total_quantity, t.depth, t.path, p.name, p.weight, p.carbon_footprint
+FROM tree t
+JOIN {product} p ON p.id = t.product_id
+ORDER BY t.path
+"""
+
+TOTALS_SQL = DESCENDANTS_CTE + """
+SELECT SUM(t.total_quantity * p.weight),
+       SUM(t.total_quantity * p.carbon_footprint),
+       COUNT(DISTINCT t.product_id),
+       COUNT(DISTINCT t.product_id) FILTER (WHERE p.weight IS NULL),
+       COUNT(DISTINCT t.product_id) FILTER (WHERE p.carbon_footprint IS NULL)
+FROM tree t
+JOIN {product} p ON p.id = t.product_id
+"""
+
+MATERIALS_SQL = DESCENDANTS_CTE + """
+SELECT m.id, m.name, m.is_recyclable, SUM(t.total_quantity * p.weight * pm.percentage / 100)
+FROM tree t
+JOIN {product} p ON p.id = t.product_id
+JOIN {product_material} pm ON pm.product_id = p.id
+JOIN {material} m ON m.id = pm.material_id
+WHERE p.weight IS NOT NULL AND pm.percentage IS NOT NULL
+GROUP BY m.id, m.name, m.is_recyclable
+ORDER BY 4 DESC, m.name
+"""
+
+# Every product that contains the component, directly or through
+# sub-assemblies, with the total number of units it contains.
+WHERE_USED_SQL = """
+WITH RECURSIVE used(product_id, total_quantity, depth, path) AS (
+    SELECT c.parent_id, c.quantity, 1, ARRAY[c.component_id, c.parent_id]
+    FROM {component} c
+    WHERE c.component_id = %(root)s
+    UNION ALL
+    SELECT c.parent_id, u.total_quantity * c.quantity, u.depth + 1, u.path || c.parent_id
+    FROM {component} c
+    JOIN used u ON c.component_id = u.product_id
+    WHERE NOT c.parent_id = ANY(u.path) AND u.depth < %(max_depth)s
+)
+SELECT u.product_id, p.name, MIN(u.depth), SUM(u.total_quantity),
+       NOT EXISTS (SELECT 1 FROM {component} c WHERE c.component_id = u.product_id)
+FROM used u
+JOIN {product} p ON p.id = u.product_id
+GROUP BY u.product_id, p.name
+ORDER BY MIN(u.depth), p.name
+"""
+
+
+# Every product containing one of the roots, directly or through
+# sub-assemblies, roots included; DESCENDANTS_SQL is the reverse. UNION
+# terminates even if a cycle slipped in.
+ANCESTORS_SQL = """
+WITH RECURSIVE up(product_id) AS (
+    SELECT unnest(%(roots)s::bigint[])
+    UNION
+    SELECT c.parent_id FROM {component} c JOIN up u ON c.component_id = u.product_id
+)
+SELECT product_id FROM up
+"""
+
+DESCENDANTS_SQL = """
+WITH RECURSIVE down(product_id) AS (
+    SELECT unnest(%(roots)s::bigint[])
+    UNION
+    SELECT c.component_id FROM {component} c JOIN down d ON c.parent_id = d.product_id
+)
+SELECT product_id FROM down
+"""
+
+
+def _query(sql, product_id):
+    params = {'root': product_id, 'max_depth': settings.DPP_BOM_MAX_DEPTH}
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**_tables()), params)
+        return cursor.fetchall()
+
+
+def _closure(sql, product_ids):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**_tables()), {'roots': list(product_ids)})
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _generations(keys):
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        # Never restart from a number that may already have been used
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key) for key in keys]
+
+
+def _cached(kind, direction, product_id, compute):
+    epoch, generation = _generations([GENERATION_KEY, f'dpp:bom:{direction}:{product_id}'])
+    key = f'dpp:bom:{epoch}:{generation}:{kind}:{product_id}'
+    result = cache.get(key)
+    if result is None:
+        result = compute(product_id)
+        cache.set(key, result, settings.DPP_BOM_CACHE_TIMEOUT)
+    return result
+
+
+def _bump(direction, product_ids):
+    if product_ids:
+        generation = time.time_ns()
+        cache.set_many({f'dpp:bom:{direction}:{pk}': generation for pk in product_ids}, None)
+
+
+def invalidate():
+    """Drop every cached BOM result."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_rollups(product_ids):
+    """Drop trees and rollups that include ``product_ids``, after their own data changed."""
+    product_ids = list(product_ids)
+    if product_ids:
+        _bump('down', _closure(ANCESTORS_SQL, product_ids))
+
+
+def invalidate_products(product_ids):
+    """Drop every cached result that shows one of ``product_ids``."""
+    product_ids = list(product_ids)
+    if product_ids:
+        _bump('down', _closure(ANCESTORS_SQL, product_ids))
+        # Their names appear in the where-used lists of their components
+        _bump('up', _closure(DESCENDANTS_SQL, product_ids))
+
+
+def invalidate_edge(parent_id, component_id):
+    """Drop cached results that went through the ``parent_id`` -> ``component_id`` edge."""
+    _bump('down', _closure(ANCESTORS_SQL, [parent_id]))
+    _bump('up', _closure(DESCENDANTS_SQL, [component_id]))
+
+
+def invalidate_material(material_id):
+    """Drop rollups of every tree containing ``material_id``."""
+    invalidate_rollups(ProductMaterial.objects.filter(material_id=material_id)
+                       .values_list('product_id', flat=True).distinct())
+
+
+def compute_tree(product_id):
+    nodes = {}
+    root = None
+    for product_id_, quantity, total_quantity, depth, path, name, weight, carbon in _query(TREE_SQL, product_id):
+        node = {
+            'id': product_id_,
+            'name': name,
+            'quantity': quantity,
+            'total_quantity': total_quantity,
+            'depth': depth,
+            'weight': weight,
+            'carbon_footprint': carbon,
+            'components': [],
+        }
+        nodes[tuple(path)] = node
+        if depth == 0:
+            root = node
+        else:
+            # Rows come in path order, so the parent is always already there
+            nodes[tuple(path[:-1])]['components'].append(node)
+    return root
+
+
+def compute_rollup(product_id):
+    mass, carbon, products, missing_weight, missing_carbon = _query(TOTALS_SQL, product_id)[0]
+    materials = [
+        {'material': material_id, 'name': name, 'is_recyclable': is_recyclable, 'mass': material_mass}
+        for material_id, name, is_recyclable, material_mass in _query(MATERIALS_SQL, product_id)
+    ]
+    return {
+        'product': product_id,
+        'total_weight': mass,
+        'total_carbon_footprint': carbon,
+        'products': products,
+        'products_without_weight': missing_weight,
+        'products_without_carbon_footprint': missing_carbon,
+        'materials': materials,
+    }
+
+
+def compute_where_used(product_id):
+    return [
+        {'id': parent_id, 'name': name, 'depth': depth, 'total_quantity': total_quantity, 'is_top_level': top_level}
+        for parent_id, name, depth, total_quantity, top_level in _query(WHERE_USED_SQL, product_id)
+    ]
+
+
+def tree(product):
+    """Return the full component tree of ``product`` as nested dicts."""
+    return _cached('tree', 'down', product.pk, compute_tree)
+
+
+def rollup(product):
+    """Return the mass, carbon footprint and material mass rolled up over the tree of ``product``."""
+    return _cached('rollup', 'down', product.pk, compute_rollup)
+
+
+def where_used(product):
+    """Return every product that contains ``product``, nearest first."""
+    return _cached('where-used', 'up', product.pk, compute_where_used)
+
+
+def creates_cycle(parent_id, component_id):
+    """True if making ``component_id`` a component of ``parent_id`` would close a cycle."""
+    if parent_id == component_id:
+        return True
+    return any(row[0] == component_id for row in _query(WHERE_USED_SQL, parent_id))
@@ -0,0 +1,245 @@
+"""
+Set-based bulk operations on product data.
+
+Large operations are split into chunks walked in primary key order. Each
+chunk is its own short transaction, so row locks are held for one chunk at a
+time and concurrent writers are never blocked for the whole operation. The
+flip side is that a failure leaves the chunks before it applied; operations
+that report it raise ``BulkOperationError`` with the progress so far.
+"""
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import bom, events
+from . import changes as changes_log
+from .models import ChangeLogEntry, Product, ProductInstance, ProductMaterial, ProductPassport, SupplyChainEvent
+from .serializers import content_hash
+from .timeline import append_transfer
+from .webhooks import EVERYONE
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class BulkOperationError(Exception):
+    """
+    Raised when a chunked operation fails part way.
+
+    The chunks before the failure are committed: ``progress`` holds their
+    result and ``resume_after`` the last primary key they covered, which can
+    be passed back as ``after`` to continue with the rest.
+    """
+
+    def __init__(self, message, progress, resume_after):
+        super().__init__(message)
+        self.progress = progress
+        self.resume_after = resume_after
+
+
+def iter_id_chunks(queryset, chunk_size=DEFAULT_CHUNK_SIZE, after=None):
+    """
+    Yield lists of primary keys from ``queryset`` using keyset pagination,
+    starting after the primary key ``after`` if given.
+
+    Rows changed by an earlier chunk may stop matching the queryset's filter;
+    walking by primary key means they are neither revisited nor skipped.
+    """
+    last_pk = after
+    while True:
+        chunk_qs = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk_qs = chunk_qs.filter(pk__gt=last_pk)
+        ids = list(chunk_qs.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        last_pk = ids[-1]
+        yield ids
+
+
+def transfer_instances(queryset, changes, event=None, user=None, chunk_size=DEFAULT_CHUNK_SIZE, after=None):
+    """
+    Apply ownership/sale ``changes`` to every instance in ``queryset``.
+
+    ``changes`` may contain ``current_owner``, ``is_sold`` and ``sold_date``.
+    If ``event`` is given (``event_type``, ``organization`` and optionally
+    ``location``, ``description``, ``date``), one ``SupplyChainEvent`` per
+    instance is bulk inserted in the same transaction as the chunk's UPDATE.
+    Only instances with a primary key greater than ``after`` are touched.
+
+    Returns a dict with the number of updated instances and created events.
+    Raises ``BulkOperationError`` if a chunk fails; running the transfer
+    again with its ``resume_after`` applies the remaining instances once.
+    """
+    now = timezone.now()
+    updated = events_created = 0
+    event_fields = None
+    if event:
+        event_fields = dict(event)
+        event_fields.setdefault('date', now)
+
+    last_pk = after
+    try:
+        for ids in iter_id_chunks(queryset, chunk_size, after=after):
+            chunk_updated, chunk_events = _transfer_chunk(ids, changes, event_fields, user, now)
+            updated += chunk_updated
+            events_created += chunk_events
+            last_pk = ids[-1]
+    except DatabaseError as exc:
+        raise BulkOperationError(str(exc), {'updated': updated, 'events_created': events_created}, last_pk) from exc
+
+    return {'updated': updated, 'events_created': events_created}
+
+
+def _transfer_chunk(ids, changes, event_fields, user, now):
+    with transaction.atomic():
+        updated = ProductInstance.objects.filter(pk__in=ids).update(updated_at=now, updated_by=user, **changes)
+        changes_log.record('instance', ids)
+        events.publish_instances(ids)
+        if not event_fields:
+            return updated, 0
+        created = SupplyChainEvent.objects.bulk_create([
+            SupplyChainEvent(product_instance_id=pk, created_by=user, **event_fields)
+            for pk in ids
+        ])
+        # bulk_create skips signals, keep the ownership history in step
+        append_transfer(ids, event_fields['organization'].pk, event_fields['date'], created)
+        changes_log.record('event', [event.pk for event in created])
+        events.publish('event', [event.pk for event in created], ChangeLogEntry.UPSERT,
+                       [event_fields['organization'].pk])
+        return updated, len(created)
+
+
+def link_certificates(queryset, certificates, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Attach ``certificates`` to every product in ``queryset``.
+
+    Through-table rows are bulk inserted per chunk of products; existing
+    links are skipped by the database, so the operation is idempotent.
+    """
+    through = Product.certificates.through
+    certificate_ids = [certificate.pk for certificate in certificates]
+    products = 0
+    for ids in iter_id_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            through.objects.bulk_create(
+                [through(product_id=pk, certificate_id=certificate_id)
+                 for pk in ids for certificate_id in certificate_ids],
+                batch_size=chunk_size,
+                ignore_conflicts=True,
+            )
+            changes_log.record('product', ids)
+        products += len(ids)
+    return {'products': products}
+
+
+def unlink_certificates(queryset, certificates, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Detach ``certificates`` from every product in ``queryset``."""
+    through = Product.certificates.through
+    certificate_ids = [certificate.pk for certificate in certificates]
+    products = removed = 0
+    for ids in iter_id_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            removed += through.objects.filter(product_id__in=ids, certificate_id__in=certificate_ids).delete()[0]
+            changes_log.record('product', ids)
+        products += len(ids)
+    return {'products': products, 'removed': removed}
+
+
+def set_materials(queryset, materials, replace=False, user=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Upsert the material composition of every product in ``queryset``.
+
+    ``materials`` is a list of dicts with ``material`` and optionally
+    ``percentage`` and ``notes``. Existing rows for the same material are
+    updated in place; with ``replace`` the products' other materials are
+    removed in the same chunk transaction.
+    """
+    material_ids = [item['material'].pk for item in materials]
+    products = removed = 0
+    for ids in iter_id_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            if replace:
+                removed += (ProductMaterial.objects.filter(product_id__in=ids)
+                            .exclude(material_id__in=material_ids).delete()[0])
+            ProductMaterial.objects.bulk_create(
+                [
+                    ProductMaterial(
+                        product_id=pk,
+                        material_id=item['material'].pk,
+                        percentage=item.get('percentage'),
+                        notes=item.get('notes'),
+                        created_by=user,
+                    )
+                    for pk in ids for item in materials
+                ],
+                batch_size=chunk_size,
+                update_conflicts=True,
+                unique_fields=['product', 'material'],
+                update_fields=['percentage', 'notes', 'updated_at'],
+            )
+            changes_log.record('product', ids)
+            # bulk_create skips the signals that keep BOM rollups fresh
+            transaction.on_commit(lambda ids=ids: bom.invalidate_rollups(ids))
+        products += len(ids)
+    return {'products': products, 'removed': removed}
+
+
+def unlink_materials(queryset, materials, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Remove ``materials`` from every product in ``queryset``."""
+    material_ids = [material.pk for material in materials]
+    products = removed = 0
+    for ids in iter_id_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            # The delete sends post_delete per row, which logs the product and
+            # invalidates its BOM rollups
+            removed += ProductMaterial.objects.filter(product_id__in=ids, material_id__in=material_ids).delete()[0]
+        products += len(ids)
+    return {'products': products, 'removed': removed}
+
+
+def upsert_passports(items):
+    """
+    Create or update passports keyed by ``qr_code`` in one transaction.
+
+    ``items`` are dicts with ``qr_code``, ``name`` and ``sustainability_data``.
+    Passports whose content already matches are left untouched; the rest are
+    written with a single ``INSERT ... ON CONFLICT DO UPDATE``.
+
+    Returns one ``{'qr_code', 'id', 'status'}`` dict per item, in order, with
+    status ``created``, ``updated`` or ``unchanged``.
+    """
+    qr_codes = [item['qr_code'] for item in items]
+    statuses = {}
+    rows = []
+    with transaction.atomic():
+        # Locked so the comparison holds until the write
+        existing = {
+            passport.qr_code: passport
+            for passport in ProductPassport.objects.select_for_update().filter(qr_code__in=qr_codes)
+        }
+        for item in items:
+            content = {'name': item['name'], 'sustainability_data': item.get('sustainability_data') or {}}
+            passport = existing.get(item['qr_code'])
+            if passport is None:
+                statuses[item['qr_code']] = 'created'
+            elif content_hash(content) == content_hash(
+                    {'name': passport.name, 'sustainability_data': passport.get_sustainability_data()}):
+                statuses[item['qr_code']] = 'unchanged'
+                continue
+            else:
+                statuses[item['qr_code']] = 'updated'
+            row = ProductPassport(qr_code=item['qr_code'], name=content['name'])
+            row.set_sustainability_data(content['sustainability_data'])
+            rows.append(row)
+        if rows:
+            ProductPassport.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['qr_code'],
+                update_fields=['name', 'sustainability_data', 'updated_at'],
+            )
+        # Conflicting rows keep their id, not the one generated for the insert
+        ids = dict(ProductPassport.objects.filter(qr_code__in=qr_codes).values_list('qr_code', 'pk'))
+        written = [ids[row.qr_code] for row in rows]
+        changes_log.record('passport', written)
+        events.publish('passport', written, ChangeLogEntry.UPSERT, [EVERYONE])
+    return [{'qr_code': qr_code, 'id': ids[qr_code], 'status': statuses[qr_code]} for qr_code in qr_codes]
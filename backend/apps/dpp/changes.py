@@ -0,0 +1,158 @@
+"""
+Change feed for incremental synchronization.
+
+Every create, update and delete of an API resource appends a row to
+``ChangeLogEntry`` in the same transaction, written by signals for single
+objects and explicitly by the bulk paths that bypass signals. Deletions are
+tombstones, so clients learn about them too.
+
+Clients page through the log with an opaque cursor. Entries are ordered by
+writing transaction and then id, and only transactions older than every
+transaction still in progress are returned: a sequence value is taken when
+a row is inserted but becomes visible only on commit, so reading by id alone
+could step past a row that commits later. Each page is an index range read,
+so a sync costs the number of changes, not the size of the catalog. A long
+running transaction holds the feed back until it finishes.
+"""
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Certificate,
+    ChangeLogEntry,
+    Material,
+    Organization,
+    Product,
+    ProductCategory,
+    ProductComponent,
+    ProductInstance,
+    ProductPassport,
+    Recall,
+    RecyclingInstruction,
+    RepairRecord,
+    SupplyChainEvent,
+)
+
+RESOURCES = {
+    Organization: 'organization',
+    ProductCategory: 'category',
+    Material: 'material',
+    Certificate: 'certificate',
+    Product: 'product',
+    ProductComponent: 'component',
+    ProductInstance: 'instance',
+    SupplyChainEvent: 'event',
+    RepairRecord: 'repair',
+    RecyclingInstruction: 'recycling',
+    Recall: 'recall',
+    ProductPassport: 'passport',
+}
+DETAIL_ROUTES = {
+    'organization': 'organization-detail',
+    'category': 'productcategory-detail',
+    'material': 'material-detail',
+    'certificate': 'certificate-detail',
+    'product': 'product-detail',
+    'component': 'productcomponent-detail',
+    'instance': 'productinstance-detail',
+    'event': 'supplychainevent-detail',
+    'repair': 'repairrecord-detail',
+    'recycling': 'recyclinginstruction-detail',
+    'recall': 'recall-detail',
+    'passport': 'productpassport-detail',
+}
+
+INITIAL_CURSOR = '0-0'
+
+INSERT_SQL = """
+INSERT INTO {log} (resource, object_id, action, txid, changed_at)
+SELECT %(resource)s, object_id, %(action)s, txid_current(), %(now)s FROM ({ids}) AS changed(object_id)
+"""
+
+FEED_SQL = """
+SELECT id, resource, object_id, action, txid, changed_at FROM {log}
+WHERE (txid, id) > (%(txid)s, %(id)s)
+  AND txid < txid_snapshot_xmin(txid_current_snapshot()) {filters}
+ORDER BY txid, id
+LIMIT %(limit)s
+"""
+
+
+class ChangeFeedError(ValueError):
+    """Raised for malformed cursors."""
+
+
+def _log_table():
+    return connection.ops.quote_name(ChangeLogEntry._meta.db_table)
+
+
+def _insert(resource, action, ids_sql, params):
+    sql = INSERT_SQL.format(log=_log_table(), ids=ids_sql)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, dict(params, resource=resource, action=action, now=timezone.now()))
+        return cursor.rowcount
+
+
+def record(resource, ids, action=ChangeLogEntry.UPSERT):
+    """Log a change of the ``resource`` objects with primary keys ``ids``."""
+    ids = [str(pk) for pk in ids]
+    if not ids:
+        return 0
+    return _insert(resource, action, 'SELECT unnest(%(ids)s::varchar[])', {'ids': ids})
+
+
+def record_object(obj, action=ChangeLogEntry.UPSERT):
+    return record(RESOURCES[type(obj)], [obj.pk], action)
+
+
+def record_serials(serial_numbers):
+    """Log product instances created by serial number, e.g. after ``COPY``."""
+    table = connection.ops.quote_name(ProductInstance._meta.db_table)
+    return _insert(
+        'instance', ChangeLogEntry.UPSERT,
+        f'SELECT id::varchar FROM {table} WHERE serial_number = ANY(%(serials)s)',
+        {'serials': list(serial_numbers)},
+    )
+
+
+def parse_cursor(cursor):
+    try:
+        txid, entry_id = (int(part) for part in (cursor or INITIAL_CURSOR).split('-'))
+    except ValueError:
+        raise ChangeFeedError(f"'{cursor}' is not a valid cursor.")
+    return txid, entry_id
+
+
+def feed(cursor=None, resources=None, limit=500):
+    """
+    Return changes after ``cursor`` (from the beginning of the log if empty)
+    and the cursor to continue from.
+    """
+    txid, entry_id = parse_cursor(cursor)
+    filters = 'AND resource = ANY(%(resources)s)' if resources else ''
+    with connection.cursor() as db:
+        db.execute(
+            FEED_SQL.format(log=_log_table(), filters=filters),
+            {'txid': txid, 'id': entry_id, 'resources': list(resources or []), 'limit': limit + 1},
+        )
+        rows = db.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = [
+        {
+            'resource': resource,
+            'id': int(object_id) if object_id.isdigit() else object_id,
+            'action': action,
+            'changed_at': changed_at,
+            'url': reverse(DETAIL_ROUTES[resource], args=[object_id]) if action == ChangeLogEntry.UPSERT else None,
+        }
+        for _pk, resource, object_id, action, _txid, changed_at in rows
+    ]
+    next_cursor = f'{rows[-1][4]}-{rows[-1][0]}' if rows else f'{txid}-{entry_id}'
+    return {'changes': changes, 'cursor': next_cursor, 'has_more': has_more}
+
+
+def prune(before):
+    """Drop entries older than ``before``; returns the number removed."""
+    return ChangeLogEntry.objects.filter(changed_at__lt=before).delete()[0]
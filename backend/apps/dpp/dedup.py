@@ -0,0 +1,255 @@
+"""
+Near-duplicate product detection with MinHash locality-sensitive hashing.
+
+Each product is reduced to a set of shingles (character trigrams of its name
+and model number, words of its description) and summarised by a MinHash
+signature whose matching slots estimate the Jaccard similarity of two
+products. Signatures use one-permutation hashing with rotation densification:
+every shingle is hashed once and falls into one of the slots, so building a
+signature is linear in the product's text instead of text x permutations.
+
+The signature is cut into bands; products sharing any band land in the same
+bucket, and only those candidate pairs are compared. With 20 bands of 6 slots
+pairs above ~0.7 similarity are almost always candidates while pairs below
+~0.4 almost never are, which makes both the per-product lookup and the full
+catalog report near-linear.
+"""
+import hashlib
+import struct
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .autocomplete import normalize
+from .models import Product, ProductLSHBucket, ProductSignature
+
+MASK = (1 << 64) - 1
+# Large odd constant used to rotate values borrowed by empty slots
+ROTATION = 0x9E3779B97F4A7C15
+
+# Buckets bigger than this are common boilerplate (e.g. an empty model
+# number shared by thousands of products) and are only sampled
+MAX_BUCKET_MEMBERS = 200
+# Order of a bucket's members when sampling: spread over the whole bucket,
+# and the same on every run, so reruns check the same pairs
+SAMPLE_ORDER = "md5({alias}product_id::text || ':' || {alias}bucket::text)"
+
+
+def num_slots():
+    return settings.DPP_DEDUP_BANDS * settings.DPP_DEDUP_ROWS
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little')
+
+
+def shingles(name, model_number='', description=''):
+    """Return the shingle set describing a product."""
+    result = set()
+    text = normalize(f"{name} {model_number or ''}")
+    padded = f" {text} "
+    for start in range(len(padded) - 2):
+        result.add(padded[start:start + 3])
+    for word in normalize(description).split():
+        if len(word) > 2:
+            result.add(f"w:{word}")
+    return result
+
+
+def signature(shingle_set, slots=None):
+    """Return the densified one-permutation MinHash signature of ``shingle_set``."""
+    slots = slots or num_slots()
+    if not shingle_set:
+        return None
+    values = [None] * slots
+    for shingle in shingle_set:
+        hashed = _hash64(shingle)
+        slot, value = hashed % slots, hashed // slots
+        if values[slot] is None or value < values[slot]:
+            values[slot] = value
+    filled = values[:]
+    for slot in range(slots):
+        if values[slot] is not None:
+            continue
+        # Borrow from the next non-empty slot, shifted by the distance
+        for distance in range(1, slots):
+            borrowed = values[(slot + distance) % slots]
+            if borrowed is not None:
+                filled[slot] = (borrowed + distance * ROTATION) & MASK
+                break
+    return filled
+
+
+def similarity(first, second):
+    """Estimate the Jaccard similarity of two signatures."""
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def band_buckets(values):
+    """Return ``[(band, bucket)]`` for a signature."""
+    rows = settings.DPP_DEDUP_ROWS
+    buckets = []
+    for band in range(settings.DPP_DEDUP_BANDS):
+        chunk = struct.pack(f'<{rows}Q', *values[band * rows:(band + 1) * rows])
+        bucket = int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'little', signed=True)
+        buckets.append((band, bucket))
+    return buckets
+
+
+def pack(values):
+    return struct.pack(f'<{len(values)}Q', *values)
+
+
+def unpack(data):
+    data = bytes(data)
+    return list(struct.unpack(f'<{len(data) // 8}Q', data))
+
+
+def product_signature(product):
+    return signature(shingles(product.name, product.model_number, product.description))
+
+
+def index_products(products):
+    """(Re)compute signatures and LSH buckets for ``products``."""
+    signatures, buckets, ids = [], [], []
+    for product in products:
+        ids.append(product.pk)
+        values = product_signature(product)
+        if values is None:
+            continue
+        signatures.append(ProductSignature(product_id=product.pk, signature=pack(values)))
+        buckets.extend(
+            ProductLSHBucket(product_id=product.pk, band=band, bucket=bucket)
+            for band, bucket in band_buckets(values)
+        )
+    with transaction.atomic():
+        ProductLSHBucket.objects.filter(product_id__in=ids).delete()
+        ProductSignature.objects.filter(product_id__in=ids).delete()
+        ProductSignature.objects.bulk_create(signatures)
+        ProductLSHBucket.objects.bulk_create(buckets)
+    return len(signatures)
+
+
+def rebuild(chunk_size=2000):
+    """Index the whole catalog in chunks; returns the number of signatures."""
+    from .bulk import iter_id_chunks
+
+    fields = ('pk', 'name', 'model_number', 'description')
+    count = 0
+    for ids in iter_id_chunks(Product.objects.all(), chunk_size):
+        count += index_products(Product.objects.filter(pk__in=ids).only(*fields))
+    return count
+
+
+def likely_duplicates(product, threshold=None, limit=20):
+    """
+    Return ``[(product_id, similarity)]`` of products likely duplicating
+    ``product``, most similar first. Of each crowded bucket only a sample
+    of ``MAX_BUCKET_MEMBERS`` is compared.
+    """
+    threshold = settings.DPP_DEDUP_THRESHOLD if threshold is None else threshold
+    own = ProductSignature.objects.filter(product=product).values_list('signature', flat=True).first()
+    if own is None:
+        return []
+    own = unpack(own)
+    table = connection.ops.quote_name(ProductLSHBucket._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT product_id FROM ("
+            f"SELECT other.product_id, row_number() OVER ("
+            f"PARTITION BY mine.band ORDER BY {SAMPLE_ORDER.format(alias='other.')}) AS position "
+            f"FROM {table} mine "
+            f"JOIN {table} other ON other.band = mine.band AND other.bucket = mine.bucket "
+            f"AND other.product_id <> mine.product_id "
+            f"WHERE mine.product_id = %s"
+            f") candidates WHERE position <= %s",
+            [product.pk, MAX_BUCKET_MEMBERS],
+        )
+        candidates = [row[0] for row in cursor.fetchall()]
+    scored = []
+    for product_id, data in ProductSignature.objects.filter(product_id__in=candidates).values_list(
+            'product_id', 'signature'):
+        score = similarity(own, unpack(data))
+        if score >= threshold:
+            scored.append((product_id, score))
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        root = self.parent.setdefault(item, item)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while item != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+def duplicate_clusters(threshold=None, chunk_size=5000):
+    """
+    Group the whole catalog into clusters of likely duplicates.
+
+    Walks the shared LSH buckets with a server-side cursor, ``chunk_size``
+    buckets at a time, each capped to a sample of ``MAX_BUCKET_MEMBERS`` by
+    the database. Candidate pairs are verified against the signatures of
+    the chunk, which are dropped afterwards, and verified pairs are joined
+    with union-find, so a pair seen in several bands is merely verified
+    again. Memory grows with the products in clusters, not the catalog.
+    Returns a list of ``(product_ids, best_similarity)`` with the biggest
+    clusters first.
+    """
+    threshold = settings.DPP_DEDUP_THRESHOLD if threshold is None else threshold
+    table = connection.ops.quote_name(ProductLSHBucket._meta.db_table)
+    clusters = _DisjointSet()
+    best_score = {}
+
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f"SELECT (array_agg(product_id ORDER BY {SAMPLE_ORDER.format(alias='')}))[1:%s] FROM {table} "
+            f"GROUP BY band, bucket HAVING COUNT(*) > 1",
+            [MAX_BUCKET_MEMBERS],
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            groups = [sorted(members) for (members,) in rows]
+            signatures = {
+                pk: unpack(data)
+                for pk, data in ProductSignature.objects.filter(
+                    product_id__in={pk for members in groups for pk in members}
+                ).values_list('product_id', 'signature')
+            }
+            for members in groups:
+                for i, first in enumerate(members):
+                    for second in members[i + 1:]:
+                        if first not in signatures or second not in signatures:
+                            continue
+                        score = similarity(signatures[first], signatures[second])
+                        if score >= threshold:
+                            clusters.union(first, second)
+                            best_score[first] = max(best_score.get(first, 0), score)
+
+    best = defaultdict(float)
+    for pk, score in best_score.items():
+        root = clusters.find(pk)
+        best[root] = max(best[root], score)
+    groups = defaultdict(list)
+    for pk in list(clusters.parent):
+        groups[clusters.find(pk)].append(pk)
+    result = [
+        (sorted(members), best.get(root, 0))
+        for root, members in groups.items() if len(members) > 1
+    ]
+    result.sort(key=lambda item: (-len(item[0]), -item[1]))
+    return result
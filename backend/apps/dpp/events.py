@@ -0,0 +1,190 @@
+"""
+Live change notifications pushed to browsers with Server-Sent Events.
+
+Writers publish a small JSON message to one Redis pub/sub channel after
+commit. Each ASGI worker process holds a single subscription to that channel
+and fans messages out to the in-process queues of its connected clients,
+keyed by organization, so an idle client costs a queue and a suspended
+coroutine rather than a thread or a Redis connection.
+
+Messages name the changed objects only; clients refetch what they display.
+A client that falls too far behind is told to resync and disconnected.
+
+``EventSource`` cannot send an Authorization header, and a token in the URL
+ends up in access logs. Clients therefore trade their token for a ticket
+that opens one stream and expires after ``DPP_EVENTS_TICKET_TIMEOUT``
+seconds.
+"""
+import asyncio
+import json
+import logging
+import secrets
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from redis import asyncio as aioredis
+
+from apps.core.redis_client import get_redis, RedisError
+from . import webhooks
+from .models import ChangeLogEntry, Product, ProductInstance, ProductPassport, SupplyChainEvent
+from .webhooks import EVERYONE
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'dpp:events'
+TICKET_PREFIX = 'dpp:events:ticket:'
+
+
+def _send(message):
+    try:
+        get_redis().publish(CHANNEL, json.dumps(message))
+    except RedisError:
+        logger.warning("Could not publish %s %s event", message['resource'], message['action'], exc_info=True)
+
+
+def publish(resource, ids, action, organizations):
+    """
+    Notify subscribers of ``organizations`` (``EVERYONE`` for all) that the
+    ``resource`` objects ``ids`` changed: webhook deliveries are queued in
+    the current transaction, the live stream is notified once it commits.
+    """
+    # Passports have UUID keys
+    ids = [pk if isinstance(pk, int) else str(pk) for pk in ids]
+    if not ids:
+        return
+    webhooks.enqueue(resource, ids, action, organizations)
+    message = {
+        'resource': resource,
+        'ids': ids,
+        'action': action,
+        'organizations': sorted({str(org) for org in organizations if org is not None}),
+    }
+    transaction.on_commit(lambda: _send(message))
+
+
+def issue_ticket(user):
+    """Return a ticket that opens one event stream as ``user``."""
+    ticket = secrets.token_urlsafe(32)
+    get_redis().set(f'{TICKET_PREFIX}{ticket}', user.pk, ex=settings.DPP_EVENTS_TICKET_TIMEOUT)
+    return ticket
+
+
+def redeem_ticket(ticket):
+    """Return the id of the user ``ticket`` was issued to, or None; a ticket works once."""
+    key = f'{TICKET_PREFIX}{ticket}'
+    pipe = get_redis().pipeline()
+    pipe.get(key)
+    pipe.delete(key)
+    user_id, _ = pipe.execute()
+    return int(user_id) if user_id else None
+
+
+def organizations_for(obj):
+    """Return the organizations allowed to see events about ``obj``."""
+    if isinstance(obj, ProductPassport):
+        return [EVERYONE]
+    if isinstance(obj, Product):
+        return [obj.manufacturer_id]
+    if isinstance(obj, ProductInstance):
+        manufacturer_id = Product.objects.filter(pk=obj.product_id).values_list('manufacturer_id', flat=True).first()
+        return [manufacturer_id, obj.current_owner_id]
+    if isinstance(obj, SupplyChainEvent):
+        return [obj.organization_id]
+    return []
+
+
+def publish_instances(ids, action=ChangeLogEntry.UPSERT):
+    """Publish changes of many instances, grouped by the organizations involved."""
+    groups = defaultdict(list)
+    rows = ProductInstance.objects.filter(pk__in=ids).values_list('pk', 'product__manufacturer_id', 'current_owner_id')
+    for pk, manufacturer_id, owner_id in rows:
+        groups[(manufacturer_id, owner_id)].append(pk)
+    for organizations, group in groups.items():
+        publish('instance', group, action, organizations)
+
+
+class Broker:
+    """
+    Per-process fan-out of the Redis channel to local subscriber queues.
+
+    The subscription is opened with the first subscriber and reconnects
+    with a short back-off if Redis goes away.
+    """
+
+    def __init__(self):
+        self.queues = defaultdict(set)
+        self.task = None
+
+    def subscribe(self, organization):
+        """Return a queue receiving messages for ``organization``."""
+        # One slot more than the messages buffered, for the resync marker
+        queue = asyncio.Queue(maxsize=settings.DPP_EVENTS_QUEUE_SIZE + 1)
+        self.queues[EVERYONE].add(queue)
+        if organization is not None:
+            self.queues[str(organization)].add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue):
+        for key in list(self.queues):
+            self.queues[key].discard(queue)
+            if not self.queues[key]:
+                del self.queues[key]
+
+    def dispatch(self, message):
+        targets = set()
+        for organization in message.get('organizations') or ():
+            targets |= self.queues.get(organization, set())
+        for queue in targets:
+            if queue.qsize() < queue.maxsize - 1:
+                queue.put_nowait(message)
+            else:
+                # A slow client must not hold back the others; it resyncs
+                self.unsubscribe(queue)
+                queue.put_nowait(None)
+
+    async def _listen(self):
+        while self.queues:
+            client = aioredis.from_url(settings.CACHES['default']['LOCATION'])
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    async for item in pubsub.listen():
+                        if item['type'] == 'message':
+                            self.dispatch(json.loads(item['data']))
+                        if not self.queues:
+                            return
+            except (RedisError, OSError):
+                logger.warning("Event subscription lost, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await client.close()
+
+
+broker = Broker()
+
+
+async def stream(organization):
+    """
+    Yield the SSE stream for one client: a ``change`` event per message and
+    a comment line every ``DPP_EVENTS_HEARTBEAT`` seconds to keep proxies
+    from closing the idle connection.
+    """
+    queue = broker.subscribe(organization)
+    try:
+        yield f"retry: {settings.DPP_EVENTS_RETRY_MS}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), settings.DPP_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            data = {key: message[key] for key in ('resource', 'ids', 'action')}
+            yield f"event: change\ndata: {json.dumps(data)}\n\n"
+    finally:
+        broker.unsubscribe(queue)
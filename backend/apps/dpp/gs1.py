@@ -0,0 +1,146 @@
+"""
+GS1 identifiers: GTIN validation and GS1 Digital Link parsing/resolution.
+
+Retail scanners send either a bare GTIN, a GS1 element string such as
+``(01)09506000134352(21)ABC123`` or a Digital Link URI path such as
+``/01/09506000134352/21/ABC123?10=LOT7``. All of them are reduced to a dict
+of application identifiers with the GTIN normalized to 14 digits.
+
+``Product.barcode`` may hold the same GTIN as EAN-13, UPC-A or GTIN-14, so
+lookups try every zero-padded form against the barcode index. The resolved
+product id is cached per GTIN, which makes a repeated resolution one cache
+read plus the primary key or serial number lookup the scan path does anyway.
+"""
+import re
+from urllib.parse import parse_qsl, unquote
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product
+
+# Application identifiers understood in Digital Link paths and element strings
+GTIN = '01'
+BATCH = '10'
+SERIAL = '21'
+KNOWN_AIS = {GTIN: 'gtin', BATCH: 'batch', SERIAL: 'serial'}
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+ELEMENT_STRING = re.compile(r'\((\d{2,4})\)([^(]+)')
+NOT_FOUND = 0
+
+
+class GS1Error(ValueError):
+    """Raised for malformed GS1 input."""
+
+
+def check_digit(digits):
+    """Return the GS1 mod-10 check digit for ``digits`` (without the check digit)."""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_gtin(value):
+    """Return ``value`` as a validated GTIN-14, or raise ``GS1Error``."""
+    value = (value or '').strip()
+    if not value.isdigit() or len(value) not in GTIN_LENGTHS:
+        raise GS1Error(f"'{value}' is not a GTIN-8, -12, -13 or -14.")
+    if check_digit(value[:-1]) != value[-1]:
+        raise GS1Error(f"'{value}' has an invalid check digit.")
+    return value.zfill(14)
+
+
+def gtin_variants(gtin14):
+    """Return the forms a GTIN-14 may be stored in as a barcode."""
+    variants = {gtin14}
+    for length in (13, 12, 8):
+        if gtin14[:14 - length] == '0' * (14 - length):
+            variants.add(gtin14[14 - length:])
+    return variants
+
+
+def parse(value):
+    """
+    Parse a Digital Link path, element string or bare GTIN into a dict like
+    ``{'gtin': '09506000134352', 'serial': 'ABC123', 'batch': 'LOT7'}``.
+    """
+    value = (value or '').strip()
+    path, _, query = value.partition('?')
+    found = {}
+    if path.startswith('('):
+        pairs = ELEMENT_STRING.findall(path)
+    elif path.strip('/').isdigit():
+        pairs = [(GTIN, path.strip('/'))]
+    else:
+        segments = [unquote(s) for s in path.strip('/').split('/')]
+        try:
+            # Digital Link URIs may carry a custom prefix before the primary key
+            start = segments.index(GTIN)
+        except ValueError:
+            raise GS1Error("No GTIN (AI 01) in the link.")
+        segments = segments[start:]
+        if len(segments) % 2:
+            raise GS1Error("Digital Link path must consist of AI/value pairs.")
+        pairs = list(zip(segments[::2], segments[1::2]))
+    pairs += [(key, val) for key, val in parse_qsl(query) if key.isdigit()]
+
+    for ai, ai_value in pairs:
+        if ai in KNOWN_AIS:
+            found.setdefault(KNOWN_AIS[ai], ai_value.strip())
+    if 'gtin' not in found:
+        raise GS1Error("No GTIN (AI 01) in the link.")
+    found['gtin'] = normalize_gtin(found['gtin'])
+    return found
+
+
+def _cache_key(gtin14):
+    return f'dpp:gs1:gtin:{gtin14}'
+
+
+def product_id_for_gtin(gtin14):
+    """Return the id of the product with GTIN ``gtin14``, or ``None``."""
+    key = _cache_key(gtin14)
+    product_id = cache.get(key)
+    if product_id is None:
+        product_id = (
+            Product.objects
+            .filter(barcode__in=gtin_variants(gtin14), is_active=True)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+            .first()
+        ) or NOT_FOUND
+        timeout = settings.DPP_GS1_CACHE_TIMEOUT if product_id else settings.DPP_GS1_NEGATIVE_CACHE_TIMEOUT
+        cache.set(key, product_id, timeout)
+    return product_id or None
+
+
+def resolve_product(gtin14):
+    """
+    Return the active product with GTIN ``gtin14``, or ``None``.
+
+    A cached id is re-checked against the fetched product, so a stale entry
+    left by a barcode change is detected and looked up again.
+    """
+    product_id = product_id_for_gtin(gtin14)
+    if product_id is None:
+        return None
+    product = Product.objects.select_related('manufacturer').filter(pk=product_id).first()
+    if product and product.is_active and barcode_gtin(product.barcode) == gtin14:
+        return product
+    cache.delete(_cache_key(gtin14))
+    product_id = product_id_for_gtin(gtin14)
+    return Product.objects.select_related('manufacturer').filter(pk=product_id).first() if product_id else None
+
+
+def barcode_gtin(barcode):
+    try:
+        return normalize_gtin(barcode)
+    except GS1Error:
+        return None
+
+
+def invalidate_barcode(barcode):
+    """Forget the cached lookup of ``barcode``'s GTIN."""
+    gtin14 = barcode_gtin(barcode)
+    if gtin14:
+        cache.delete(_cache_key(gtin14))
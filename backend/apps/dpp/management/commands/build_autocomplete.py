@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dpp.autocomplete import INDEXES
+
+
+class Command(BaseCommand):
+    help = "Build the Redis autocomplete index for product, material and organization names"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*',
+                            help=f"Indexes to build: {', '.join(sorted(INDEXES))} (default: all)")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Rows per database fetch and Redis pipeline (default: 2000)")
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'] or sorted(INDEXES)
+        unknown = set(kinds) - set(INDEXES)
+        if unknown:
+            raise CommandError(f"Unknown index: {', '.join(sorted(unknown))}")
+        for kind in kinds:
+            count = INDEXES[kind].build(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {kind}"))
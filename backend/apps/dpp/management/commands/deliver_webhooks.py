@@ -0,0 +1,31 @@
+import asyncio
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.dpp import webhooks
+
+
+class Command(BaseCommand):
+    help = "Deliver queued webhook notifications (runs until interrupted)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Deliver one round of due notifications and exit")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait when nothing is due (default: 1)")
+        parser.add_argument('--purge', action='store_true',
+                            help="Delete delivered and abandoned notifications older than "
+                                 "DPP_WEBHOOK_RETENTION_DAYS and exit")
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            removed = webhooks.purge(timezone.now() - timedelta(days=settings.DPP_WEBHOOK_RETENTION_DAYS))
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} webhook deliveries"))
+            return
+        try:
+            claimed = asyncio.run(webhooks.run(options['poll_interval'], once=options['once']))
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f"Processed {claimed} webhook deliveries"))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.dpp.analytics import flush_closed_hours, hour_to_datetime
+
+
+class Command(BaseCommand):
+    help = "Flush buffered scan counters from Redis into the hourly rollup tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running and flush every --interval seconds")
+        parser.add_argument('--interval', type=int, default=300,
+                            help="Seconds between flushes in --loop mode (default: 300)")
+
+    def handle(self, *args, **options):
+        while True:
+            for hour, products, serials in flush_closed_hours():
+                self.stdout.write(
+                    f"{hour_to_datetime(hour):%Y-%m-%d %H:00}: "
+                    f"{products} product rows, {serials} serial rows"
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
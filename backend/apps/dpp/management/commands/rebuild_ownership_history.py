@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.dpp import timeline
+from apps.dpp.models import SupplyChainEvent
+
+
+class Command(BaseCommand):
+    help = "Recompute the derived ownership history from supply chain events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('instances', nargs='*', type=int,
+                            help="Product instance IDs (default: every instance with events)")
+
+    def handle(self, *args, **options):
+        instance_ids = options['instances'] or (
+            SupplyChainEvent.objects.order_by('product_instance_id')
+            .values_list('product_instance_id', flat=True).distinct().iterator()
+        )
+        count = 0
+        for instance_id in instance_ids:
+            timeline.rebuild(instance_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ownership history for {count} instances"))
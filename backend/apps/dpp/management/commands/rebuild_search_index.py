@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.dpp.search import SOURCES, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the unified search index from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('types', nargs='*',
+                            help=f"Document types to rebuild: {', '.join(SOURCES)} (default: all)")
+        parser.add_argument('--chunk-size', type=int, default=10_000,
+                            help="Primary key range indexed per transaction (default: 10000)")
+
+    def handle(self, *args, **options):
+        doc_types = options['types'] or list(SOURCES)
+        unknown = set(doc_types) - set(SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown document type: {', '.join(sorted(unknown))}")
+        for doc_type in doc_types:
+            count = rebuild(doc_type, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {doc_type} documents"))
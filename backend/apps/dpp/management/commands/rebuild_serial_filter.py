@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.dpp.serial_filter import filter_shape, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the shared Bloom filter of product instance serial numbers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000,
+                            help="Rows fetched per database round trip (default: 10000)")
+
+    def handle(self, *args, **options):
+        size_bits, num_hashes = filter_shape()
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {count} serial numbers into a {size_bits // 8 // 1024} KiB filter "
+            f"with {num_hashes} hash functions"
+        ))
@@ -0,0 +1,43 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from apps.dpp.dedup import duplicate_clusters, rebuild
+from apps.dpp.models import Product
+
+
+class Command(BaseCommand):
+    help = "Report clusters of likely duplicate products across the whole catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recompute every product signature first")
+        parser.add_argument('--threshold', type=float, default=None,
+                            help="Minimum estimated similarity (default: DPP_DEDUP_THRESHOLD)")
+        parser.add_argument('--csv', action='store_true',
+                            help="Write cluster,product_id,name,model_number,manufacturer rows as CSV")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rebuild()
+            self.stderr.write(f"Indexed {count} products")
+
+        clusters = duplicate_clusters(threshold=options['threshold'])
+        if options['csv']:
+            writer = csv.writer(self.stdout)
+            writer.writerow(['cluster', 'product_id', 'name', 'model_number', 'manufacturer'])
+        for number, (product_ids, best) in enumerate(clusters, start=1):
+            products = Product.objects.filter(pk__in=product_ids).select_related('manufacturer').order_by('pk')
+            if options['csv']:
+                for product in products:
+                    writer.writerow([number, product.pk, product.name, product.model_number or '',
+                                     product.manufacturer.name])
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Cluster {number}: {len(product_ids)} products, best similarity {best:.2f}"
+            ))
+            for product in products:
+                self.stdout.write(f"  {product.pk}: {product.name} [{product.model_number or '-'}] "
+                                  f"({product.manufacturer.name})")
+        if not options['csv']:
+            self.stdout.write(self.style.SUCCESS(f"{len(clusters)} clusters of likely duplicates"))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dpp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductScanRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('scan_count', models.PositiveIntegerField(default=0, verbose_name='Scan count')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='Unique visitors (estimate)')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_rollups', to='dpp.product')),
+            ],
+            options={
+                'verbose_name': 'Product scan rollup',
+                'verbose_name_plural': 'Product scan rollups',
+                'ordering': ['hour'],
+                'unique_together': {('product', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SerialScanRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('scan_count', models.PositiveIntegerField(default=0, verbose_name='Scan count')),
+                ('unique_visitors', models.PositiveIntegerField(default=0, verbose_name='Unique visitors (estimate)')),
+                ('product_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_rollups', to='dpp.productinstance')),
+            ],
+            options={
+                'verbose_name': 'Serial scan rollup',
+                'verbose_name_plural': 'Serial scan rollups',
+                'ordering': ['hour'],
+                'unique_together': {('product_instance', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dpp', '0002_scan_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productinstance',
+            index=models.Index(fields=['manufacturing_batch', 'current_owner'], name='dpp_instance_batch_owner_idx'),
+        ),
+        migrations.CreateModel(
+            name='Recall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('manufacturing_batch', models.CharField(max_length=100, verbose_name='Manufacturing batch')),
+                ('reason', models.TextField(verbose_name='Reason')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('notified', 'Notified'), ('closed', 'Closed')], default='open', max_length=20, verbose_name='Status')),
+                ('notified_at', models.DateTimeField(blank=True, null=True, verbose_name='Notified at')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_recalls', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('manufacturer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recalls', to='dpp.organization', verbose_name='Manufacturer')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recalls', to='dpp.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Recall',
+                'verbose_name_plural': 'Recalls',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecallNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('affected_count', models.PositiveIntegerField(verbose_name='Affected instances')),
+                ('recipients', models.PositiveIntegerField(default=0, verbose_name='Recipients')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recall_notifications', to='dpp.organization')),
+                ('recall', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='dpp.recall')),
+            ],
+            options={
+                'verbose_name': 'Recall notification',
+                'verbose_name_plural': 'Recall notifications',
+                'unique_together': {('recall', 'organization')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dpp', '0003_recalls'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplychainevent',
+            index=models.Index(fields=['product_instance', 'date'], name='dpp_event_instance_date_idx'),
+        ),
+        migrations.CreateModel(
+            name='OwnershipPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valid_from', models.DateTimeField(verbose_name='Valid from')),
+                ('valid_to', models.DateTimeField(blank=True, null=True, verbose_name='Valid to')),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dpp.supplychainevent')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ownership_periods', to='dpp.organization')),
+                ('product_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ownership_periods', to='dpp.productinstance')),
+            ],
+            options={
+                'verbose_name': 'Ownership period',
+                'verbose_name_plural': 'Ownership periods',
+                'ordering': ['valid_from'],
+                'indexes': [models.Index(fields=['product_instance', 'valid_from'], name='dpp_ownership_instance_idx')],
+            },
+        ),
+    ]
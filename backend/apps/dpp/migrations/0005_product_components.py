@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dpp', '0004_timeline_ownership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductComponent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('quantity', models.DecimalField(decimal_places=3, default=1, max_digits=10, verbose_name='Quantity')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+                ('component', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='used_in', to='dpp.product', verbose_name='Component')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_product_components', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('parent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='components', to='dpp.product', verbose_name='Parent product')),
+            ],
+            options={
+                'verbose_name': 'Product component',
+                'verbose_name_plural': 'Product components',
+                'unique_together': {('parent', 'component')},
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productcomponent',
+            constraint=models.CheckConstraint(check=models.Q(('parent', models.F('component')), _negated=True), name='dpp_component_not_self'),
+        ),
+        migrations.AddConstraint(
+            model_name='productcomponent',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gt', 0)), name='dpp_component_quantity_positive'),
+        ),
+    ]
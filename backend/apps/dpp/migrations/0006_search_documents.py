@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dpp', '0005_product_components'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('product', 'Product'), ('instance', 'Product instance'), ('repair', 'Repair record'), ('certificate', 'Certificate'), ('organization', 'Organization')], max_length=20, verbose_name='Type')),
+                ('object_id', models.BigIntegerField(verbose_name='Object ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Title')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(verbose_name='Search vector')),
+                ('manufacturer_id', models.BigIntegerField(blank=True, null=True, verbose_name='Manufacturer ID')),
+                ('category_id', models.BigIntegerField(blank=True, null=True, verbose_name='Category ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+            ],
+            options={
+                'verbose_name': 'Search document',
+                'verbose_name_plural': 'Search documents',
+                'unique_together': {('doc_type', 'object_id')},
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='dpp_search_vector_idx'), models.Index(fields=['manufacturer_id'], name='dpp_search_manufacturer_idx'), models.Index(fields=['category_id'], name='dpp_search_category_idx')],
+            },
+        ),
+    ]
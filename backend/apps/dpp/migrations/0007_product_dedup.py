@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dpp', '0006_search_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSignature',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='dpp.product')),
+                ('signature', models.BinaryField(verbose_name='Signature')),
+            ],
+            options={
+                'verbose_name': 'Product signature',
+                'verbose_name_plural': 'Product signatures',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Band')),
+                ('bucket', models.BigIntegerField(verbose_name='Bucket')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='dpp.product')),
+            ],
+            options={
+                'verbose_name': 'Product LSH bucket',
+                'verbose_name_plural': 'Product LSH buckets',
+                'unique_together': {('product', 'band')},
+                'indexes': [models.Index(fields=['band', 'bucket'], name='dpp_lsh_band_bucket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dpp', '0007_product_dedup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['barcode'], name='dpp_product_barcode_idx'),
+        ),
+    ]
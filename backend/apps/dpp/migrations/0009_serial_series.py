@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dpp', '0008_product_barcode_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerialSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('name', models.CharField(max_length=255, verbose_name='Name')),
+                ('template', models.CharField(max_length=100, unique=True, verbose_name='Template')),
+                ('next_value', models.BigIntegerField(default=1, verbose_name='Next value')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_serial_series', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('manufacturer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='serial_series', to='dpp.organization', verbose_name='Manufacturer')),
+            ],
+            options={
+                'verbose_name': 'Serial series',
+                'verbose_name_plural': 'Serial series',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dpp', '0009_serial_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resource', models.CharField(max_length=30, verbose_name='Resource')),
+                ('object_id', models.CharField(max_length=64, verbose_name='Object ID')),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10, verbose_name='Action')),
+                ('txid', models.BigIntegerField(verbose_name='Transaction ID')),
+                ('changed_at', models.DateTimeField(verbose_name='Changed at')),
+            ],
+            options={
+                'verbose_name': 'Change log entry',
+                'verbose_name_plural': 'Change log entries',
+                'indexes': [
+                    models.Index(fields=['txid', 'id'], name='dpp_changelog_cursor_idx'),
+                    models.Index(fields=['resource', 'txid', 'id'], name='dpp_changelog_resource_idx'),
+                    models.Index(fields=['changed_at'], name='dpp_changelog_changed_idx'),
+                ],
+            },
+        ),
+    ]
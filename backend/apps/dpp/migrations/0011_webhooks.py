@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:50
+
+import apps.dpp.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dpp', '0010_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('url', models.URLField(max_length=500, verbose_name='URL')),
+                ('resources', models.JSONField(blank=True, default=list, verbose_name='Resources')),
+                ('secret', models.CharField(default=apps.dpp.models.generate_webhook_secret, max_length=64, verbose_name='Signing secret')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Active')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_webhook_subscriptions', to=settings.AUTH_USER_MODEL, verbose_name='Created by')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='webhook_subscriptions', to='dpp.organization', verbose_name='Organization')),
+            ],
+            options={
+                'verbose_name': 'Webhook subscription',
+                'verbose_name_plural': 'Webhook subscriptions',
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(verbose_name='Payload')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt_at', models.DateTimeField(verbose_name='Next attempt at')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Delivered at')),
+                ('failed_at', models.DateTimeField(blank=True, null=True, verbose_name='Given up at')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last error')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='dpp.webhooksubscription', verbose_name='Subscription')),
+            ],
+            options={
+                'verbose_name': 'Webhook delivery',
+                'verbose_name_plural': 'Webhook deliveries',
+                'indexes': [models.Index(condition=models.Q(('delivered_at__isnull', True), ('failed_at__isnull', True)), fields=['next_attempt_at'], name='dpp_webhook_pending_idx')],
+            },
+        ),
+    ]
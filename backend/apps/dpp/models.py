@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from apps.core.models import TimeStampedModel
 # Tymczasowo zakomentowane - problem z kluczem szyfrowania
 # from encrypted_model_fields.fields import EncryptedTextField
@@ -133,6 +135,9 @@ class Product(TimeStampedModel):
     class Meta:
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
+        indexes = [
+            models.Index(fields=['barcode'], name='dpp_product_barcode_idx'),
+        ]
         
     def __str__(self):
         return self.name
@@ -160,6 +165,71 @@ class ProductMaterial(TimeStampedModel):
         return f"{self.product.name} - {self.material.name} ({self.percentage}%)"
 
 
+class ProductComponent(TimeStampedModel):
+    """
+    Bill of materials edge: ``quantity`` units of ``component`` go into ``parent``
+    """
+    parent = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='components',
+                               verbose_name=_("Parent product"))
+    component = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='used_in',
+                                  verbose_name=_("Component"))
+    quantity = models.DecimalField(max_digits=10, decimal_places=3, default=1, verbose_name=_("Quantity"))
+    notes = models.TextField(verbose_name=_("Notes"), blank=True, null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='created_product_components',
+                                 verbose_name=_("Created by"))
+
+    class Meta:
+        verbose_name = _("Product component")
+        verbose_name_plural = _("Product components")
+        unique_together = ('parent', 'component')
+        constraints = [
+            models.CheckConstraint(check=~models.Q(parent=models.F('component')),
+                                   name='dpp_component_not_self'),
+            models.CheckConstraint(check=models.Q(quantity__gt=0), name='dpp_component_quantity_positive'),
+        ]
+
+    def __str__(self):
+        return f"{self.parent_id} <- {self.quantity} x {self.component_id}"
+
+
+class ProductSignature(models.Model):
+    """
+    MinHash signature of a product's text, see ``apps.dpp.dedup``
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='signature')
+    signature = models.BinaryField(verbose_name=_("Signature"))
+
+    class Meta:
+        verbose_name = _("Product signature")
+        verbose_name_plural = _("Product signatures")
+
+    def __str__(self):
+        return f"Signature of {self.product_id}"
+
+
+class ProductLSHBucket(models.Model):
+    """
+    LSH bucket of one band of a product signature; products sharing a bucket
+    are duplicate candidates
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='lsh_buckets')
+    band = models.PositiveSmallIntegerField(verbose_name=_("Band"))
+    bucket = models.BigIntegerField(verbose_name=_("Bucket"))
+
+    class Meta:
+        verbose_name = _("Product LSH bucket")
+        verbose_name_plural = _("Product LSH buckets")
+        unique_together = ('product', 'band')
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='dpp_lsh_band_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: band {self.band} -> {self.bucket}"
+
+
 class ProductInstance(TimeStampedModel):
     """
     Instance of a product (individual item) with unique identifier
@@ -185,11 +255,40 @@ class ProductInstance(TimeStampedModel):
     class Meta:
         verbose_name = _("Product instance")
         verbose_name_plural = _("Product instances")
+        indexes = [
+            # Recall lookups by batch, grouped by current owner
+            models.Index(fields=['manufacturing_batch', 'current_owner'], name='dpp_instance_batch_owner_idx'),
+        ]
         
     def __str__(self):
         return f"{self.product.name} - {self.serial_number}"
 
 
+class SerialSeries(TimeStampedModel):
+    """
+    Serial number series of a manufacturer, rendered from ``template``.
+
+    ``template`` is a ``str.format`` pattern with a ``{seq}`` counter and
+    optionally ``{year}`` and ``{batch}``, e.g. ``EB-{year}-{seq:08d}``.
+    Serials are handed out in contiguous blocks, see ``apps.dpp.serials``.
+    """
+    manufacturer = models.ForeignKey(Organization, on_delete=models.CASCADE,
+                                     related_name='serial_series', verbose_name=_("Manufacturer"))
+    name = models.CharField(max_length=255, verbose_name=_("Name"))
+    template = models.CharField(max_length=100, unique=True, verbose_name=_("Template"))
+    next_value = models.BigIntegerField(default=1, verbose_name=_("Next value"))
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='created_serial_series',
+                                 verbose_name=_("Created by"))
+
+    class Meta:
+        verbose_name = _("Serial series")
+        verbose_name_plural = _("Serial series")
+
+    def __str__(self):
+        return f"{self.name} ({self.template})"
+
+
 class SupplyChainEvent(TimeStampedModel):
     """
     Events in the supply chain for product tracking
@@ -226,11 +325,44 @@ class SupplyChainEvent(TimeStampedModel):
         verbose_name = _("Supply chain event")
         verbose_name_plural = _("Supply chain events")
         ordering = ['-date']
+        indexes = [
+            # Per-instance timelines, newest first (scanned backwards)
+            models.Index(fields=['product_instance', 'date'], name='dpp_event_instance_date_idx'),
+        ]
         
     def __str__(self):
         return f"{self.product_instance} - {self.get_event_type_display()} ({self.date})"
 
 
+class OwnershipPeriod(models.Model):
+    """
+    Derived ownership history of a product instance.
+
+    Each supply chain event hands the instance to the event's organization;
+    consecutive events by the same organization collapse into one period.
+    Maintained from ``SupplyChainEvent`` writes, see ``apps.dpp.timeline``.
+    """
+    product_instance = models.ForeignKey(ProductInstance, on_delete=models.CASCADE,
+                                         related_name='ownership_periods')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE,
+                                     related_name='ownership_periods')
+    valid_from = models.DateTimeField(verbose_name=_("Valid from"))
+    valid_to = models.DateTimeField(verbose_name=_("Valid to"), blank=True, null=True)
+    event = models.ForeignKey(SupplyChainEvent, on_delete=models.SET_NULL, blank=True, null=True,
+                              related_name='+')
+
+    class Meta:
+        verbose_name = _("Ownership period")
+        verbose_name_plural = _("Ownership periods")
+        ordering = ['valid_from']
+        indexes = [
+            models.Index(fields=['product_instance', 'valid_from'], name='dpp_ownership_instance_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_instance_id}: {self.organization_id} from {self.valid_from}"
+
+
 class RepairRecord(TimeStampedModel):
     """
     Repair records for product instances
@@ -324,4 +456,234 @@ class ProductPassport(models.Model):
     class Meta:
         ordering = ['-updated_at']
         verbose_name = "Product Passport"
-        verbose_name_plural = "Product Passports" 
\ No newline at end of file
+        verbose_name_plural = "Product Passports" 
+
+
+class ProductScanRollup(models.Model):
+    """
+    Hourly scan totals per product, flushed from the Redis scan counters
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='scan_rollups')
+    hour = models.DateTimeField(verbose_name=_("Hour"))
+    scan_count = models.PositiveIntegerField(default=0, verbose_name=_("Scan count"))
+    unique_visitors = models.PositiveIntegerField(default=0, verbose_name=_("Unique visitors (estimate)"))
+
+    class Meta:
+        verbose_name = _("Product scan rollup")
+        verbose_name_plural = _("Product scan rollups")
+        unique_together = ('product', 'hour')
+        ordering = ['hour']
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.hour:%Y-%m-%d %H:00}: {self.scan_count}"
+
+
+class SerialScanRollup(models.Model):
+    """
+    Hourly scan totals per product instance, flushed from the Redis scan counters
+    """
+    product_instance = models.ForeignKey(ProductInstance, on_delete=models.CASCADE, related_name='scan_rollups')
+    hour = models.DateTimeField(verbose_name=_("Hour"))
+    scan_count = models.PositiveIntegerField(default=0, verbose_name=_("Scan count"))
+    unique_visitors = models.PositiveIntegerField(default=0, verbose_name=_("Unique visitors (estimate)"))
+
+    class Meta:
+        verbose_name = _("Serial scan rollup")
+        verbose_name_plural = _("Serial scan rollups")
+        unique_together = ('product_instance', 'hour')
+        ordering = ['hour']
+
+    def __str__(self):
+        return f"{self.product_instance_id} @ {self.hour:%Y-%m-%d %H:00}: {self.scan_count}"
+
+
+class Recall(TimeStampedModel):
+    """
+    Recall of all product instances from a manufacturing batch
+    """
+    OPEN = 'open'
+    NOTIFIED = 'notified'
+    CLOSED = 'closed'
+
+    STATUSES = [
+        (OPEN, _('Open')),
+        (NOTIFIED, _('Notified')),
+        (CLOSED, _('Closed')),
+    ]
+
+    manufacturer = models.ForeignKey(Organization, on_delete=models.CASCADE,
+                                     related_name='recalls', verbose_name=_("Manufacturer"))
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, blank=True, null=True,
+                                related_name='recalls', verbose_name=_("Product"))
+    manufacturing_batch = models.CharField(max_length=100, verbose_name=_("Manufacturing batch"))
+    reason = models.TextField(verbose_name=_("Reason"))
+    status = models.CharField(max_length=20, choices=STATUSES, default=OPEN, verbose_name=_("Status"))
+    notified_at = models.DateTimeField(verbose_name=_("Notified at"), blank=True, null=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='created_recalls',
+                                 verbose_name=_("Created by"))
+
+    class Meta:
+        verbose_name = _("Recall")
+        verbose_name_plural = _("Recalls")
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Recall of batch {self.manufacturing_batch} ({self.get_status_display()})"
+
+
+class RecallNotification(TimeStampedModel):
+    """
+    Notification sent to an organization holding recalled product instances
+    """
+    recall = models.ForeignKey(Recall, on_delete=models.CASCADE, related_name='notifications')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE,
+                                     related_name='recall_notifications')
+    affected_count = models.PositiveIntegerField(verbose_name=_("Affected instances"))
+    recipients = models.PositiveIntegerField(default=0, verbose_name=_("Recipients"))
+
+    class Meta:
+        verbose_name = _("Recall notification")
+        verbose_name_plural = _("Recall notifications")
+        unique_together = ('recall', 'organization')
+
+    def __str__(self):
+        return f"{self.recall} -> {self.organization} ({self.affected_count})"
+
+
+class SearchDocument(models.Model):
+    """
+    One row per searchable object across models, maintained by ``apps.dpp.search``
+    """
+    PRODUCT = 'product'
+    INSTANCE = 'instance'
+    REPAIR = 'repair'
+    CERTIFICATE = 'certificate'
+    ORGANIZATION = 'organization'
+
+    DOC_TYPES = [
+        (PRODUCT, _('Product')),
+        (INSTANCE, _('Product instance')),
+        (REPAIR, _('Repair record')),
+        (CERTIFICATE, _('Certificate')),
+        (ORGANIZATION, _('Organization')),
+    ]
+
+    doc_type = models.CharField(max_length=20, choices=DOC_TYPES, verbose_name=_("Type"))
+    object_id = models.BigIntegerField(verbose_name=_("Object ID"))
+    title = models.CharField(max_length=255, verbose_name=_("Title"))
+    search_vector = SearchVectorField(verbose_name=_("Search vector"))
+    # Facets, denormalized so counting them never joins the source tables
+    manufacturer_id = models.BigIntegerField(verbose_name=_("Manufacturer ID"), blank=True, null=True)
+    category_id = models.BigIntegerField(verbose_name=_("Category ID"), blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
+
+    class Meta:
+        verbose_name = _("Search document")
+        verbose_name_plural = _("Search documents")
+        unique_together = ('doc_type', 'object_id')
+        indexes = [
+            GinIndex(fields=['search_vector'], name='dpp_search_vector_idx'),
+            models.Index(fields=['manufacturer_id'], name='dpp_search_manufacturer_idx'),
+            models.Index(fields=['category_id'], name='dpp_search_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doc_type} {self.object_id}: {self.title}"
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only log of changes to API resources, read by the change feed in
+    ``apps.dpp.changes``. Deletions are kept as tombstones.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+
+    ACTIONS = [
+        (UPSERT, _('Created or updated')),
+        (DELETE, _('Deleted')),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    resource = models.CharField(max_length=30, verbose_name=_("Resource"))
+    # Text, so passports (UUID keys) share the log with integer keyed models
+    object_id = models.CharField(max_length=64, verbose_name=_("Object ID"))
+    action = models.CharField(max_length=10, choices=ACTIONS, verbose_name=_("Action"))
+    # Writing transaction; the feed only returns transactions that finished
+    txid = models.BigIntegerField(verbose_name=_("Transaction ID"))
+    changed_at = models.DateTimeField(verbose_name=_("Changed at"))
+
+    class Meta:
+        verbose_name = _("Change log entry")
+        verbose_name_plural = _("Change log entries")
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='dpp_changelog_cursor_idx'),
+            models.Index(fields=['resource', 'txid', 'id'], name='dpp_changelog_resource_idx'),
+            models.Index(fields=['changed_at'], name='dpp_changelog_changed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.resource} {self.object_id}"
+
+
+def generate_webhook_secret():
+    return uuid.uuid4().hex + uuid.uuid4().hex
+
+
+class WebhookSubscription(TimeStampedModel):
+    """
+    An integrator's endpoint notified of changes visible to ``organization``,
+    see ``apps.dpp.webhooks``
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE,
+                                     related_name='webhook_subscriptions', verbose_name=_("Organization"))
+    url = models.URLField(max_length=500, verbose_name=_("URL"))
+    # Resource names (passport, product, instance, event); empty means all
+    resources = models.JSONField(default=list, blank=True, verbose_name=_("Resources"))
+    secret = models.CharField(max_length=64, default=generate_webhook_secret, verbose_name=_("Signing secret"))
+    is_active = models.BooleanField(default=True, verbose_name=_("Active"))
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='created_webhook_subscriptions',
+                                 verbose_name=_("Created by"))
+
+    class Meta:
+        verbose_name = _("Webhook subscription")
+        verbose_name_plural = _("Webhook subscriptions")
+
+    def __str__(self):
+        return f"{self.organization} -> {self.url}"
+
+    def wants(self, resource):
+        return not self.resources or resource in self.resources
+
+
+class WebhookDelivery(models.Model):
+    """
+    Outbox row: one change notification waiting to be (or already) delivered
+    to one subscription. Written in the transaction of the change itself.
+    """
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE,
+                                     related_name='deliveries', verbose_name=_("Subscription"))
+    payload = models.JSONField(verbose_name=_("Payload"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created at"))
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_("Attempts"))
+    next_attempt_at = models.DateTimeField(verbose_name=_("Next attempt at"))
+    delivered_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Delivered at"))
+    failed_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Given up at"))
+    last_error = models.TextField(blank=True, verbose_name=_("Last error"))
+
+    class Meta:
+        verbose_name = _("Webhook delivery")
+        verbose_name_plural = _("Webhook deliveries")
+        indexes = [
+            # Only pending rows are ever scanned by the delivery worker
+            models.Index(fields=['next_attempt_at'], name='dpp_webhook_pending_idx',
+                         condition=models.Q(delivered_at__isnull=True, failed_at__isnull=True)),
+            # The oldest pending row of each subscription decides if it is due
+            models.Index(fields=['subscription', 'id'], name='dpp_webhook_sub_pending_idx',
+                         condition=models.Q(delivered_at__isnull=True, failed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.subscription_id}: {self.payload.get('resource')} {self.payload.get('action')}"
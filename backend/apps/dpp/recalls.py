@@ -0,0 +1,158 @@
+"""
+Recall engine: find every instance of a recalled batch, where it is now, and
+notify the organizations holding it.
+
+All of it is set-based so it works for batches of millions of units:
+
+* affected instances come from the (manufacturing_batch, current_owner) index,
+* the "where is it now" projection attaches the latest supply chain event to
+  each instance with one correlated subquery, in the same query,
+* results are streamed with a server-side cursor instead of being loaded,
+* notifications are grouped per owning organization with one GROUP BY and
+  their emails go through the outbox, so they are sent after commit by the
+  ``send_queued_emails`` worker and retried on failure.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import JSONObject
+from django.utils import timezone
+
+from apps.users import outbox
+from .models import ProductInstance, Recall, RecallNotification, SupplyChainEvent
+
+User = get_user_model()
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def affected_instances(recall):
+    """Return the queryset of instances covered by ``recall``."""
+    queryset = ProductInstance.objects.filter(
+        manufacturing_batch=recall.manufacturing_batch,
+        product__manufacturer_id=recall.manufacturer_id,
+    )
+    if recall.product_id:
+        queryset = queryset.filter(product_id=recall.product_id)
+    return queryset
+
+
+def locate(queryset):
+    """
+    Project instances onto their current owner and latest known whereabouts.
+
+    Returns a values queryset; the latest event is fetched by a correlated
+    subquery that reads ``dpp_event_instance_date_idx`` backwards.
+    """
+    latest_event = (
+        SupplyChainEvent.objects
+        .filter(product_instance=OuterRef('pk'))
+        .order_by('-date')
+        .values(data=JSONObject(
+            event_type='event_type',
+            location='location',
+            date='date',
+            organization='organization_id',
+        ))[:1]
+    )
+    return queryset.order_by('pk').values(
+        'pk',
+        'serial_number',
+        'product_id',
+        'current_owner_id',
+        'current_owner__name',
+        'is_sold',
+    ).annotate(latest_event=Subquery(latest_event))
+
+
+def stream_locations(recall):
+    """Yield the located affected instances as newline-delimited JSON."""
+    for row in locate(affected_instances(recall)).iterator(chunk_size=STREAM_CHUNK_SIZE):
+        latest = row['latest_event']
+        if isinstance(latest, str):
+            latest = json.loads(latest)
+        yield json.dumps({
+            'id': row['pk'],
+            'serial_number': row['serial_number'],
+            'product': row['product_id'],
+            'current_owner': row['current_owner_id'],
+            'current_owner_name': row['current_owner__name'],
+            'is_sold': row['is_sold'],
+            'latest_event': latest,
+        }, cls=DjangoJSONEncoder) + '\n'
+
+
+def owner_summary(recall):
+    """Return ``{organization_id or None: affected count}`` for ``recall``."""
+    rows = (
+        affected_instances(recall)
+        .order_by()
+        .values('current_owner_id')
+        .annotate(count=Count('pk'))
+    )
+    return {row['current_owner_id']: row['count'] for row in rows}
+
+
+def notify(recall, batch_size=1000):
+    """
+    Notify every organization holding affected instances.
+
+    One notification row and one queued email per organization, addressed to
+    its active users, whatever the number of affected units. Organizations
+    that were already notified for this recall are skipped. The recall row
+    is locked for the whole run, so concurrent calls notify each
+    organization once. Returns the list of new ``RecallNotification``
+    objects.
+    """
+    with transaction.atomic():
+        recall = Recall.objects.select_for_update().select_related('manufacturer').get(pk=recall.pk)
+        summary = owner_summary(recall)
+        summary.pop(None, None)
+        already = set(recall.notifications.values_list('organization_id', flat=True))
+        pending = {org_id: count for org_id, count in summary.items() if org_id not in already}
+
+        org_ids = list(pending)
+        notifications = []
+        for start in range(0, len(org_ids), batch_size):
+            chunk = org_ids[start:start + batch_size]
+            recipients = {}
+            users = (User.objects.filter(organization_id__in=chunk, is_active=True)
+                     .values_list('organization_id', 'email'))
+            for org_id, email in users:
+                recipients.setdefault(org_id, []).append(email)
+
+            chunk_notifications = [
+                RecallNotification(
+                    recall=recall,
+                    organization_id=org_id,
+                    affected_count=pending[org_id],
+                    recipients=len(recipients.get(org_id, [])),
+                )
+                for org_id in chunk
+            ]
+            RecallNotification.objects.bulk_create(chunk_notifications)
+            outbox.enqueue_many([
+                _recall_message(recall, pending[org_id], recipients[org_id])
+                for org_id in chunk if org_id in recipients
+            ])
+            notifications.extend(chunk_notifications)
+
+        recall.status = Recall.NOTIFIED
+        recall.notified_at = timezone.now()
+        recall.save(update_fields=['status', 'notified_at', 'updated_at'])
+    return notifications
+
+
+def _recall_message(recall, affected_count, recipients):
+    subject = f"Product recall: batch {recall.manufacturing_batch}"
+    message = (
+        f"{recall.manufacturer.name} has recalled manufacturing batch {recall.manufacturing_batch}.\n\n"
+        f"Your organization currently holds {affected_count} affected item(s).\n\n"
+        f"Reason:\n{recall.reason}\n\n"
+        f"The full list is available at {settings.FRONTEND_URL}/dashboard"
+    )
+    return subject, message, settings.DEFAULT_FROM_EMAIL, recipients
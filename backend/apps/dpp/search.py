@@ -0,0 +1,309 @@
+"""
+Unified full text search across products, instances, repairs, certificates
+and organizations.
+
+Every searchable object has one ``SearchDocument`` row with a weighted
+``tsvector`` (identifiers and names weigh more than descriptions) and its
+manufacturer and category copied alongside for faceting. Documents are
+written with set-based ``INSERT ... SELECT ... ON CONFLICT`` statements
+straight from the source tables, so reindexing one object, every instance of
+a renamed product or a whole table are the same statement with a different
+``WHERE``.
+
+Queries are answered from the GIN index. To keep broad queries cheap at tens
+of millions of documents, at most ``DPP_SEARCH_RANK_CANDIDATES`` matches are
+ranked and facet counts cover at most ``DPP_SEARCH_FACET_LIMIT`` matches. A
+GIN index returns matches in no relevance order, so when a query matches
+more documents than are ranked, the ranked ones are an arbitrary subset and
+better hits may be missing; responses say when a limit was hit, and a
+narrower query or filter gives exact ranking again.
+
+Documents that copy a product's name, manufacturer and category (its
+instances and their repairs) are rewritten after the product's transaction
+commits, in chunks of their own, so renaming a product with millions of
+instances does not hold one huge transaction. Until that finishes, or if it
+fails, those documents show the old values; ``rebuild_search_index``
+repairs them.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+
+from .models import (
+    Certificate,
+    Organization,
+    Product,
+    ProductCategory,
+    ProductInstance,
+    RepairRecord,
+    SearchDocument,
+)
+
+
+def _tables():
+    quote = connection.ops.quote_name
+    return {
+        'docs': quote(SearchDocument._meta.db_table),
+        'product': quote(Product._meta.db_table),
+        'instance': quote(ProductInstance._meta.db_table),
+        'repair': quote(RepairRecord._meta.db_table),
+        'certificate': quote(Certificate._meta.db_table),
+        'organization': quote(Organization._meta.db_table),
+    }
+
+
+# Each source selects (id, title, weight A text, weight B text, manufacturer, category)
+SOURCES = {
+    SearchDocument.PRODUCT: (
+        "SELECT p.id, p.name, concat_ws(' ', p.name, p.model_number, p.sku, p.barcode), p.description, "
+        "p.manufacturer_id, p.category_id FROM {product} p",
+        'p.id',
+    ),
+    SearchDocument.INSTANCE: (
+        "SELECT i.id, i.serial_number, concat_ws(' ', i.serial_number, i.manufacturing_batch), p.name, "
+        "p.manufacturer_id, p.category_id FROM {instance} i JOIN {product} p ON p.id = i.product_id",
+        'i.id',
+    ),
+    SearchDocument.REPAIR: (
+        "SELECT r.id, r.issue, r.issue, concat_ws(' ', r.solution, r.parts_replaced, r.technician), "
+        "p.manufacturer_id, p.category_id FROM {repair} r "
+        "JOIN {instance} i ON i.id = r.product_instance_id JOIN {product} p ON p.id = i.product_id",
+        'r.id',
+    ),
+    SearchDocument.CERTIFICATE: (
+        "SELECT c.id, c.name, concat_ws(' ', c.name, c.issuing_body, c.certificate_type), c.description, "
+        "NULL::bigint, NULL::bigint FROM {certificate} c",
+        'c.id',
+    ),
+    SearchDocument.ORGANIZATION: (
+        "SELECT o.id, o.name, concat_ws(' ', o.name, o.tax_id), concat_ws(' ', o.address, o.website), "
+        "NULL::bigint, NULL::bigint FROM {organization} o",
+        'o.id',
+    ),
+}
+
+UPSERT_SQL = """
+INSERT INTO {docs} (doc_type, object_id, title, search_vector, manufacturer_id, category_id, updated_at)
+SELECT %(doc_type)s, src.id, left(coalesce(src.title, ''), 255),
+       setweight(to_tsvector(%(config)s::regconfig, coalesce(src.a, '')), 'A') ||
+       setweight(to_tsvector(%(config)s::regconfig, coalesce(src.b, '')), 'B'),
+       src.manufacturer_id, src.category_id, now()
+FROM ({source} WHERE {where}) AS src(id, title, a, b, manufacturer_id, category_id)
+ON CONFLICT (doc_type, object_id) DO UPDATE SET
+    title = EXCLUDED.title,
+    search_vector = EXCLUDED.search_vector,
+    manufacturer_id = EXCLUDED.manufacturer_id,
+    category_id = EXCLUDED.category_id,
+    updated_at = EXCLUDED.updated_at
+"""
+
+MATCH_SQL = """
+SELECT {columns} FROM {docs}
+WHERE search_vector @@ websearch_to_tsquery(%(config)s::regconfig, %(q)s) {filters}
+LIMIT %(cap)s
+"""
+
+HITS_SQL = """
+WITH matches AS (""" + MATCH_SQL + """)
+SELECT doc_type, object_id, title, manufacturer_id, category_id,
+       ts_rank_cd(search_vector, websearch_to_tsquery(%(config)s::regconfig, %(q)s)) AS rank
+FROM matches
+ORDER BY rank DESC, id
+LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+FACETS_SQL = """
+WITH matches AS (""" + MATCH_SQL + """)
+SELECT GROUPING(doc_type), GROUPING(manufacturer_id), doc_type, manufacturer_id, category_id, COUNT(*)
+FROM matches
+GROUP BY GROUPING SETS ((doc_type), (manufacturer_id), (category_id))
+"""
+
+DETAIL_ROUTES = {
+    SearchDocument.PRODUCT: 'product-detail',
+    SearchDocument.INSTANCE: 'productinstance-detail',
+    SearchDocument.REPAIR: 'repairrecord-detail',
+    SearchDocument.CERTIFICATE: 'certificate-detail',
+    SearchDocument.ORGANIZATION: 'organization-detail',
+}
+
+
+def _upsert(doc_type, where, params):
+    source = SOURCES[doc_type][0].format(**_tables())
+    sql = UPSERT_SQL.format(source=source, where=where, **_tables())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, dict(params, doc_type=doc_type, config=settings.DPP_SEARCH_CONFIG))
+        return cursor.rowcount
+
+
+def index(doc_type, ids):
+    """(Re)index the objects of ``doc_type`` with primary keys ``ids``."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    return _upsert(doc_type, f"{SOURCES[doc_type][1]} = ANY(%(ids)s)", {'ids': ids})
+
+
+def index_serials(serial_numbers):
+    """Index product instances by serial number, e.g. after a bulk insert."""
+    return _upsert(SearchDocument.INSTANCE, 'i.serial_number = ANY(%(serials)s)', {'serials': list(serial_numbers)})
+
+
+def remove(doc_type, ids):
+    SearchDocument.objects.filter(doc_type=doc_type, object_id__in=list(ids)).delete()
+
+
+def index_product_copies(product_id, chunk_size=10_000):
+    """
+    Rewrite the instance and repair documents of ``product_id``, one chunk of
+    instances per transaction.
+    """
+    instances = ProductInstance.objects.filter(product_id=product_id).order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        ids = list(instances.filter(pk__gt=last_pk)[:chunk_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            index(SearchDocument.INSTANCE, ids)
+            _upsert(SearchDocument.REPAIR, 'i.id = ANY(%(ids)s)', {'ids': ids})
+        last_pk = ids[-1]
+
+
+def index_object(obj):
+    """Reindex ``obj`` and, for a product, schedule the documents that copy data from it."""
+    if isinstance(obj, Product):
+        before = (
+            SearchDocument.objects
+            .filter(doc_type=SearchDocument.PRODUCT, object_id=obj.pk)
+            .values_list('title', 'manufacturer_id', 'category_id')
+            .first()
+        )
+        index(SearchDocument.PRODUCT, [obj.pk])
+        # Instances and repairs carry the product's name, manufacturer and
+        # category; only rewrite them (possibly millions) when those changed
+        if before != (obj.name[:255], obj.manufacturer_id, obj.category_id):
+            transaction.on_commit(lambda pk=obj.pk: index_product_copies(pk))
+    elif isinstance(obj, ProductInstance):
+        index(SearchDocument.INSTANCE, [obj.pk])
+        _upsert(SearchDocument.REPAIR, 'i.id = %(instance)s', {'instance': obj.pk})
+    else:
+        index(DOC_TYPE_FOR_MODEL[type(obj)], [obj.pk])
+
+
+DOC_TYPE_FOR_MODEL = {
+    Product: SearchDocument.PRODUCT,
+    ProductInstance: SearchDocument.INSTANCE,
+    RepairRecord: SearchDocument.REPAIR,
+    Certificate: SearchDocument.CERTIFICATE,
+    Organization: SearchDocument.ORGANIZATION,
+}
+MODEL_FOR_DOC_TYPE = {doc_type: model for model, doc_type in DOC_TYPE_FOR_MODEL.items()}
+
+
+def rebuild(doc_type, chunk_size=10_000):
+    """
+    Reindex every object of ``doc_type`` in primary key ranges of
+    ``chunk_size``, then drop documents whose object no longer exists.
+    """
+    model = MODEL_FOR_DOC_TYPE[doc_type]
+    key = SOURCES[doc_type][1]
+    ids = model.objects.order_by('pk').values_list('pk', flat=True)
+    first, last = ids.first(), ids.last()
+    indexed = 0
+    if first is not None:
+        low = first - 1
+        while low < last:
+            high = low + chunk_size
+            with transaction.atomic():
+                indexed += _upsert(doc_type, f"{key} > %(low)s AND {key} <= %(high)s", {'low': low, 'high': high})
+            low = high
+    source_table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {_tables()['docs']} d WHERE d.doc_type = %s "
+            f"AND NOT EXISTS (SELECT 1 FROM {source_table} s WHERE s.id = d.object_id)",
+            [doc_type],
+        )
+    return indexed
+
+
+def _filters(doc_type=None, manufacturer=None, category=None):
+    clauses, params = [], {}
+    if doc_type:
+        clauses.append('AND doc_type = %(doc_type)s')
+        params['doc_type'] = doc_type
+    if manufacturer:
+        clauses.append('AND manufacturer_id = %(manufacturer)s')
+        params['manufacturer'] = manufacturer
+    if category:
+        clauses.append('AND category_id = %(category)s')
+        params['category'] = category
+    return ' '.join(clauses), params
+
+
+def search(query, doc_type=None, manufacturer=None, category=None, limit=20, offset=0):
+    """
+    Return ranked hits and facet counts for ``query`` (web search syntax:
+    quoted phrases, ``or``, ``-excluded``).
+    """
+    filters, params = _filters(doc_type, manufacturer, category)
+    params.update(config=settings.DPP_SEARCH_CONFIG, q=query)
+    tables = _tables()
+    rank_candidates = settings.DPP_SEARCH_RANK_CANDIDATES
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            HITS_SQL.format(columns='id, doc_type, object_id, title, manufacturer_id, category_id, search_vector',
+                            filters=filters, **tables),
+            dict(params, cap=rank_candidates, limit=limit, offset=offset),
+        )
+        hits = [
+            {
+                'type': hit_type,
+                'id': object_id,
+                'title': title,
+                'manufacturer': manufacturer_id,
+                'category': category_id,
+                'rank': rank,
+                'url': reverse(DETAIL_ROUTES[hit_type], args=[object_id]),
+            }
+            for hit_type, object_id, title, manufacturer_id, category_id, rank in cursor.fetchall()
+        ]
+        facet_limit = settings.DPP_SEARCH_FACET_LIMIT
+        cursor.execute(
+            FACETS_SQL.format(columns='doc_type, manufacturer_id, category_id', filters=filters, **tables),
+            dict(params, cap=facet_limit),
+        )
+        facet_rows = cursor.fetchall()
+
+    types, manufacturers, categories = {}, {}, {}
+    for not_type, not_manufacturer, row_type, manufacturer_id, category_id, count in facet_rows:
+        if not not_type:
+            types[row_type] = count
+        elif not not_manufacturer:
+            if manufacturer_id is not None:
+                manufacturers[manufacturer_id] = count
+        elif category_id is not None:
+            categories[category_id] = count
+    total = sum(types.values())
+
+    manufacturer_names = dict(Organization.objects.filter(pk__in=manufacturers).values_list('pk', 'name'))
+    category_names = dict(ProductCategory.objects.filter(pk__in=categories).values_list('pk', 'name'))
+    return {
+        'total': total,
+        'total_is_estimate': total >= facet_limit,
+        'ranking_is_partial': total > rank_candidates,
+        'results': hits,
+        'facets': {
+            'type': [{'value': key, 'count': count} for key, count in sorted(types.items(), key=lambda i: -i[1])],
+            'manufacturer': [
+                {'value': key, 'name': manufacturer_names.get(key), 'count': count}
+                for key, count in sorted(manufacturers.items(), key=lambda i: -i[1])
+            ],
+            'category': [
+                {'value': key, 'name': category_names.get(key), 'count': count}
+                for key, count in sorted(categories.items(), key=lambda i: -i[1])
+            ],
+        },
+    }
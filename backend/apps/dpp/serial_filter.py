@@ -0,0 +1,238 @@
+"""
+Bloom filter of every known ``ProductInstance.serial_number``.
+
+The public scan and passport views consult it before touching the database,
+so enumeration bots asking for random serials get a 404 without an index
+lookup. The filter lives in a Redis bitmap shared by all processes; each
+process keeps a local copy that is refreshed periodically.
+
+A local miss may just mean the copy is stale, so it is confirmed against the
+Redis bitmap before answering "definitely not". Every round trip also reads
+the filter's generation; when a rebuild has replaced the bitmap (possibly
+with another shape) the local copy is reloaded instead of being trusted.
+Anything uncertain (filter not built yet, Redis down) falls through to the
+database.
+
+A serial that could not be written to Redis would be a permanent false
+negative, so the process that failed keeps it and retries on its next round
+trip. Until then, misses in that process go to the database. Other processes
+may still reject the serial meanwhile; ``rebuild_serial_filter`` repairs the
+shared bitmap if the process exits first.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+
+from apps.core.redis_client import get_redis, RedisError
+from apps.core.sketches import BloomFilter, stable_offsets
+
+logger = logging.getLogger(__name__)
+
+FILTER_KEY = 'dpp:serials:bloom'
+META_KEY = 'dpp:serials:bloom:meta'
+BUILD_KEY = 'dpp:serials:bloom:build'
+
+CATCH_UP_MARGIN = timedelta(minutes=5)
+
+
+class SerialFilter:
+    """
+    Process-local view of the shared serial number Bloom filter.
+    """
+
+    # Serials kept for a retry after a failed write; beyond that the filter
+    # stays dirty until a rebuild has been loaded
+    max_pending = 100_000
+
+    def __init__(self, refresh_seconds=300):
+        self.refresh_seconds = refresh_seconds
+        self.local = None
+        self.generation = None
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.dirty_since = None
+
+    def _load(self, redis):
+        meta = redis.hgetall(META_KEY)
+        if not meta:
+            self.local, self.generation = None, None
+            return
+        generation = meta.get(b'generation')
+        size_bits, num_hashes = int(meta[b'size_bits']), int(meta[b'num_hashes'])
+        self.local = BloomFilter(size_bits, num_hashes, redis.get(FILTER_KEY) or b'')
+        self.generation = generation
+        if self.dirty_since is not None and generation and generation.decode() > self.dirty_since:
+            # Built from the database after the lost writes
+            self.dirty_since = None
+
+    def _refresh(self, redis):
+        now = time.monotonic()
+        if now - self.loaded_at < self.refresh_seconds:
+            return
+        with self.lock:
+            if now - self.loaded_at < self.refresh_seconds:
+                return
+            try:
+                self._load(redis)
+            finally:
+                self.loaded_at = now
+
+    def invalidate(self):
+        """Force a reload from Redis on next use."""
+        self.loaded_at = 0
+
+    @property
+    def dirty(self):
+        """Whether serials of this process may be missing from the shared bitmap."""
+        return bool(self.pending) or self.dirty_since is not None
+
+    def might_exist(self, serial_number):
+        """
+        Return ``False`` only if ``serial_number`` definitely does not exist.
+        """
+        if not getattr(settings, 'DPP_SERIAL_FILTER_ENABLED', True):
+            return True
+        try:
+            redis = get_redis()
+            if self.pending:
+                self._retry_pending(redis)
+            self._refresh(redis)
+            local = self.local
+            if local is None:
+                return True
+            offsets = local.offsets(serial_number)
+            if local.contains(serial_number, offsets):
+                return True
+            # The local copy may predate the insert, ask the shared bitmap
+            pipe = redis.pipeline(transaction=False)
+            pipe.hget(META_KEY, 'generation')
+            for offset in offsets:
+                pipe.getbit(FILTER_KEY, offset)
+            generation, *bits = pipe.execute()
+            if generation != self.generation:
+                # Rebuilt since the local copy was loaded, the offsets may not apply
+                self.invalidate()
+                return True
+            if all(bits):
+                local.add(serial_number, offsets)
+                return True
+            return self.dirty
+        except RedisError:
+            logger.warning("Serial filter unavailable, falling back to the database", exc_info=True)
+            return True
+
+    def add(self, *serial_numbers, redis=None):
+        """
+        Add serial numbers to the shared filter (and the local copy).
+
+        On a Redis error the serials are kept for a retry and the error is
+        raised again.
+        """
+        if not serial_numbers:
+            return
+        try:
+            redis = redis or get_redis()
+            if self.pending:
+                self._retry_pending(redis)
+            self._write(redis, serial_numbers)
+        except RedisError:
+            self._defer(serial_numbers)
+            raise
+
+    def _write(self, redis, serial_numbers):
+        for _ in range(2):
+            self._refresh(redis)
+            local, generation = self.local, self.generation
+            # Before the first build, bits are laid out in the configured shape,
+            # which is the one the build will use.
+            size_bits, num_hashes = (local.size_bits, local.num_hashes) if local else filter_shape()
+            offsets = [stable_offsets(serial_number, size_bits, num_hashes) for serial_number in serial_numbers]
+            # One transaction, so a rebuild cannot slip in between the check and the writes
+            pipe = redis.pipeline(transaction=True)
+            pipe.hget(META_KEY, 'generation')
+            for serial_offsets in offsets:
+                for offset in serial_offsets:
+                    pipe.setbit(FILTER_KEY, offset, 1)
+            if pipe.execute()[0] == generation:
+                if local is not None:
+                    for serial_number, serial_offsets in zip(serial_numbers, offsets):
+                        local.add(serial_number, serial_offsets)
+                return
+            # Written in the old shape: harmless extra bits, write again in the new one
+            self.invalidate()
+        logger.warning("Serial filter was rebuilt twice during one write")
+
+    def _defer(self, serial_numbers):
+        with self.lock:
+            if len(self.pending) + len(serial_numbers) <= self.max_pending:
+                self.pending.update(serial_numbers)
+            else:
+                self.pending.clear()
+                self.dirty_since = timezone.now().isoformat()
+
+    def _retry_pending(self, redis):
+        with self.lock:
+            serial_numbers, self.pending = tuple(self.pending), set()
+        try:
+            self._write(redis, serial_numbers)
+        except RedisError:
+            self._defer(serial_numbers)
+            raise
+
+
+def filter_shape():
+    """Return ``(size_bits, num_hashes)`` for the configured capacity."""
+    return BloomFilter.optimal_size(
+        getattr(settings, 'DPP_SERIAL_FILTER_CAPACITY', 10_000_000),
+        getattr(settings, 'DPP_SERIAL_FILTER_ERROR_RATE', 0.01),
+    )
+
+
+def rebuild(batch_size=10_000):
+    """
+    Rebuild the shared filter from the database.
+
+    The new bitmap is built locally, swapped in atomically, and then serials
+    written while the build was running (with a margin for transactions that
+    were still open) are added on top, so concurrent inserts are never lost.
+    Returns the number of serials loaded.
+    """
+    from .models import ProductInstance
+
+    size_bits, num_hashes = filter_shape()
+    bloom = BloomFilter(size_bits, num_hashes)
+    started = timezone.now()
+    count = 0
+    serials = ProductInstance.objects.values_list('serial_number', flat=True).iterator(chunk_size=batch_size)
+    for serial_number in serials:
+        bloom.add(serial_number)
+        count += 1
+
+    redis = get_redis()
+    pipe = redis.pipeline(transaction=True)
+    pipe.set(BUILD_KEY, bytes(bloom.bits))
+    pipe.rename(BUILD_KEY, FILTER_KEY)
+    pipe.delete(META_KEY)
+    pipe.hset(META_KEY, mapping={
+        'size_bits': size_bits,
+        'num_hashes': num_hashes,
+        'generation': started.isoformat(),
+        'count': count,
+    })
+    pipe.execute()
+
+    serial_filter.invalidate()
+    late = list(
+        ProductInstance.objects.filter(updated_at__gte=started - CATCH_UP_MARGIN)
+        .values_list('serial_number', flat=True)
+    )
+    serial_filter.add(*late, redis=redis)
+    return count + len(late)
+
+
+serial_filter = SerialFilter(refresh_seconds=getattr(settings, 'DPP_SERIAL_FILTER_REFRESH', 300))
@@ -1,4 +1,13 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
+from . import bom, serials, webhooks
 from .models import (
     Organization,
     ProductCategory,
@@ -6,42 +15,115 @@ from .models import (
     Certificate,
     Product,
     ProductMaterial,
+    ProductComponent,
     ProductInstance,
     SupplyChainEvent,
     RepairRecord,
     RecyclingInstruction,
-    ProductPassport
+    ProductPassport,
+    ProductScanRollup,
+    SerialScanRollup,
+    Recall,
+    RecallNotification,
+    OwnershipPeriod,
+    SerialSeries,
+    WebhookSubscription,
+    WebhookDelivery
 )
 
 
-class OrganizationSerializer(serializers.ModelSerializer):
+def canonical(value):
+    """Reduce a field value to a stable, JSON serializable form."""
+    if isinstance(value, models.Model):
+        return value.pk
+    if isinstance(value, Decimal):
+        # 60, 60.0 and 60.00 are the same percentage
+        return format(value.normalize(), 'f')
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [canonical(item) for item in value]
+        # Many-to-many selections are unordered
+        return sorted(items, key=str) if value and isinstance(next(iter(value)), models.Model) else items
+    return value
+
+
+def content_hash(values):
+    """Return a hash of ``values`` that only depends on their content."""
+    data = json.dumps(canonical(values), sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class SkipUnchangedMixin:
+    """
+    Skips updates that would not change anything.
+    
+    The incoming values are hashed against the instance's current values of
+    the same fields; on a match nothing is saved, so ``updated_at`` is kept
+    and no save signals (cache invalidation, change feed, webhooks, search)
+    fire. ``unchanged`` tells the view to report it.
+    """
+    # Bookkeeping set by the view, not part of the content
+    hash_exclude = ('created_by', 'updated_by')
+    unchanged = False
+    
+    def current_value(self, instance, name):
+        field = instance._meta.get_field(name)
+        if field.many_to_many:
+            return sorted(getattr(instance, name).values_list('pk', flat=True), key=str)
+        if field.is_relation:
+            return getattr(instance, field.attname)
+        return getattr(instance, name)
+    
+    def is_unchanged(self, instance, validated_data):
+        names = [name for name in validated_data if name not in self.hash_exclude]
+        incoming = {name: validated_data[name] for name in names}
+        if any(isinstance(value, File) for value in incoming.values()):
+            # An upload is never compared by content
+            self.unchanged = False
+            return False
+        current = {name: self.current_value(instance, name) for name in names}
+        self.unchanged = content_hash(incoming) == content_hash(current)
+        return self.unchanged
+    
+    def update(self, instance, validated_data):
+        if self.is_unchanged(instance, validated_data):
+            return instance
+        return self.apply_update(instance, validated_data)
+    
+    def apply_update(self, instance, validated_data):
+        """Write a changed update; override for values that are not plain model fields."""
+        return super().update(instance, validated_data)
+
+
+class OrganizationSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     class Meta:
         model = Organization
         fields = ('id', 'name', 'address', 'website', 'is_verified', 'created_at', 'updated_at')
         read_only_fields = ('is_verified',)
 
 
-class ProductCategorySerializer(serializers.ModelSerializer):
+class ProductCategorySerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductCategory
         fields = ('id', 'name', 'description', 'parent', 'created_at', 'updated_at')
 
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     class Meta:
         model = Material
         fields = ('id', 'name', 'description', 'is_recyclable', 'recycling_instructions', 
                  'environmental_impact', 'created_at', 'updated_at')
 
 
-class CertificateSerializer(serializers.ModelSerializer):
+class CertificateSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     class Meta:
         model = Certificate
         fields = ('id', 'name', 'issuing_body', 'description', 'certificate_type', 
                  'valid_from', 'valid_until', 'verification_url', 'created_at', 'updated_at')
 
 
-class ProductMaterialSerializer(serializers.ModelSerializer):
+class ProductMaterialSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     material_name = serializers.StringRelatedField(source='material.name', read_only=True)
     
     class Meta:
@@ -49,7 +131,31 @@ class ProductMaterialSerializer(serializers.ModelSerializer):
         fields = ('id', 'material', 'material_name', 'percentage', 'notes')
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductComponentSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
+    parent_name = serializers.StringRelatedField(source='parent.name', read_only=True)
+    component_name = serializers.StringRelatedField(source='component.name', read_only=True)
+    
+    class Meta:
+        model = ProductComponent
+        fields = ('id', 'parent', 'parent_name', 'component', 'component_name', 'quantity', 'notes',
+                 'created_at', 'updated_at')
+    
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Quantity must be positive.")
+        return value
+    
+    def validate(self, attrs):
+        parent = attrs.get('parent', getattr(self.instance, 'parent', None))
+        component = attrs.get('component', getattr(self.instance, 'component', None))
+        if parent and component and bom.creates_cycle(parent.pk, component.pk):
+            raise serializers.ValidationError(
+                {"component": "A product cannot contain itself, directly or through its components."}
+            )
+        return attrs
+
+
+class ProductSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     manufacturer_name = serializers.StringRelatedField(source='manufacturer.name', read_only=True)
     category_name = serializers.StringRelatedField(source='category.name', read_only=True)
     materials = ProductMaterialSerializer(source='product_materials', many=True, read_only=True)
@@ -62,7 +168,7 @@ class ProductSerializer(serializers.ModelSerializer):
                  'is_active', 'image', 'materials', 'certificates', 'created_at', 'updated_at')
 
 
-class ProductInstanceSerializer(serializers.ModelSerializer):
+class ProductInstanceSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     product_name = serializers.StringRelatedField(source='product.name', read_only=True)
     current_owner_name = serializers.StringRelatedField(source='current_owner.name', read_only=True)
     
@@ -73,7 +179,7 @@ class ProductInstanceSerializer(serializers.ModelSerializer):
                  'current_owner_name', 'created_at', 'updated_at')
 
 
-class SupplyChainEventSerializer(serializers.ModelSerializer):
+class SupplyChainEventSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     product_instance_serial = serializers.StringRelatedField(source='product_instance.serial_number', read_only=True)
     organization_name = serializers.StringRelatedField(source='organization.name', read_only=True)
     event_type_display = serializers.CharField(source='get_event_type_display', read_only=True)
@@ -85,7 +191,15 @@ class SupplyChainEventSerializer(serializers.ModelSerializer):
                  'date', 'description', 'created_at', 'updated_at')
 
 
-class RepairRecordSerializer(serializers.ModelSerializer):
+class OwnershipPeriodSerializer(serializers.ModelSerializer):
+    organization_name = serializers.StringRelatedField(source='organization.name', read_only=True)
+    
+    class Meta:
+        model = OwnershipPeriod
+        fields = ('organization', 'organization_name', 'valid_from', 'valid_to', 'event')
+
+
+class RepairRecordSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     product_instance_serial = serializers.StringRelatedField(source='product_instance.serial_number', read_only=True)
     repair_shop_name = serializers.StringRelatedField(source='repair_shop.name', read_only=True)
     
@@ -96,7 +210,7 @@ class RepairRecordSerializer(serializers.ModelSerializer):
                  'technician', 'warranty_covered', 'cost', 'created_at', 'updated_at')
 
 
-class RecyclingInstructionSerializer(serializers.ModelSerializer):
+class RecyclingInstructionSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     product_name = serializers.StringRelatedField(source='product.name', read_only=True)
     
     class Meta:
@@ -106,7 +220,306 @@ class RecyclingInstructionSerializer(serializers.ModelSerializer):
                  'created_at', 'updated_at')
 
 
-class ProductPassportSerializer(serializers.ModelSerializer):
+class RecallNotificationSerializer(serializers.ModelSerializer):
+    organization_name = serializers.StringRelatedField(source='organization.name', read_only=True)
+    
+    class Meta:
+        model = RecallNotification
+        fields = ('id', 'organization', 'organization_name', 'affected_count', 'recipients', 'created_at')
+
+
+class RecallSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
+    manufacturer_name = serializers.StringRelatedField(source='manufacturer.name', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    
+    class Meta:
+        model = Recall
+        fields = ('id', 'manufacturer', 'manufacturer_name', 'product', 'manufacturing_batch', 
+                 'reason', 'status', 'status_display', 'notified_at', 'created_at', 'updated_at')
+        read_only_fields = ('notified_at',)
+    
+    def validate_manufacturer(self, value):
+        # Notifications go out in the manufacturer's name
+        user = self.context['request'].user
+        if not user.is_staff and value.pk != user.organization_id:
+            raise serializers.ValidationError("You can only recall products of your own organization.")
+        return value
+
+
+class ProductScanRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductScanRollup
+        fields = ('hour', 'scan_count', 'unique_visitors')
+
+
+class SerialScanRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SerialScanRollup
+        fields = ('hour', 'scan_count', 'unique_visitors')
+
+
+class ScanRangeSerializer(serializers.Serializer):
+    """
+    Time range of a scan analytics query; naive datetimes are read as UTC.
+    """
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if 'since' in data and 'until' in data and data['since'] >= data['until']:
+            raise serializers.ValidationError({'since': "Must be earlier than 'until'."})
+        return data
+
+
+class TimelinePageSerializer(serializers.Serializer):
+    """
+    Query of one timeline page; ``before`` and ``before_id`` come from the
+    previous page.
+    """
+    before = serializers.DateTimeField(required=False)
+    before_id = serializers.IntegerField(required=False, min_value=0)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=500, default=50)
+
+
+class InstanceStateQuerySerializer(serializers.Serializer):
+    at = serializers.DateTimeField(required=False)
+
+
+class BatchScanRequestSerializer(serializers.Serializer):
+    serial_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        allow_empty=False,
+        max_length=getattr(settings, 'DPP_BATCH_SCAN_MAX_SERIALS', 5000),
+    )
+
+
+class InstanceSelectionSerializer(serializers.Serializer):
+    """
+    Selects product instances by serial numbers, a serial range and/or filters.
+    
+    ``serial_from`` and ``serial_to`` are inclusive and compared as strings.
+    """
+    serial_numbers = serializers.ListField(child=serializers.CharField(max_length=100),
+                                           required=False, allow_empty=False,
+                                           max_length=getattr(settings, 'DPP_BULK_MAX_SERIALS', 10_000))
+    serial_from = serializers.CharField(max_length=100, required=False)
+    serial_to = serializers.CharField(max_length=100, required=False)
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), required=False)
+    manufacturing_batch = serializers.CharField(max_length=100, required=False)
+    current_owner = serializers.PrimaryKeyRelatedField(queryset=Organization.objects.all(), required=False)
+    is_sold = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("At least one selection criterion is required.")
+        return attrs
+
+    @staticmethod
+    def build_queryset(selection):
+        """Return the ``ProductInstance`` queryset matching validated ``selection``."""
+        selection = dict(selection)
+        queryset = ProductInstance.objects.all()
+        if 'serial_numbers' in selection:
+            queryset = queryset.filter(serial_number__in=selection.pop('serial_numbers'))
+        if 'serial_from' in selection:
+            queryset = queryset.filter(serial_number__gte=selection.pop('serial_from'))
+        if 'serial_to' in selection:
+            queryset = queryset.filter(serial_number__lte=selection.pop('serial_to'))
+        return queryset.filter(**selection)
+
+
+class BulkTransferSerializer(serializers.Serializer):
+    selection = InstanceSelectionSerializer()
+    current_owner = serializers.PrimaryKeyRelatedField(queryset=Organization.objects.all(),
+                                                       required=False, allow_null=True)
+    is_sold = serializers.BooleanField(required=False)
+    sold_date = serializers.DateField(required=False, allow_null=True)
+    event_type = serializers.ChoiceField(choices=SupplyChainEvent.EVENT_TYPES, required=False)
+    event_organization = serializers.PrimaryKeyRelatedField(queryset=Organization.objects.all(), required=False)
+    location = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True)
+    date = serializers.DateTimeField(required=False)
+    # Continue a transfer that failed part way, see BulkOperationError
+    after = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        if 'current_owner' not in attrs and 'is_sold' not in attrs:
+            raise serializers.ValidationError("Provide current_owner and/or is_sold.")
+        if attrs.get('is_sold') is False:
+            if attrs.get('sold_date'):
+                raise serializers.ValidationError({"sold_date": "Cannot be set when is_sold is false."})
+            attrs['sold_date'] = None
+        elif attrs.get('is_sold') and not attrs.get('sold_date'):
+            attrs['sold_date'] = timezone.localdate()
+        if 'event_type' in attrs and not (attrs.get('event_organization') or attrs.get('current_owner')):
+            raise serializers.ValidationError(
+                {"event_organization": "Required when no new current_owner is given."}
+            )
+        return attrs
+
+    def get_queryset(self):
+        return InstanceSelectionSerializer.build_queryset(self.validated_data['selection'])
+
+    def get_changes(self):
+        return {field: self.validated_data[field]
+                for field in ('current_owner', 'is_sold', 'sold_date') if field in self.validated_data}
+
+    def get_event(self):
+        data = self.validated_data
+        if 'event_type' not in data:
+            return None
+        event = {
+            'event_type': data['event_type'],
+            'organization': data.get('event_organization') or data['current_owner'],
+        }
+        for field in ('location', 'description', 'date'):
+            if field in data:
+                event[field] = data[field]
+        return event
+
+
+class ProductSelectionSerializer(serializers.Serializer):
+    """
+    Selects products by ID list and/or filters.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    manufacturer = serializers.PrimaryKeyRelatedField(queryset=Organization.objects.all(), required=False)
+    category = serializers.PrimaryKeyRelatedField(queryset=ProductCategory.objects.all(), required=False)
+    is_active = serializers.BooleanField(required=False)
+    is_hazardous = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("At least one selection criterion is required.")
+        return attrs
+
+    @staticmethod
+    def build_queryset(selection):
+        """Return the ``Product`` queryset matching validated ``selection``."""
+        selection = dict(selection)
+        queryset = Product.objects.all()
+        if 'ids' in selection:
+            queryset = queryset.filter(pk__in=selection.pop('ids'))
+        return queryset.filter(**selection)
+
+
+class BulkCertificateSerializer(serializers.Serializer):
+    LINK = 'link'
+    UNLINK = 'unlink'
+
+    selection = ProductSelectionSerializer()
+    certificates = serializers.PrimaryKeyRelatedField(queryset=Certificate.objects.all(), many=True,
+                                                      allow_empty=False)
+    operation = serializers.ChoiceField(choices=[LINK, UNLINK], default=LINK)
+
+    def get_queryset(self):
+        return ProductSelectionSerializer.build_queryset(self.validated_data['selection'])
+
+
+class PassportUpsertSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    # No uniqueness check: an existing code means update
+    qr_code = serializers.CharField(max_length=100)
+    sustainability_data = serializers.DictField(required=False, default=dict)
+
+
+class BulkPassportUpsertSerializer(serializers.Serializer):
+    passports = PassportUpsertSerializer(many=True, allow_empty=False)
+
+    def validate_passports(self, value):
+        if len(value) > settings.DPP_PASSPORT_UPSERT_MAX_BATCH:
+            raise serializers.ValidationError(
+                f"At most {settings.DPP_PASSPORT_UPSERT_MAX_BATCH} passports per request."
+            )
+        qr_codes = [item['qr_code'] for item in value]
+        if len(set(qr_codes)) != len(qr_codes):
+            raise serializers.ValidationError("Each QR code may appear only once.")
+        return value
+
+
+class MaterialShareSerializer(serializers.Serializer):
+    material = serializers.PrimaryKeyRelatedField(queryset=Material.objects.all())
+    percentage = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100,
+                                          required=False, allow_null=True)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class BulkMaterialSerializer(serializers.Serializer):
+    UPSERT = 'upsert'
+    REPLACE = 'replace'
+    UNLINK = 'unlink'
+
+    selection = ProductSelectionSerializer()
+    materials = MaterialShareSerializer(many=True, allow_empty=False)
+    operation = serializers.ChoiceField(choices=[UPSERT, REPLACE, UNLINK], default=UPSERT)
+
+    def validate_materials(self, value):
+        material_ids = [item['material'].pk for item in value]
+        if len(material_ids) != len(set(material_ids)):
+            raise serializers.ValidationError("Each material may only be listed once.")
+        if sum(item.get('percentage') or 0 for item in value) > 100:
+            raise serializers.ValidationError("Percentages add up to more than 100.")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get('operation', self.UPSERT) != self.UPSERT:
+            return attrs
+        # An upsert keeps the products' other materials, which count too
+        materials = attrs['materials']
+        remaining = 100 - sum(item.get('percentage') or 0 for item in materials)
+        over = list(
+            ProductMaterial.objects
+            .filter(product__in=ProductSelectionSerializer.build_queryset(attrs['selection']))
+            .exclude(material__in=[item['material'] for item in materials])
+            .values('product')
+            .annotate(total=models.Sum('percentage'))
+            .filter(total__gt=remaining)
+            .order_by('product')
+            .values_list('product', flat=True)[:10]
+        )
+        if over:
+            raise serializers.ValidationError({'materials': [
+                "Percentages would add up to more than 100 with the existing materials of products "
+                f"{', '.join(map(str, over))}."
+            ]})
+        return attrs
+
+    def get_queryset(self):
+        return ProductSelectionSerializer.build_queryset(self.validated_data['selection'])
+
+
+class WebhookSubscriptionSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
+    resources = serializers.ListField(
+        child=serializers.ChoiceField(choices=webhooks.RESOURCES), required=False, allow_empty=True
+    )
+    
+    class Meta:
+        model = WebhookSubscription
+        fields = ('id', 'organization', 'url', 'resources', 'secret', 'is_active', 'created_at', 'updated_at')
+        read_only_fields = ('secret',)
+    
+    def validate_organization(self, value):
+        user = self.context['request'].user
+        if not user.is_staff and value.pk != user.organization_id:
+            raise serializers.ValidationError("You can only subscribe for your own organization.")
+        return value
+    
+    def validate_url(self, value):
+        try:
+            webhooks.check_url(value)
+        except webhooks.UnsafeURLError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+
+class WebhookDeliverySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WebhookDelivery
+        fields = ('id', 'subscription', 'payload', 'created_at', 'attempts', 'next_attempt_at',
+                 'delivered_at', 'failed_at', 'last_error')
+
+
+class ProductPassportSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
     """
     Serializer for ProductPassport model.
     
@@ -156,17 +569,54 @@ class ProductPassportSerializer(serializers.ModelSerializer):
         
         return instance
     
-    def update(self, instance, validated_data):
-        """Update a ProductPassport instance, handling sustainability_data."""
-        # Extract the sustainability data if provided
+    def current_value(self, instance, name):
+        if name == 'sustainability_data_dict':
+            return instance.get_sustainability_data()
+        return super().current_value(instance, name)
+    
+    def apply_update(self, instance, validated_data):
+        """Update a changed ProductPassport instance, handling sustainability_data."""
+        # Set the sustainability data if provided, saved along with the other fields
         sustainability_data_dict = validated_data.pop('sustainability_data_dict', None)
-        
-        # Update the instance
-        instance = super().update(instance, validated_data)
-        
-        # Update the sustainability data if provided
         if sustainability_data_dict is not None:
             instance.set_sustainability_data(sustainability_data_dict)
-            instance.save()
         
-        return instance 
\ No newline at end of file
+        return super().apply_update(instance, validated_data)
+
+
+class SerialSeriesSerializer(SkipUnchangedMixin, serializers.ModelSerializer):
+    manufacturer_name = serializers.StringRelatedField(source='manufacturer.name', read_only=True)
+    
+    class Meta:
+        model = SerialSeries
+        fields = ('id', 'manufacturer', 'manufacturer_name', 'name', 'template', 'next_value',
+                 'created_at', 'updated_at')
+        read_only_fields = ('next_value',)
+    
+    def validate_manufacturer(self, value):
+        user = self.context['request'].user
+        if not user.is_staff and value.pk != user.organization_id:
+            raise serializers.ValidationError("You can only manage serial series of your own organization.")
+        return value
+    
+    def validate_template(self, value):
+        try:
+            return serials.validate_template(value)
+        except serials.SerialAllocationError as exc:
+            raise serializers.ValidationError(str(exc))
+
+
+class SerialAllocationSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1)
+    manufacturing_batch = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    
+    def validate_count(self, value):
+        if value > settings.DPP_MANUFACTURE_MAX_COUNT:
+            raise serializers.ValidationError(
+                f"At most {settings.DPP_MANUFACTURE_MAX_COUNT} serial numbers per request."
+            )
+        return value
+
+
+class ManufactureSerializer(SerialAllocationSerializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
@@ -0,0 +1,134 @@
+"""
+Block allocation of serial numbers and bulk creation of product instances.
+
+A ``SerialSeries`` counter is advanced by a whole block with one
+``UPDATE ... RETURNING`` in its own short transaction, so concurrent
+allocations never overlap and never wait on each other's inserts. Serials
+rendered from distinct values of one template are distinct, so instances can
+be written with ``COPY`` without checking the unique constraint row by row.
+A block whose insert fails is simply skipped; series may have gaps.
+"""
+import csv
+import io
+import logging
+import string
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.redis_client import RedisError
+from . import changes, events, search
+from .models import ChangeLogEntry, ProductInstance, SerialSeries
+from .serial_filter import serial_filter
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FIELDS = {'seq', 'year', 'batch'}
+COPY_CHUNK_SIZE = 50_000
+
+
+class SerialAllocationError(ValueError):
+    """Raised for invalid templates or allocation requests."""
+
+
+def validate_template(template):
+    fields = {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+    if 'seq' not in fields:
+        raise SerialAllocationError("Template must contain a {seq} placeholder.")
+    unknown = fields - TEMPLATE_FIELDS
+    if unknown:
+        raise SerialAllocationError(f"Unknown template fields: {', '.join(sorted(unknown))}.")
+    try:
+        render(template, 1, batch='B')
+    except (ValueError, IndexError, KeyError) as exc:
+        raise SerialAllocationError(f"Invalid template: {exc}")
+    return template
+
+
+def render(template, seq, year=None, batch=''):
+    return template.format(seq=seq, year=year or timezone.now().year, batch=batch or '')
+
+
+def allocate(series, count):
+    """
+    Reserve ``count`` consecutive values of ``series``; returns the first one.
+
+    Call it outside of a long transaction: the counter row stays locked until
+    the surrounding transaction commits.
+    """
+    if count < 1:
+        raise SerialAllocationError("count must be positive.")
+    table = connection.ops.quote_name(SerialSeries._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET next_value = next_value + %s, updated_at = %s "
+            f"WHERE id = %s RETURNING next_value - %s",
+            [count, timezone.now(), series.pk, count],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise SerialAllocationError("Serial series does not exist.")
+    return row[0]
+
+
+def allocate_serials(series, count, batch=''):
+    """Reserve a block and return its rendered serial numbers."""
+    start = allocate(series, count)
+    year = timezone.now().year
+    return [render(series.template, seq, year, batch) for seq in range(start, start + count)]
+
+
+def manufacture(series, product, count, batch=None, user=None, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Create ``count`` instances of ``product`` with serials from ``series``.
+
+    Rows are streamed into the instance table with ``COPY`` in one
+    transaction; the search index is updated in the same transaction and the
+    serial Bloom filter after commit. The transaction grows with ``count``,
+    which requests keep within ``DPP_MANUFACTURE_MAX_COUNT``. Returns a
+    summary dict.
+    """
+    if product.manufacturer_id != series.manufacturer_id:
+        raise SerialAllocationError("The product is not made by the series' manufacturer.")
+    if '{batch' in series.template and not batch:
+        raise SerialAllocationError("This series needs a manufacturing batch.")
+
+    start = allocate(series, count)
+    year = timezone.now().year
+    now = timezone.now().isoformat()
+    table = connection.ops.quote_name(ProductInstance._meta.db_table)
+    columns = ('product_id', 'serial_number', 'manufacturing_batch', 'is_sold', 'current_owner_id',
+               'created_by_id', 'updated_by_id', 'created_at', 'updated_at')
+    copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    user_id = user.pk if user and user.is_authenticated else ''
+
+    first = last = None
+    with transaction.atomic(), connection.cursor() as cursor:
+        for chunk_start in range(start, start + count, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, start + count)
+            serials = [render(series.template, seq, year, batch) for seq in range(chunk_start, chunk_end)]
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for serial in serials:
+                writer.writerow([product.pk, serial, batch or '', 'f', series.manufacturer_id,
+                                 user_id, user_id, now, now])
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+            search.index_serials(serials)
+            changes.record_serials(serials)
+            transaction.on_commit(lambda serials=serials: _add_to_serial_filter(serials))
+            first = first or serials[0]
+            last = serials[-1]
+
+    # One product level event instead of naming every new instance
+    events.publish('product', [product.pk], ChangeLogEntry.UPSERT, [product.manufacturer_id])
+    return {'series': series.pk, 'count': count, 'first_value': start,
+            'first_serial': first, 'last_serial': last}
+
+
+def _add_to_serial_filter(serials):
+    try:
+        serial_filter.add(*serials)
+    except RedisError:
+        logger.warning("Could not add %d manufactured serials to the serial filter, will retry", len(serials),
+                       exc_info=True)
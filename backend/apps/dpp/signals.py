@@ -0,0 +1,219 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.core.redis_client import RedisError
+from . import autocomplete, bom, changes, dedup, events, gs1, search, timeline
+from .models import (
+    Certificate,
+    ChangeLogEntry,
+    Material,
+    Organization,
+    Product,
+    ProductComponent,
+    ProductInstance,
+    ProductMaterial,
+    ProductPassport,
+    RepairRecord,
+    SupplyChainEvent,
+)
+from .serial_filter import serial_filter
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=ProductInstance)
+def add_serial_to_filter(sender, instance, **kwargs):
+    """
+    Keep the serial number Bloom filter current.
+
+    Runs before commit on purpose: a rolled back insert only leaves a harmless
+    false positive, while adding after commit would leave a window in which
+    the new serial is reported as missing.
+    """
+    try:
+        serial_filter.add(instance.serial_number)
+    except RedisError:
+        logger.warning("Could not add %s to the serial filter, will retry", instance.serial_number, exc_info=True)
+
+
+@receiver(post_save, sender=SupplyChainEvent)
+def update_ownership_history(sender, instance, created, raw=False, **kwargs):
+    """Fold new events into the ownership projection; edits trigger a rebuild."""
+    if raw:
+        return
+    if created:
+        timeline.apply_event(instance)
+    else:
+        timeline.rebuild(instance.product_instance_id)
+
+
+@receiver(post_delete, sender=SupplyChainEvent)
+def remove_from_ownership_history(sender, instance, **kwargs):
+    if ProductInstance.objects.filter(pk=instance.product_instance_id).exists():
+        timeline.rebuild(instance.product_instance_id)
+
+
+# Cached BOM results are invalidated once the change is visible to readers
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_bom(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: bom.invalidate_products([pk]))
+
+
+@receiver(pre_save, sender=ProductComponent)
+def remember_component_edge(sender, instance, raw=False, **kwargs):
+    """Keep the edge being replaced, results that went through it are stale too."""
+    instance._bom_previous_edge = None
+    if instance.pk and not raw:
+        instance._bom_previous_edge = (
+            ProductComponent.objects.filter(pk=instance.pk).values_list('parent_id', 'component_id').first()
+        )
+
+
+@receiver([post_save, post_delete], sender=ProductComponent)
+def invalidate_component_bom(sender, instance, **kwargs):
+    edges = {(instance.parent_id, instance.component_id), getattr(instance, '_bom_previous_edge', None)}
+    edges.discard(None)
+
+    def invalidate():
+        for parent_id, component_id in edges:
+            bom.invalidate_edge(parent_id, component_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=ProductMaterial)
+def invalidate_composition_bom(sender, instance, **kwargs):
+    product_id = instance.product_id
+    transaction.on_commit(lambda: bom.invalidate_rollups([product_id]))
+
+
+@receiver(post_save, sender=Material)
+def invalidate_material_bom(sender, instance, **kwargs):
+    # Deleting a material deletes its ProductMaterial rows, which invalidate
+    material_id = instance.pk
+    transaction.on_commit(lambda: bom.invalidate_material(material_id))
+
+
+def _update_autocomplete(update, *args):
+    try:
+        update(*args)
+    except RedisError:
+        logger.warning("Could not update the autocomplete index", exc_info=True)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Organization)
+def index_for_autocomplete(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index = autocomplete.INDEX_FOR_MODEL[sender]
+    transaction.on_commit(lambda: _update_autocomplete(index.index, instance))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=Organization)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    index = autocomplete.INDEX_FOR_MODEL[sender]
+    transaction.on_commit(lambda pk=instance.pk: _update_autocomplete(index.remove, pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductInstance)
+@receiver(post_save, sender=RepairRecord)
+@receiver(post_save, sender=Certificate)
+@receiver(post_save, sender=Organization)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Index in the same transaction, so search never sees uncommitted or lost writes."""
+    if raw:
+        return
+    search.index_object(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductInstance)
+@receiver(post_delete, sender=RepairRecord)
+@receiver(post_delete, sender=Certificate)
+@receiver(post_delete, sender=Organization)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove(search.DOC_TYPE_FOR_MODEL[sender], [instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def update_duplicate_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    dedup.index_products([instance])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_gtin_lookup(sender, instance, **kwargs):
+    """Drop a cached "unknown GTIN" or stale lookup for the product's barcode."""
+    if instance.barcode:
+        transaction.on_commit(lambda barcode=instance.barcode: gs1.invalidate_barcode(barcode))
+
+
+def log_change(sender, instance, raw=False, **kwargs):
+    """Append to the change feed in the saving transaction."""
+    if not raw:
+        changes.record_object(instance)
+
+
+def log_deletion(sender, instance, **kwargs):
+    changes.record_object(instance, ChangeLogEntry.DELETE)
+
+
+# Connected per model: a post_delete receiver without a sender would turn
+# off fast deletes for every model in the project
+for model in changes.RESOURCES:
+    post_save.connect(log_change, sender=model)
+    post_delete.connect(log_deletion, sender=model)
+
+
+@receiver([post_save, post_delete], sender=ProductMaterial)
+def log_material_change(sender, instance, raw=False, **kwargs):
+    """Materials are part of the product resource."""
+    if not raw:
+        changes.record('product', [instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.certificates.through)
+def log_certificate_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            changes.record('product', [instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        changes.record('product', pk_set)
+    elif action == 'pre_clear':
+        # pk_set is not provided when a certificate's products are cleared
+        changes.record('product', instance.products.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Certificate)
+def log_certificate_unlinks(sender, instance, **kwargs):
+    """Link rows of a deleted certificate go without an m2m_changed signal."""
+    changes.record('product', instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductInstance)
+@receiver(post_save, sender=ProductPassport)
+@receiver(post_save, sender=SupplyChainEvent)
+def push_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    events.publish(changes.RESOURCES[sender], [instance.pk], ChangeLogEntry.UPSERT, events.organizations_for(instance))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductInstance)
+@receiver(post_delete, sender=ProductPassport)
+@receiver(post_delete, sender=SupplyChainEvent)
+def push_deletion(sender, instance, **kwargs):
+    events.publish(changes.RESOURCES[sender], [instance.pk], ChangeLogEntry.DELETE, events.organizations_for(instance))
@@ -0,0 +1,19 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user():
+    """Create a user to make API requests as"""
+    return User.objects.create_user(email='tester@example.com', username='tester', password='pass12345!')
+
+
+@pytest.fixture
+def api_client(user):
+    """Return an API client authenticated as ``user``"""
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
@@ -0,0 +1,77 @@
+import pytest
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework import status
+from apps.core.redis_client import get_redis
+from apps.dpp import analytics
+from apps.dpp.models import Organization, Product, ProductInstance, ProductScanRollup, SerialScanRollup
+
+# An hour long past, so the test never shares buckets with real scans
+HOUR = 480000
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """Count scans in HOUR; its Redis keys are removed afterwards"""
+    monkeypatch.setattr(analytics, 'current_hour', lambda now=None: HOUR)
+    yield HOUR
+    redis = get_redis()
+    for key in redis.scan_iter(match=f'{analytics.KEY_PREFIX}:{HOUR}:*'):
+        redis.delete(key)
+    redis.srem(analytics.PENDING_KEY, HOUR)
+
+
+@pytest.fixture
+def instances():
+    """Create two instances of one product"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    product = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=maker)
+    return [ProductInstance.objects.create(product=product, serial_number=f'BAT-{i}') for i in range(2)]
+
+
+def scan(instance, address):
+    analytics.record_scan(instance, RequestFactory().get('/', REMOTE_ADDR=address, HTTP_USER_AGENT='test'))
+
+
+@pytest.mark.django_db
+def test_scans_are_flushed_into_rollups(bucket, instances):
+    """Test that buffered counters and visitor estimates end up in the hourly rollups"""
+    first, second = instances
+    scan(first, '10.0.0.1')
+    scan(first, '10.0.0.1')
+    scan(first, '10.0.0.2')
+    scan(second, '10.0.0.1')
+
+    assert analytics.flush_hour(bucket) == (1, 2)
+
+    product = ProductScanRollup.objects.get(product=first.product)
+    assert (product.hour, product.scan_count, product.unique_visitors) == (analytics.hour_to_datetime(bucket), 4, 2)
+    serials = {r.product_instance_id: (r.scan_count, r.unique_visitors) for r in SerialScanRollup.objects.all()}
+    assert serials == {first.pk: (3, 2), second.pk: (1, 1)}
+    redis = get_redis()
+    assert not list(redis.scan_iter(match=f'{analytics.KEY_PREFIX}:{bucket}:*'))
+    assert not redis.sismember(analytics.PENDING_KEY, bucket)
+
+
+@pytest.mark.django_db
+def test_only_closed_hours_are_flushed(bucket, instances):
+    """Test that the current hour stays in Redis until its grace period has passed"""
+    scan(instances[0], '10.0.0.1')
+    closes = (bucket + 1) * 3600
+
+    assert analytics.flush_closed_hours(now=closes + 10, grace_seconds=60) == []
+    assert analytics.flush_closed_hours(now=closes + 60, grace_seconds=60) == [(bucket, 1, 1)]
+    assert ProductScanRollup.objects.get().scan_count == 1
+
+
+@pytest.mark.django_db
+def test_invalid_range_is_rejected(api_client, instances):
+    """Test that malformed or reversed ranges return 400 instead of an error"""
+    url = reverse('product-scan-analytics', args=[instances[0].product_id])
+
+    assert api_client.get(url, {'since': '2024-02-30T00:00'}).status_code == status.HTTP_400_BAD_REQUEST
+    assert api_client.get(url, {'since': '2024-03-02', 'until': '2024-03-01'}).status_code == \
+        status.HTTP_400_BAD_REQUEST
+    response = api_client.get(url, {'since': '2024-03-01T00:00', 'until': '2024-03-02T00:00'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['total_scans'] == 0
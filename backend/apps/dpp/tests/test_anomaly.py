@@ -0,0 +1,112 @@
+import pytest
+from apps.core.sketches import BloomFilter, CountMinSketch
+from apps.dpp.anomaly import LOCATIONS, RATE, ScanAnomalyDetector, SlidingWindowSketch, scan_location
+
+
+@pytest.fixture
+def published():
+    """Collect flags instead of sending them to Redis"""
+    return []
+
+
+@pytest.fixture
+def detector(published):
+    """Return a detector with small thresholds for testing"""
+    return ScanAnomalyDetector(
+        window_seconds=60,
+        max_scans=5,
+        max_locations=2,
+        width=256,
+        pair_capacity=1000,
+        publish=lambda serial, details: published.append((serial, details)),
+    )
+
+
+# Sketch tests
+def test_count_min_sketch_never_undercounts():
+    """Test that count-min estimates are upper bounds of the true counts"""
+    sketch = CountMinSketch(width=64, depth=4)
+    for i in range(500):
+        sketch.add(f'SN-{i % 50}')
+
+    for i in range(50):
+        assert sketch.estimate(f'SN-{i}') >= 10
+    assert sketch.estimate('SN-0') == sketch.add('SN-0') - 1
+
+
+def test_bloom_filter_membership():
+    """Test that a Bloom filter has no false negatives and few false positives"""
+    bloom = BloomFilter.for_capacity(1000, error_rate=0.01)
+    for i in range(1000):
+        assert bloom.add(f'SN-{i}')
+
+    assert all(f'SN-{i}' in bloom for i in range(1000))
+    false_positives = sum(f'OTHER-{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+    assert not bloom.add('SN-1')
+
+
+def test_bloom_filter_bits_round_trip():
+    """Test that a filter rebuilt from its raw bits answers identically"""
+    bloom = BloomFilter(size_bits=4096, num_hashes=3)
+    bloom.add('SN-1')
+    copy = BloomFilter(size_bits=4096, num_hashes=3, bits=bytes(bloom.bits))
+
+    assert 'SN-1' in copy
+    assert copy.bits == bloom.bits
+
+
+def test_sliding_window_expires_old_counts():
+    """Test that counts leave the window once their slot expires"""
+    window = SlidingWindowSketch(window_seconds=60, slots=6, width=64)
+    for _ in range(3):
+        window.add('SN-1', now=1000)
+
+    assert window.estimate('SN-1', now=1030) == 3
+    assert window.estimate('SN-1', now=1061) == 0
+
+
+# Detector tests
+def test_detector_flags_high_scan_rate(detector, published):
+    """Test that a serial scanned too often within the window is flagged"""
+    for second in range(5):
+        assert detector.observe('SN-RATE', now=1000 + second) == []
+
+    assert detector.observe('SN-RATE', now=1006) == [RATE]
+    assert published[0][0] == 'SN-RATE'
+    assert published[0][1]['scans_in_window'] == 6
+
+
+def test_detector_flags_many_locations(detector, published):
+    """Test that a serial seen in too many places is flagged once per window"""
+    detector.observe('SN-CLONE', location='geo:52:21', now=1000)
+    detector.observe('SN-CLONE', location='geo:52:21', now=1001)
+    detector.observe('SN-CLONE', location='geo:48:2', now=1002)
+
+    assert detector.observe('SN-CLONE', location='geo:40:-3', now=1003) == [LOCATIONS]
+    assert detector.recent_flags()[0]['locations_in_window'] == 3
+
+
+def test_detector_ignores_normal_traffic(detector, published):
+    """Test that ordinary scans spread over time are not flagged"""
+    for minute in range(10):
+        detector.observe('SN-OK', location='geo:52:21', now=1000 + minute * 60)
+
+    assert published == []
+    assert detector.recent_flags() == []
+
+
+# Location tests
+@pytest.mark.parametrize('query, expected', [
+    ('lat=52.37&lon=4.9', 'geo:52:5'),
+    ('lat=inf&lon=4.9', 'net:10.1'),
+    ('lat=1e999&lon=4.9', 'net:10.1'),
+    ('lat=nan&lon=4.9', 'net:10.1'),
+    ('lat=91&lon=4.9', 'net:10.1'),
+    ('lat=52&lon=-181', 'net:10.1'),
+    ('lat=52', 'net:10.1'),
+])
+def test_scan_location_ignores_invalid_coordinates(rf, query, expected):
+    """Test that non-finite or out-of-range coordinates fall back to the network"""
+    request = rf.get(f'/?{query}', REMOTE_ADDR='10.1.2.3')
+    assert scan_location(request) == expected
@@ -0,0 +1,43 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from apps.core.redis_client import RedisError
+from apps.dpp import autocomplete
+from apps.dpp.models import Organization, Product
+
+
+def test_prefixes_are_word_aligned():
+    """Test that every word of a name can start a match"""
+    result = autocomplete.prefixes('Li-ion  Battery Pack')
+
+    assert {'l', 'li-ion', 'b', 'bat', 'battery p', 'p', 'pack'} <= result
+    assert 'attery' not in result
+    assert autocomplete.normalize('  Café  Öko ') == 'cafe oko'
+
+
+@pytest.mark.django_db
+def test_falls_back_to_database_without_redis(api_client, monkeypatch):
+    """Test that suggestions still work when Redis is unavailable"""
+    def unavailable():
+        raise RedisError("down")
+
+    monkeypatch.setattr(autocomplete, 'get_redis', unavailable)
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    Product.objects.create(name='Battery pack', description='Li-ion', manufacturer=maker)
+    Product.objects.create(name='Motor', description='Hub motor', manufacturer=maker)
+
+    url = reverse('autocomplete', args=['products'])
+    response = api_client.get(url, {'q': 'bat'})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [s['name'] for s in response.data['results']] == ['Battery pack']
+    # Like the index, any word of the name can start a match
+    assert [s['name'] for s in api_client.get(url, {'q': 'pac'}).data['results']] == ['Battery pack']
+    assert api_client.get(url, {'q': 'ack'}).data['results'] == []
+
+
+@pytest.mark.django_db
+def test_unknown_kind(api_client):
+    """Test that an unknown index returns 404"""
+    response = api_client.get(reverse('autocomplete', args=['serials']), {'q': 'a'})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
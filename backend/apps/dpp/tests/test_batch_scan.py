@@ -0,0 +1,57 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from apps.dpp.models import Material, Organization, Product, ProductInstance, ProductMaterial
+
+
+@pytest.fixture
+def instances():
+    """Create two products with instances and materials"""
+    manufacturer = Organization.objects.create(name='E-Bikes Ltd')
+    steel = Material.objects.create(name='Steel', is_recyclable=True)
+    battery = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=manufacturer)
+    frame = Product.objects.create(name='Frame', description='Steel frame', manufacturer=manufacturer)
+    ProductMaterial.objects.create(product=frame, material=steel, percentage=100)
+    return [
+        ProductInstance.objects.create(product=battery, serial_number=f'BAT-{i}', manufacturing_batch='B1')
+        for i in range(3)
+    ] + [ProductInstance.objects.create(product=frame, serial_number='FRAME-1')]
+
+
+@pytest.mark.django_db
+def test_batch_scan_resolves_serials(api_client, instances):
+    """Test resolving a mix of known and unknown serial numbers"""
+    url = reverse('product-scan-batch')
+    serials = ['BAT-0', 'BAT-1', 'BAT-2', 'FRAME-1', 'MISSING-1', 'BAT-0']
+    response = api_client.post(url, {'serial_numbers': serials}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert set(response.data['results']) == {'BAT-0', 'BAT-1', 'BAT-2', 'FRAME-1'}
+    assert response.data['not_found'] == ['MISSING-1']
+    assert len(response.data['products']) == 2
+
+    frame = response.data['results']['FRAME-1']['product']
+    assert response.data['products'][frame]['materials'] == ['Steel']
+    assert response.data['products'][frame]['is_recyclable'] is True
+
+
+@pytest.mark.django_db
+def test_batch_scan_query_count_is_constant(api_client, instances, django_assert_max_num_queries):
+    """Test that the number of queries does not grow with the batch size"""
+    url = reverse('product-scan-batch')
+    serials = [instance.serial_number for instance in instances] + [f'MISSING-{i}' for i in range(500)]
+
+    with django_assert_max_num_queries(3):
+        response = api_client.post(url, {'serial_numbers': serials}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data['not_found']) == 500
+
+
+@pytest.mark.django_db
+def test_batch_scan_rejects_empty_batch(api_client):
+    """Test that an empty list of serial numbers is rejected"""
+    url = reverse('product-scan-batch')
+    response = api_client.post(url, {'serial_numbers': []}, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
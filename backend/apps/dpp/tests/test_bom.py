@@ -0,0 +1,138 @@
+import pytest
+from decimal import Decimal
+from django.core.cache import cache
+from apps.dpp import bom
+from apps.dpp.models import Material, Organization, Product, ProductComponent, ProductMaterial
+from apps.dpp.serializers import ProductComponentSerializer
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    """Use an in-process cache instead of Redis"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    cache.clear()
+
+
+@pytest.fixture
+def ebike():
+    """Create an e-bike made of a battery pack (two cells each) and a motor"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    lithium = Material.objects.create(name='Lithium', is_recyclable=True)
+
+    def product(name, weight, carbon):
+        return Product.objects.create(name=name, description=name, manufacturer=maker,
+                                      weight=weight, carbon_footprint=carbon)
+
+    bike = product('E-bike', 10000, 50)
+    pack = product('Battery pack', 500, 10)
+    cell = product('Cell', 250, 5)
+    motor = product('Motor', 3000, 20)
+    ProductMaterial.objects.create(product=cell, material=lithium, percentage=20)
+    ProductComponent.objects.create(parent=bike, component=pack, quantity=1)
+    ProductComponent.objects.create(parent=bike, component=motor, quantity=1)
+    ProductComponent.objects.create(parent=pack, component=cell, quantity=2)
+    return bike, pack, cell, motor
+
+
+@pytest.mark.django_db
+def test_tree(ebike):
+    """Test that the tree nests components with cumulative quantities"""
+    bike, pack, cell, motor = ebike
+    tree = bom.tree(bike)
+
+    assert tree['id'] == bike.pk
+    assert {node['name'] for node in tree['components']} == {'Battery pack', 'Motor'}
+    pack_node = next(node for node in tree['components'] if node['id'] == pack.pk)
+    assert [(node['id'], node['total_quantity']) for node in pack_node['components']] == [(cell.pk, 2)]
+
+
+@pytest.mark.django_db
+def test_rollup(ebike):
+    """Test rolling up mass, carbon footprint and material mass over the tree"""
+    bike, *_ = ebike
+    rollup = bom.rollup(bike)
+
+    assert rollup['total_weight'] == Decimal('14000')
+    assert rollup['total_carbon_footprint'] == Decimal('90')
+    assert rollup['products'] == 4
+    assert [(m['name'], m['mass']) for m in rollup['materials']] == [('Lithium', Decimal('100'))]
+
+
+@pytest.mark.django_db
+def test_where_used(ebike):
+    """Test finding every assembly that contains a component"""
+    bike, pack, cell, _ = ebike
+    used = bom.where_used(cell)
+
+    assert [(row['id'], row['depth'], row['total_quantity'], row['is_top_level']) for row in used] == [
+        (pack.pk, 1, 2, False),
+        (bike.pk, 2, 2, True),
+    ]
+
+
+@pytest.mark.django_db
+def test_cycles_are_rejected(ebike):
+    """Test that a product cannot become a component of its own components"""
+    bike, _, cell, _ = ebike
+    serializer = ProductComponentSerializer(data={'parent': cell.pk, 'component': bike.pk, 'quantity': 1})
+
+    assert not serializer.is_valid()
+    assert 'component' in serializer.errors
+
+
+@pytest.mark.django_db
+def test_changes_invalidate_cache(ebike, django_capture_on_commit_callbacks):
+    """Test that changing a node deep in the tree refreshes cached rollups"""
+    bike, _, cell, _ = ebike
+    assert bom.rollup(bike)['total_weight'] == Decimal('14000')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        cell.weight = 300
+        cell.save()
+
+    assert bom.rollup(bike)['total_weight'] == Decimal('14100')
+
+
+@pytest.mark.django_db
+def test_changes_leave_unrelated_trees_cached(ebike, django_capture_on_commit_callbacks,
+                                              django_assert_num_queries):
+    """Test that a write only invalidates the trees it is part of"""
+    bike, pack, cell, motor = ebike
+    scooter = Product.objects.create(name='Scooter', description='Scooter', manufacturer=bike.manufacturer,
+                                     weight=8000, carbon_footprint=30)
+    for product in (bike, pack, motor, scooter):
+        bom.rollup(product)
+    bom.where_used(motor)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        cell.weight = 300
+        cell.save()
+
+    with django_assert_num_queries(0):
+        bom.rollup(motor)
+        bom.rollup(scooter)
+        bom.where_used(motor)
+    assert bom.rollup(pack)['total_weight'] == Decimal('1100')
+    assert bom.rollup(bike)['total_weight'] == Decimal('14100')
+
+
+@pytest.mark.django_db
+def test_edge_changes_invalidate_both_directions(ebike, django_capture_on_commit_callbacks):
+    """Test that removing a component refreshes its old assemblies and its where-used list"""
+    bike, pack, cell, motor = ebike
+    assert [row['id'] for row in bom.where_used(motor)] == [bike.pk]
+    assert bom.rollup(bike)['products'] == 4
+
+    with django_capture_on_commit_callbacks(execute=True):
+        edge = ProductComponent.objects.get(parent=bike, component=motor)
+        edge.parent = pack
+        edge.save()
+
+    assert [row['id'] for row in bom.where_used(motor)] == [pack.pk, bike.pk]
+    assert bom.rollup(pack)['total_weight'] == Decimal('4000')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        edge.delete()
+
+    assert bom.where_used(motor) == []
+    assert bom.rollup(bike)['products'] == 3
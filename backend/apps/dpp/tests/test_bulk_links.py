@@ -0,0 +1,82 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from apps.dpp.models import Certificate, Material, Organization, Product, ProductMaterial
+
+
+@pytest.fixture
+def product_line():
+    """Create five products of one manufacturer and one of another"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    other = Organization.objects.create(name='Other Ltd')
+    products = [Product.objects.create(name=f'Bike {i}', description='E-bike', manufacturer=maker) for i in range(5)]
+    Product.objects.create(name='Scooter', description='E-scooter', manufacturer=other)
+    return maker, products
+
+
+@pytest.mark.django_db
+def test_link_and_unlink_certificates(api_client, product_line, settings):
+    """Test linking a certificate to a product line in small chunks, twice, then unlinking"""
+    settings.DPP_BULK_CHUNK_SIZE = 2
+    maker, products = product_line
+    certificate = Certificate.objects.create(name='CE', issuing_body='EU', certificate_type='conformity',
+                                             valid_from='2026-01-01')
+    url = reverse('product-bulk-certificates')
+    payload = {'selection': {'manufacturer': maker.pk}, 'certificates': [certificate.pk]}
+
+    for _ in range(2):
+        response = api_client.post(url, payload, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['products'] == 5
+    assert certificate.products.count() == 5
+
+    payload.update(selection={'ids': [products[0].pk]}, operation='unlink')
+    response = api_client.post(url, payload, format='json')
+    assert response.data['removed'] == 1
+    assert certificate.products.count() == 4
+
+
+@pytest.mark.django_db
+def test_upsert_and_replace_materials(api_client, product_line):
+    """Test updating a composition in place and replacing it"""
+    maker, products = product_line
+    steel = Material.objects.create(name='Steel')
+    aluminium = Material.objects.create(name='Aluminium')
+    ProductMaterial.objects.create(product=products[0], material=steel, percentage=10)
+    url = reverse('product-bulk-materials')
+
+    response = api_client.post(url, {
+        'selection': {'manufacturer': maker.pk},
+        'materials': [{'material': steel.pk, 'percentage': '60.00'}],
+    }, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert ProductMaterial.objects.filter(material=steel, percentage=60).count() == 5
+
+    response = api_client.post(url, {
+        'selection': {'ids': [p.pk for p in products]},
+        'materials': [{'material': aluminium.pk, 'percentage': '80.00'}],
+        'operation': 'replace',
+    }, format='json')
+    assert response.data['removed'] == 5
+    assert set(ProductMaterial.objects.values_list('material__name', flat=True)) == {'Aluminium'}
+
+
+@pytest.mark.django_db
+def test_upsert_counts_existing_materials(api_client, product_line):
+    """Test that an upsert is rejected if it pushes a product's composition over 100%"""
+    maker, products = product_line
+    steel = Material.objects.create(name='Steel')
+    aluminium = Material.objects.create(name='Aluminium')
+    ProductMaterial.objects.create(product=products[1], material=steel, percentage=50)
+    url = reverse('product-bulk-materials')
+    payload = {'selection': {'manufacturer': maker.pk},
+               'materials': [{'material': aluminium.pk, 'percentage': '60.00'}]}
+
+    response = api_client.post(url, payload, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert str(products[1].pk) in str(response.data['materials'])
+    assert not ProductMaterial.objects.filter(material=aluminium).exists()
+    # The material being upserted replaces its own old share
+    payload['materials'] = [{'material': steel.pk, 'percentage': '90.00'}]
+    assert api_client.post(url, payload, format='json').status_code == status.HTTP_200_OK
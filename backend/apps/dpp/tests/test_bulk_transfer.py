@@ -0,0 +1,99 @@
+import pytest
+from datetime import date
+from django.conf import settings
+from django.db import OperationalError
+from django.urls import reverse
+from rest_framework import status
+from apps.dpp import bulk
+from apps.dpp.models import Organization, Product, ProductInstance, SupplyChainEvent
+from apps.dpp.serializers import InstanceSelectionSerializer
+
+
+@pytest.fixture
+def orgs():
+    """Create a manufacturer and a retailer"""
+    return Organization.objects.create(name='E-Bikes Ltd'), Organization.objects.create(name='Bike Shop')
+
+
+@pytest.fixture
+def instances(orgs):
+    """Create five instances owned by the manufacturer"""
+    product = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=orgs[0])
+    return [
+        ProductInstance.objects.create(product=product, serial_number=f'BAT-{i}', current_owner=orgs[0])
+        for i in range(5)
+    ]
+
+
+@pytest.mark.django_db
+def test_transfer_in_chunks_with_events(api_client, orgs, instances, settings):
+    """Test that every selected instance changes owner and gets one event"""
+    settings.DPP_BULK_CHUNK_SIZE = 2
+    url = reverse('productinstance-bulk-transfer')
+    response = api_client.post(url, {
+        'selection': {'serial_from': 'BAT-1', 'serial_to': 'BAT-3'},
+        'current_owner': orgs[1].pk,
+        'event_type': SupplyChainEvent.RETAIL,
+    }, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {'updated': 3, 'events_created': 3}
+    owners = dict(ProductInstance.objects.values_list('serial_number', 'current_owner'))
+    assert owners == {'BAT-0': orgs[0].pk, 'BAT-1': orgs[1].pk, 'BAT-2': orgs[1].pk,
+                      'BAT-3': orgs[1].pk, 'BAT-4': orgs[0].pk}
+    assert SupplyChainEvent.objects.filter(organization=orgs[1]).count() == 3
+
+
+@pytest.mark.django_db
+def test_unselling_clears_sold_date(api_client, instances):
+    """Test that is_sold=false also clears the sold date"""
+    url = reverse('productinstance-bulk-transfer')
+    ProductInstance.objects.update(is_sold=True, sold_date=date(2026, 1, 5))
+
+    response = api_client.post(url, {'selection': {'product': instances[0].product_id}, 'is_sold': False},
+                               format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not ProductInstance.objects.filter(sold_date__isnull=False).exists()
+    conflicting = api_client.post(url, {'selection': {'product': instances[0].product_id}, 'is_sold': False,
+                                        'sold_date': '2026-01-05'}, format='json')
+    assert conflicting.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_failed_chunk_reports_progress_and_resumes(api_client, orgs, instances, settings, monkeypatch):
+    """Test that a failure part way says what was applied and can be continued"""
+    settings.DPP_BULK_CHUNK_SIZE = 2
+    url = reverse('productinstance-bulk-transfer')
+    payload = {'selection': {'product': instances[0].product_id}, 'current_owner': orgs[1].pk,
+               'event_type': SupplyChainEvent.RETAIL}
+    transfer_chunk = bulk._transfer_chunk
+    calls = []
+
+    def fail_second_chunk(ids, *args):
+        calls.append(ids)
+        if len(calls) == 2:
+            raise OperationalError("deadlock detected")
+        return transfer_chunk(ids, *args)
+
+    monkeypatch.setattr(bulk, '_transfer_chunk', fail_second_chunk)
+    response = api_client.post(url, payload, format='json')
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert (response.data['updated'], response.data['events_created']) == (2, 2)
+    assert response.data['resume_after'] == instances[1].pk
+
+    resumed = api_client.post(url, dict(payload, after=response.data['resume_after']), format='json')
+
+    assert resumed.data == {'updated': 3, 'events_created': 3}
+    assert not ProductInstance.objects.exclude(current_owner=orgs[1]).exists()
+    assert SupplyChainEvent.objects.count() == 5
+
+
+def test_serial_list_is_bounded():
+    """Test that a selection cannot list more serial numbers than the configured maximum"""
+    too_many = [f'SN-{i}' for i in range(settings.DPP_BULK_MAX_SERIALS + 1)]
+    serializer = InstanceSelectionSerializer(data={'serial_numbers': too_many})
+
+    assert not serializer.is_valid()
+    assert 'serial_numbers' in serializer.errors
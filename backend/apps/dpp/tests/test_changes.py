@@ -0,0 +1,88 @@
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from apps.dpp import bulk
+from apps.dpp.models import (
+    Certificate,
+    ChangeLogEntry,
+    Material,
+    Organization,
+    Product,
+    ProductMaterial,
+    ProductScanRollup,
+)
+
+
+def read_feed(client, cursor='', **params):
+    """Follow the feed from ``cursor`` to its end; returns (changes, cursor)"""
+    changes = []
+    while True:
+        response = client.get(reverse('change-feed'), dict(params, cursor=cursor))
+        assert response.status_code == status.HTTP_200_OK
+        changes.extend(response.data['changes'])
+        cursor = response.data['cursor']
+        if not response.data['has_more']:
+            return changes, cursor
+
+
+# Entries only become readable once their transaction has committed
+@pytest.mark.django_db(transaction=True)
+def test_feed_reports_updates_and_tombstones(api_client):
+    """Test following the feed across creates, updates and deletes"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    bike = Product.objects.create(name='City e-bike', description='Commuter', manufacturer=maker)
+    changes, cursor = read_feed(api_client, limit=1)
+    assert [(c['resource'], c['id'], c['action']) for c in changes] == [
+        ('organization', maker.pk, 'upsert'),
+        ('product', bike.pk, 'upsert'),
+    ]
+
+    bike.name = 'City e-bike 2'
+    bike.save()
+    certificate = Certificate.objects.create(name='CE', issuing_body='EU', certificate_type='conformity',
+                                             valid_from='2026-01-01')
+    bike.certificates.add(certificate)
+    bike_id = bike.pk
+    bike.delete()
+
+    changes, cursor = read_feed(api_client, cursor, resource='product')
+    assert [c['action'] for c in changes] == ['upsert', 'upsert', 'delete']
+    assert changes[0]['url'].endswith(f'/products/{bike_id}/')
+    assert changes[-1]['url'] is None
+
+    changes, _ = read_feed(api_client, cursor)
+    assert changes == []
+
+
+@pytest.mark.django_db
+def test_feed_rejects_bad_parameters(api_client):
+    """Test validation of the cursor and resource parameters"""
+    assert api_client.get(reverse('change-feed'), {'cursor': 'abc'}).status_code == status.HTTP_400_BAD_REQUEST
+    assert api_client.get(reverse('change-feed'), {'resource': 'widgets'}).status_code == \
+        status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_untracked_models_keep_fast_deletes(django_assert_num_queries):
+    """Test that change feed receivers do not make other models delete row by row"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    product = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=maker)
+    ProductScanRollup.objects.create(product=product, hour=timezone.now(), scan_count=1)
+
+    with django_assert_num_queries(1):
+        ProductScanRollup.objects.filter(product=product).delete()
+
+
+@pytest.mark.django_db
+def test_unlinking_materials_logs_each_product_once():
+    """Test that only products that lost a material are logged, once each"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    steel = Material.objects.create(name='Steel')
+    products = [Product.objects.create(name=f'Bike {i}', description='E-bike', manufacturer=maker) for i in range(3)]
+    ProductMaterial.objects.create(product=products[0], material=steel, percentage=10)
+    ChangeLogEntry.objects.all().delete()
+
+    bulk.unlink_materials(Product.objects.all(), [steel])
+
+    assert list(ChangeLogEntry.objects.values_list('resource', 'object_id')) == [('product', str(products[0].pk))]
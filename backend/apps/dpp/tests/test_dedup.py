@@ -0,0 +1,68 @@
+import pytest
+from apps.dpp import dedup
+from apps.dpp.models import Organization, Product, ProductLSHBucket, ProductSignature
+
+
+@pytest.fixture
+def catalog():
+    """Create two near-duplicate imports of one battery and an unrelated product"""
+    shop_a = Organization.objects.create(name='Shop A')
+    shop_b = Organization.objects.create(name='Shop B')
+    first = Product.objects.create(name='Bosch PowerPack 500 e-bike battery', model_number='BBS275',
+                                   description='Lithium-ion battery for e-bikes 500Wh', manufacturer=shop_a)
+    second = Product.objects.create(name='Bosch PowerPack 500 ebike battery', model_number='BBS 275',
+                                    description='Lithium-ion battery for e-bikes, 500 Wh', manufacturer=shop_b)
+    other = Product.objects.create(name='Shimano brake lever', model_number='BL-M4100',
+                                   description='Hydraulic disc brake lever', manufacturer=shop_a)
+    return first, second, other
+
+
+def test_similarity_estimate():
+    """Test that signatures of similar texts agree on most slots"""
+    first = dedup.signature(dedup.shingles('Bosch PowerPack 500', 'BBS275'))
+    second = dedup.signature(dedup.shingles('Bosch PowerPack 500', 'BBS275'))
+    other = dedup.signature(dedup.shingles('Shimano brake lever', 'BL-M4100'))
+
+    assert dedup.similarity(first, second) == 1
+    assert dedup.similarity(first, other) < 0.2
+
+
+@pytest.mark.django_db
+def test_crowded_buckets_are_sampled(monkeypatch):
+    """Test that lookups and the report only compare a stable sample of a crowded bucket"""
+    monkeypatch.setattr(dedup, 'MAX_BUCKET_MEMBERS', 5)
+    maker = Organization.objects.create(name='Shop A')
+    products = Product.objects.bulk_create([
+        Product(name=f'Generic cable {i}', description='Cable', manufacturer=maker) for i in range(20)
+    ])
+    values = dedup.signature(dedup.shingles('Generic cable'))
+    ProductSignature.objects.bulk_create([
+        ProductSignature(product=product, signature=dedup.pack(values)) for product in products
+    ])
+    ProductLSHBucket.objects.bulk_create([
+        ProductLSHBucket(product=product, band=0, bucket=42) for product in products
+    ])
+
+    matches = dedup.likely_duplicates(products[0], limit=100)
+    assert len(matches) == 5
+    assert dedup.likely_duplicates(products[0], limit=100) == matches
+    assert [len(members) for members, _ in dedup.duplicate_clusters()] == [5]
+
+
+@pytest.mark.django_db
+def test_likely_duplicates(catalog):
+    """Test that saving products indexes them and finds the near-duplicate"""
+    first, second, other = catalog
+    matches = dedup.likely_duplicates(first)
+
+    assert [pk for pk, _ in matches] == [second.pk]
+    assert dedup.likely_duplicates(other) == []
+
+
+@pytest.mark.django_db
+def test_duplicate_clusters(catalog):
+    """Test that the batch report groups the near-duplicates"""
+    first, second, _ = catalog
+    clusters = dedup.duplicate_clusters()
+
+    assert [members for members, _ in clusters] == [sorted([first.pk, second.pk])]
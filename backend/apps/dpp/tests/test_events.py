@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from apps.dpp import events
+from apps.dpp.views import EventStreamView
+from apps.dpp.models import Organization, Product, ProductInstance
+
+
+@pytest.fixture
+def broker(monkeypatch, settings):
+    """Return a broker whose Redis subscription is never started"""
+    settings.DPP_EVENTS_QUEUE_SIZE = 2
+
+    async def listen(self):
+        return None
+
+    monkeypatch.setattr(events.Broker, '_listen', listen)
+    return events.Broker()
+
+
+def test_dispatch_filters_by_organization(broker):
+    """Test that messages only reach subscribers of the named organizations"""
+    async def scenario():
+        maker, owner, anonymous = broker.subscribe(1), broker.subscribe(2), broker.subscribe(None)
+        broker.dispatch({'resource': 'instance', 'ids': [5], 'action': 'upsert', 'organizations': ['1']})
+        broker.dispatch({'resource': 'passport', 'ids': ['a'], 'action': 'delete', 'organizations': ['*']})
+        return [[queue.get_nowait()['resource'] for _ in range(queue.qsize())] for queue in (maker, owner, anonymous)]
+
+    assert asyncio.run(scenario()) == [['instance', 'passport'], ['passport'], ['passport']]
+
+
+def test_slow_subscriber_is_told_to_resync(broker):
+    """Test that a full queue keeps its messages, is dropped and ends with a resync marker"""
+    async def scenario():
+        queue = broker.subscribe(1)
+        for pk in range(3):
+            broker.dispatch({'resource': 'product', 'ids': [pk], 'action': 'upsert', 'organizations': ['1']})
+        return queue, broker.queues
+
+    queue, queues = asyncio.run(scenario())
+    assert [queue.get_nowait()['ids'] for _ in range(2)] == [[0], [1]]
+    assert queue.get_nowait() is None
+    assert not queues
+
+
+@pytest.mark.django_db
+def test_changes_are_published_after_commit(monkeypatch, django_capture_on_commit_callbacks):
+    """Test that saving an instance publishes to its manufacturer and owner"""
+    sent = []
+    monkeypatch.setattr(events, '_send', sent.append)
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    shop = Organization.objects.create(name='Bike Shop')
+    bike = Product.objects.create(name='City e-bike', description='Commuter', manufacturer=maker)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        instance = ProductInstance.objects.create(product=bike, serial_number='EB-1', current_owner=shop)
+        assert sent == []
+
+    assert {'resource': 'instance', 'ids': [instance.pk], 'action': 'upsert',
+            'organizations': sorted([str(maker.pk), str(shop.pk)])} in sent
+
+
+@pytest.mark.django_db
+def test_stream_tickets_work_once(api_client, user, rf):
+    """Test that a stream ticket opens one stream as its user and is then spent"""
+    response = api_client.post(reverse('event-stream-ticket'))
+    assert response.status_code == status.HTTP_200_OK
+    request = rf.get('/', {'ticket': response.data['ticket']})
+
+    assert EventStreamView().authenticate(request) == user
+    assert EventStreamView().authenticate(request) is None
+    assert EventStreamView().authenticate(rf.get('/', {'ticket': 'made-up'})) is None
@@ -0,0 +1,68 @@
+import pytest
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.dpp import gs1
+from apps.dpp.models import Organization, Product, ProductInstance
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    """Use an in-process cache and skip the Redis-backed serial filter"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.DPP_SERIAL_FILTER_ENABLED = False
+    settings.DPP_SCAN_ANALYTICS_ENABLED = False
+    settings.DPP_ANOMALY_DETECTION_ENABLED = False
+    cache.clear()
+
+
+@pytest.fixture
+def instance():
+    """Create a product with an EAN-13 barcode and one instance"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    product = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=maker,
+                                     barcode='9506000134352')
+    return ProductInstance.objects.create(product=product, serial_number='ABC123')
+
+
+def test_parse_forms():
+    """Test that links, element strings and bare GTINs parse to the same GTIN-14"""
+    assert gs1.parse('/01/09506000134352/21/ABC123?10=LOT7') == {
+        'gtin': '09506000134352', 'serial': 'ABC123', 'batch': 'LOT7',
+    }
+    assert gs1.parse('https-prefix/shop/01/9506000134352')['gtin'] == '09506000134352'
+    assert gs1.parse('(01)09506000134352(21)ABC123')['serial'] == 'ABC123'
+    assert gs1.parse('9506000134352') == {'gtin': '09506000134352'}
+    assert gs1.gtin_variants('09506000134352') == {'09506000134352', '9506000134352'}
+
+
+def test_invalid_check_digit():
+    """Test that GTINs with a wrong check digit are rejected"""
+    with pytest.raises(gs1.GS1Error):
+        gs1.parse('/01/09506000134353')
+
+
+@pytest.mark.django_db
+def test_resolve_digital_link(instance):
+    """Test resolving a Digital Link to the instance passport and to a redirect"""
+    client = APIClient()
+    response = client.get('/01/09506000134352/21/ABC123', HTTP_ACCEPT='application/json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['specific_instance']['serial_number'] == 'ABC123'
+
+    response = client.get('/01/09506000134352/21/ABC123', HTTP_ACCEPT='text/html')
+    assert response.status_code == status.HTTP_302_FOUND
+    assert response['Location'].endswith('/instances/ABC123')
+    response = client.get('/01/09506000134352', HTTP_ACCEPT='text/html')
+    assert response['Location'].endswith('/products/09506000134352')
+
+    assert client.get('/01/09506000134352/21/OTHER').status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_gtin_lookup_is_cached(instance, django_assert_num_queries):
+    """Test that the barcode lookup is only done once per GTIN"""
+    product = instance.product
+    assert gs1.resolve_product('09506000134352') == product
+    with django_assert_num_queries(1):
+        assert gs1.resolve_product('09506000134352') == product
@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.core import idempotency
+from apps.dpp.models import ProductPassport
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def idempotency_store(settings):
+    """Back the idempotency store with an in-memory cache"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def passport_data():
+    """Return test data for a product passport"""
+    return {
+        'name': 'Test Product',
+        'qr_code': f'QR-{uuid.uuid4().hex[:10]}',
+        'sustainability_data': {'carbon_footprint': 25.5, 'recyclable': True},
+    }
+
+
+@pytest.mark.django_db
+def test_retry_replays_first_response(api_client, passport_data):
+    """Test that a retried create is answered from the store instead of creating twice"""
+    url = reverse('productpassport-list')
+    first = api_client.post(url, passport_data, format='json', HTTP_IDEMPOTENCY_KEY='sync-42')
+    retry = api_client.post(url, passport_data, format='json', HTTP_IDEMPOTENCY_KEY='sync-42')
+
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry['Idempotent-Replayed'] == 'true'
+    assert retry.json()['id'] == first.data['id']
+    assert ProductPassport.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_key_reuse_with_other_request_is_rejected(api_client, passport_data):
+    """Test that a key cannot be reused for a different body"""
+    url = reverse('productpassport-list')
+    api_client.post(url, passport_data, format='json', HTTP_IDEMPOTENCY_KEY='sync-43')
+    response = api_client.post(url, dict(passport_data, name='Other'), format='json', HTTP_IDEMPOTENCY_KEY='sync-43')
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert ProductPassport.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_requests_without_key_are_not_deduplicated(api_client, passport_data):
+    """Test that the header is opt-in"""
+    url = reverse('productpassport-list')
+    api_client.post(url, passport_data, format='json')
+    response = api_client.post(url, dict(passport_data, qr_code='QR-other'), format='json')
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert ProductPassport.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_keys_are_scoped_to_the_user(api_client, passport_data):
+    """Test that another user sending the same key gets their own response"""
+    other = APIClient()
+    other.force_authenticate(User.objects.create_user(email='other@example.com', username='other',
+                                                      password='pass12345!'))
+    url = reverse('productpassport-list')
+    api_client.post(url, passport_data, format='json', HTTP_IDEMPOTENCY_KEY='sync-44')
+    response = other.post(url, dict(passport_data, qr_code='QR-other'), format='json', HTTP_IDEMPOTENCY_KEY='sync-44')
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert not response.has_header('Idempotent-Replayed')
+    assert ProductPassport.objects.count() == 2
+
+
+def test_lock_is_renewed_while_the_view_runs(settings, monkeypatch):
+    """Test that a slow view keeps its lock past the lock timeout"""
+    settings.IDEMPOTENCY_LOCK_TIMEOUT = 0.03
+    touched = []
+    # The cache handle is per thread, so the whole module attribute is replaced
+    monkeypatch.setattr(idempotency, 'cache', SimpleNamespace(touch=lambda key, timeout: touched.append(key)))
+
+    with idempotency._LockRenewal('idempotency:user:1:abc:lock'):
+        idempotency.time.sleep(0.1)
+
+    assert touched and set(touched) == {'idempotency:user:1:abc:lock'}
+
+
+def test_duplicate_runs_when_first_request_stores_nothing(settings):
+    """Test that a waiting duplicate runs itself once the first request ends without a stored response"""
+    settings.IDEMPOTENCY_WAIT_TIMEOUT = 5
+    request = RequestFactory().post('/api/passports/', {}, content_type='application/json',
+                                    HTTP_IDEMPOTENCY_KEY='sync-45')
+    request._force_auth_user = User(pk=1, email='tester@example.com')
+    lock_key = f"idempotency:user:1:{hashlib.sha256(b'sync-45').hexdigest()}:lock"
+    # A first request that is still running, and then fails with a server error
+    cache.add(lock_key, 'running', 60)
+    threading.Timer(0.2, cache.delete, [lock_key]).start()
+    middleware = idempotency.IdempotencyMiddleware(lambda request: HttpResponse('created', status=201))
+
+    started = time.monotonic()
+    response = middleware(request)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert not response.has_header('Idempotent-Replayed')
+    # It waited for the first request instead of running straight away
+    assert time.monotonic() - started >= 0.2
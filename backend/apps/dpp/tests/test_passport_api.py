@@ -12,6 +12,12 @@ def api_client():
     """Return an API client for testing"""
     return APIClient()
 
+@pytest.fixture
+def user_client(api_client, user):
+    """Return an API client authenticated as a user"""
+    api_client.force_authenticate(user)
+    return api_client
+
 @pytest.fixture
 def passport_data():
     """Return test data for a product passport"""
@@ -174,4 +180,41 @@ def test_passport_delete_all(api_client):
     response = api_client.post(url)
     
     assert response.status_code == status.HTTP_204_NO_CONTENT
-    assert ProductPassport.objects.count() == 0 
\ No newline at end of file
+    assert ProductPassport.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_passport_bulk_upsert(user_client, passport, passport_data):
+    """Test creating, updating and skipping passports by QR code in one request"""
+    url = reverse('productpassport-bulk-upsert')
+    changed = dict(passport_data['sustainability_data'], carbon_footprint=20.0)
+    response = user_client.post(url, {'passports': [
+        passport_data,
+        {'name': 'New Product', 'qr_code': 'QR-NEW-1', 'sustainability_data': {'recyclable': False}},
+        {'name': 'Renamed', 'qr_code': 'QR-NEW-2'},
+    ]}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [result['status'] for result in response.data['results']] == ['unchanged', 'created', 'created']
+    assert response.data['results'][0]['id'] == passport.id
+    assert ProductPassport.objects.count() == 3
+
+    response = user_client.post(url, {'passports': [
+        dict(passport_data, sustainability_data=changed),
+        {'name': 'New Product', 'qr_code': 'QR-NEW-1', 'sustainability_data': {'recyclable': False}},
+    ]}, format='json')
+
+    assert (response.data['created'], response.data['updated'], response.data['unchanged']) == (0, 1, 1)
+    passport.refresh_from_db()
+    assert passport.get_sustainability_data()['carbon_footprint'] == 20.0
+    assert ProductPassport.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_passport_bulk_upsert_rejects_duplicate_codes(user_client, passport_data):
+    """Test that a batch naming a QR code twice is rejected"""
+    url = reverse('productpassport-bulk-upsert')
+    response = user_client.post(url, {'passports': [passport_data, passport_data]}, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert ProductPassport.objects.count() == 0
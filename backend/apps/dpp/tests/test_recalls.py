@@ -0,0 +1,97 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.dpp import recalls
+from apps.dpp.models import Organization, Product, ProductInstance, Recall, RecallNotification, SupplyChainEvent
+from apps.users.models import OutgoingEmail
+
+User = get_user_model()
+
+
+@pytest.fixture
+def recall():
+    """Recall batch B1, held by two shops and one unassigned unit"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    shops = [Organization.objects.create(name=name) for name in ('North Shop', 'South Shop')]
+    product = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=maker)
+    owners = [shops[0], shops[0], shops[1], None]
+    for i, owner in enumerate(owners):
+        ProductInstance.objects.create(product=product, serial_number=f'BAT-{i}', manufacturing_batch='B1',
+                                       current_owner=owner)
+    ProductInstance.objects.create(product=product, serial_number='BAT-OK', manufacturing_batch='B2',
+                                   current_owner=shops[0])
+    User.objects.create_user(email='north@example.com', username='north', password='pass12345!',
+                             organization=shops[0])
+    return Recall.objects.create(manufacturer=maker, manufacturing_batch='B1', reason='Overheating cells')
+
+
+@pytest.fixture
+def maker_client(recall):
+    """Return an API client authenticated as a member of the recalling manufacturer"""
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(email='quality@example.com', username='quality',
+                                                       password='pass12345!', organization=recall.manufacturer))
+    return client
+
+
+@pytest.mark.django_db
+def test_owner_summary_groups_affected_instances(recall):
+    """Test that only the recalled batch is counted, per owner"""
+    north, south = Organization.objects.filter(name__endswith='Shop').order_by('name')
+    assert recalls.owner_summary(recall) == {north.pk: 2, south.pk: 1, None: 1}
+
+
+@pytest.mark.django_db
+def test_affected_stream_includes_latest_event(maker_client, recall):
+    """Test that each affected instance is streamed with its latest event"""
+    instance = ProductInstance.objects.get(serial_number='BAT-0')
+    for day, location in ((1, 'Factory'), (3, 'Warehouse')):
+        SupplyChainEvent.objects.create(product_instance=instance, organization=recall.manufacturer,
+                                        event_type=SupplyChainEvent.DISTRIBUTION, location=location,
+                                        date=datetime(2026, 1, day, tzinfo=timezone.utc))
+
+    response = maker_client.get(reverse('recall-affected', args=[recall.pk]))
+    rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    assert [row['serial_number'] for row in rows] == ['BAT-0', 'BAT-1', 'BAT-2', 'BAT-3']
+    assert rows[0]['latest_event']['location'] == 'Warehouse'
+    assert rows[1]['latest_event'] is None
+
+
+@pytest.mark.django_db
+def test_notify_queues_one_email_per_organization_once(maker_client, recall):
+    """Test that notifications are recorded, mail is queued, and a second run adds nothing"""
+    url = reverse('recall-notify', args=[recall.pk])
+
+    response = maker_client.post(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert sorted((n['affected_count'], n['recipients']) for n in response.data) == [(1, 0), (2, 1)]
+    email = OutgoingEmail.objects.get()
+    assert email.to == ['north@example.com']
+    assert 'holds 2 affected item(s)' in email.body
+    recall.refresh_from_db()
+    assert recall.status == Recall.NOTIFIED
+
+    assert maker_client.post(url).status_code == status.HTTP_200_OK
+    assert RecallNotification.objects.count() == 2
+    assert OutgoingEmail.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_recalls_are_scoped_to_the_manufacturer(recall):
+    """Test that other organizations can neither see, notify nor create recalls for the manufacturer"""
+    client = APIClient()
+    client.force_authenticate(User.objects.get(email='north@example.com'))
+
+    assert client.get(reverse('recall-affected', args=[recall.pk])).status_code == status.HTTP_404_NOT_FOUND
+    assert client.post(reverse('recall-notify', args=[recall.pk])).status_code == status.HTTP_404_NOT_FOUND
+    response = client.post(reverse('recall-list'), {'manufacturer': recall.manufacturer_id,
+                                                    'manufacturing_batch': 'B2', 'reason': 'Urgent'}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert 'manufacturer' in response.data
+    assert not OutgoingEmail.objects.exists()
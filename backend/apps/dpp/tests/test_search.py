@@ -0,0 +1,97 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.dpp.models import Organization, Product, ProductCategory, ProductInstance, RepairRecord, SearchDocument
+
+User = get_user_model()
+
+
+@pytest.fixture
+def staff_client():
+    """Return an API client authenticated as support staff"""
+    user = User.objects.create_user(email='support@example.com', username='support', password='pass12345!',
+                                    is_staff=True)
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def catalog():
+    """Create a small catalog with an instance and a repair"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    other = Organization.objects.create(name='Volt Works')
+    bikes = ProductCategory.objects.create(name='Bikes')
+    bike = Product.objects.create(name='City e-bike', description='Battery powered commuter', manufacturer=maker,
+                                  category=bikes)
+    Product.objects.create(name='Battery charger', description='Fast charger', manufacturer=other)
+    instance = ProductInstance.objects.create(product=bike, serial_number='EB-2026-0001')
+    RepairRecord.objects.create(product_instance=instance, repair_date='2026-01-10', repair_shop=maker,
+                                issue='Battery does not charge', solution='Replaced battery cells')
+    return maker, bike, instance
+
+
+@pytest.mark.django_db
+def test_signals_index_documents(catalog):
+    """Test that saving and deleting objects keeps the index current"""
+    _, bike, instance = catalog
+    assert SearchDocument.objects.filter(doc_type='instance', object_id=instance.pk).exists()
+
+    bike.name = 'Urban e-bike'
+    bike.save()
+    product_doc = SearchDocument.objects.get(doc_type='product', object_id=bike.pk)
+    assert product_doc.title == 'Urban e-bike'
+
+    instance.delete()
+    assert not SearchDocument.objects.filter(doc_type='instance', object_id=instance.pk).exists()
+
+
+@pytest.mark.django_db
+def test_search_with_facets(staff_client, catalog):
+    """Test that one query returns hits of every type with facet counts"""
+    maker, *_ = catalog
+    response = staff_client.get(reverse('search'), {'q': 'battery'})
+
+    assert response.status_code == status.HTTP_200_OK
+    types = {facet['value']: facet['count'] for facet in response.data['facets']['type']}
+    assert types == {'product': 2, 'repair': 1}
+    assert response.data['total'] == 3
+
+    response = staff_client.get(reverse('search'), {'q': 'battery', 'manufacturer': maker.pk})
+    assert {hit['type'] for hit in response.data['results']} == {'product', 'repair'}
+    assert response.data['total'] == 2
+
+
+@pytest.mark.django_db
+def test_search_by_serial_number(staff_client, catalog):
+    """Test that serial numbers are found as exact tokens"""
+    _, _, instance = catalog
+    response = staff_client.get(reverse('search'), {'q': 'EB-2026-0001', 'type': 'instance'})
+
+    assert [hit['id'] for hit in response.data['results']] == [instance.pk]
+    assert response.data['results'][0]['url'] == reverse('productinstance-detail', args=[instance.pk])
+
+
+@pytest.mark.django_db
+def test_product_rename_rewrites_copies_after_commit(catalog, django_capture_on_commit_callbacks):
+    """Test that instance documents pick up a product rename once the rename commits"""
+    _, bike, instance = catalog
+
+    instance_doc = SearchDocument.objects.filter(doc_type='instance', object_id=instance.pk)
+    with django_capture_on_commit_callbacks(execute=True):
+        bike.name = 'Urban e-bike'
+        bike.save()
+        assert not instance_doc.filter(search_vector='urban').exists()
+
+    assert instance_doc.filter(search_vector='urban').exists()
+
+
+@pytest.mark.django_db
+def test_partial_ranking_is_reported(staff_client, catalog, settings):
+    """Test that the response says when more documents matched than were ranked"""
+    settings.DPP_SEARCH_RANK_CANDIDATES = 1
+
+    assert staff_client.get(reverse('search'), {'q': 'battery'}).data['ranking_is_partial']
+    assert not staff_client.get(reverse('search'), {'q': 'charger'}).data['ranking_is_partial']
@@ -0,0 +1,69 @@
+import pytest
+from apps.core.redis_client import get_redis, RedisError
+from apps.dpp import serial_filter as serial_filter_module
+from apps.dpp.models import Organization, Product, ProductInstance
+from apps.dpp.serial_filter import SerialFilter, rebuild
+
+
+class UnavailableRedis:
+    """Stands in for a Redis connection that is down"""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise RedisError("down")
+        return fail
+
+
+@pytest.fixture
+def product(settings):
+    """Create a product in a small filter; the shared filter is removed afterwards"""
+    settings.DPP_SERIAL_FILTER_CAPACITY = 1000
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    yield Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=maker)
+    get_redis().delete(serial_filter_module.FILTER_KEY, serial_filter_module.META_KEY)
+
+
+@pytest.mark.django_db
+def test_unknown_serials_are_rejected(product):
+    """Test that built serials pass and unknown ones are definitely missing"""
+    ProductInstance.objects.create(product=product, serial_number='BAT-1')
+    rebuild()
+    local = SerialFilter(refresh_seconds=3600)
+
+    assert local.might_exist('BAT-1')
+    assert not local.might_exist('BAT-UNKNOWN')
+
+
+@pytest.mark.django_db
+def test_rebuild_with_another_shape_reloads_local_copies(product, settings):
+    """Test that a process holding an old-shape copy notices the rebuild"""
+    rebuild()
+    local = SerialFilter(refresh_seconds=3600)
+    assert not local.might_exist('BAT-UNKNOWN')
+    old_shape = (local.local.size_bits, local.local.num_hashes)
+
+    settings.DPP_SERIAL_FILTER_CAPACITY = 50_000
+    rebuild()
+    local.add('BAT-NEW')
+
+    assert (local.local.size_bits, local.local.num_hashes) != old_shape
+    assert SerialFilter(refresh_seconds=3600).might_exist('BAT-NEW')
+    ProductInstance.objects.create(product=product, serial_number='BAT-2')
+    assert SerialFilter(refresh_seconds=3600).might_exist('BAT-2')
+
+
+@pytest.mark.django_db
+def test_failed_add_falls_back_to_database_until_retried(product):
+    """Test that a serial lost on the way to Redis is never reported as missing"""
+    rebuild()
+    local = SerialFilter(refresh_seconds=3600)
+    assert not local.might_exist('BAT-LOST')
+
+    with pytest.raises(RedisError):
+        local.add('BAT-LOST', redis=UnavailableRedis())
+
+    assert local.dirty
+    # The next round trip writes the serial to the shared bitmap
+    assert local.might_exist('BAT-LOST')
+    assert not local.dirty
+    assert SerialFilter(refresh_seconds=3600).might_exist('BAT-LOST')
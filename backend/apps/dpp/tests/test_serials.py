@@ -0,0 +1,73 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.dpp import serials
+from apps.dpp.models import Organization, Product, ProductInstance, SearchDocument, SerialSeries
+
+User = get_user_model()
+
+
+@pytest.fixture
+def series():
+    """Create a serial series and a product of the same manufacturer"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    product = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=maker)
+    return SerialSeries.objects.create(manufacturer=maker, name='Batteries', template='BAT-{batch}-{seq:06d}'), product
+
+
+def test_validate_template():
+    """Test that templates need a counter and only known fields"""
+    assert serials.validate_template('EB-{year}-{seq:08d}')
+    with pytest.raises(serials.SerialAllocationError):
+        serials.validate_template('EB-{year}')
+    with pytest.raises(serials.SerialAllocationError):
+        serials.validate_template('EB-{plant}-{seq}')
+
+
+@pytest.mark.django_db
+def test_blocks_do_not_overlap(series):
+    """Test that consecutive allocations hand out consecutive blocks"""
+    series, _ = series
+    assert serials.allocate(series, 100) == 1
+    assert serials.allocate(series, 5) == 101
+    series.refresh_from_db()
+    assert series.next_value == 106
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manufacture(series, settings):
+    """Test creating instances in bulk with serials from the series"""
+    settings.DPP_SERIAL_FILTER_ENABLED = False
+    series, product = series
+    result = serials.manufacture(series, product, 1200, batch='B7', chunk_size=500)
+
+    assert result['first_serial'] == 'BAT-B7-000001'
+    assert result['last_serial'] == 'BAT-B7-001200'
+    instances = ProductInstance.objects.filter(product=product)
+    assert instances.count() == 1200
+    assert set(instances.values_list('manufacturing_batch', flat=True)) == {'B7'}
+    assert SearchDocument.objects.filter(doc_type='instance').count() == 1200
+
+    second = serials.manufacture(series, product, 10, batch='B7')
+    assert second['first_serial'] == 'BAT-B7-001201'
+
+
+@pytest.mark.django_db
+def test_series_are_scoped_to_the_manufacturer(series):
+    """Test that other organizations can neither use nor create series of the manufacturer"""
+    series, product = series
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(email='other@example.com', username='other',
+                                                       password='pass12345!',
+                                                       organization=Organization.objects.create(name='Other')))
+
+    url = reverse('serialseries-allocate', args=[series.pk])
+    assert client.post(url, {'count': 10}, format='json').status_code == status.HTTP_404_NOT_FOUND
+    response = client.post(reverse('serialseries-list'), {'manufacturer': series.manufacturer_id, 'name': 'Mine',
+                                                          'template': 'X-{seq}'}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert 'manufacturer' in response.data
+    series.refresh_from_db()
+    assert series.next_value == 1
@@ -0,0 +1,137 @@
+import pytest
+from datetime import datetime, timezone
+from django.urls import reverse
+from rest_framework import status
+from apps.dpp import timeline
+from apps.dpp.models import Organization, OwnershipPeriod, Product, ProductInstance, SupplyChainEvent
+
+
+def at(day):
+    return datetime(2026, 1, day, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def orgs():
+    """Create a manufacturer, a distributor and a retailer"""
+    return [Organization.objects.create(name=name) for name in ('Maker', 'Distributor', 'Retailer')]
+
+
+@pytest.fixture
+def instance(orgs):
+    """Create a product instance without events"""
+    product = Product.objects.create(name='Battery', description='Li-ion pack', manufacturer=orgs[0])
+    return ProductInstance.objects.create(product=product, serial_number='BAT-1')
+
+
+def add_event(instance, organization, day, event_type=SupplyChainEvent.DISTRIBUTION):
+    return SupplyChainEvent.objects.create(product_instance=instance, organization=organization,
+                                           event_type=event_type, date=at(day))
+
+
+def history(instance):
+    return [(p.organization.name, p.valid_from, p.valid_to)
+            for p in OwnershipPeriod.objects.filter(product_instance=instance).order_by('valid_from')]
+
+
+@pytest.mark.django_db
+def test_events_build_ownership_history(instance, orgs):
+    """Test that events in order produce consecutive ownership periods"""
+    maker, distributor, retailer = orgs
+    add_event(instance, maker, 1, SupplyChainEvent.MANUFACTURING)
+    add_event(instance, maker, 2, SupplyChainEvent.PACKAGING)
+    add_event(instance, distributor, 5)
+    add_event(instance, retailer, 9, SupplyChainEvent.RETAIL)
+
+    assert history(instance) == [
+        ('Maker', at(1), at(5)),
+        ('Distributor', at(5), at(9)),
+        ('Retailer', at(9), None),
+    ]
+
+
+@pytest.mark.django_db
+def test_backdated_event_splits_period(instance, orgs):
+    """Test that an event inserted out of order splits the containing period"""
+    maker, distributor, retailer = orgs
+    add_event(instance, maker, 1)
+    add_event(instance, retailer, 9)
+    add_event(instance, distributor, 5)
+
+    assert history(instance) == [
+        ('Maker', at(1), at(5)),
+        ('Distributor', at(5), at(9)),
+        ('Retailer', at(9), None),
+    ]
+    assert timeline.rebuild(instance.pk) and history(instance) == [
+        ('Maker', at(1), at(5)),
+        ('Distributor', at(5), at(9)),
+        ('Retailer', at(9), None),
+    ]
+
+
+@pytest.mark.django_db
+def test_state_at(instance, orgs):
+    """Test looking up the holder and latest event at a point in time"""
+    maker, distributor, _ = orgs
+    add_event(instance, maker, 1)
+    event = add_event(instance, distributor, 5)
+
+    period, latest = timeline.state_at(instance, at(6))
+    assert period.organization == distributor
+    assert latest == event
+
+    period, latest = timeline.state_at(instance, at(3))
+    assert period.organization == maker
+    assert timeline.state_at(instance, datetime(2025, 12, 1, tzinfo=timezone.utc)) == (None, None)
+
+
+@pytest.mark.django_db
+def test_state_at_breaks_ties_like_the_history(instance, orgs):
+    """Test that of two events at the same time the later one is the latest event and owner"""
+    maker, distributor, _ = orgs
+    add_event(instance, maker, 1)
+    later = add_event(instance, distributor, 1)
+
+    period, latest = timeline.state_at(instance, at(2))
+    assert latest == later
+    assert period.organization == distributor
+
+
+@pytest.mark.django_db
+def test_deleting_event_rebuilds_history(instance, orgs):
+    """Test that removing an event removes its ownership period"""
+    maker, distributor, _ = orgs
+    add_event(instance, maker, 1)
+    add_event(instance, distributor, 5).delete()
+
+    assert history(instance) == [('Maker', at(1), None)]
+
+
+@pytest.mark.django_db
+def test_pages_keep_events_sharing_a_date(api_client, instance, orgs):
+    """Test that events with the same date on a page boundary are all returned once"""
+    maker, distributor, _ = orgs
+    events = [add_event(instance, maker, 1)] + [add_event(instance, distributor, 5) for _ in range(3)]
+    url = reverse('productinstance-timeline', args=[instance.pk])
+
+    seen, params = [], {'limit': 2}
+    while True:
+        response = api_client.get(url, params)
+        assert response.status_code == status.HTTP_200_OK
+        seen += [event['id'] for event in response.data['results']]
+        if response.data['next_before'] is None:
+            break
+        params = {'limit': 2, 'before': response.data['next_before'], 'before_id': response.data['next_before_id']}
+
+    assert seen == [event.pk for event in events[:0:-1]] + [events[0].pk]
+
+
+@pytest.mark.django_db
+def test_invalid_dates_are_rejected(api_client, instance):
+    """Test that impossible dates return 400 instead of an error"""
+    timeline_url = reverse('productinstance-timeline', args=[instance.pk])
+    state_url = reverse('productinstance-state', args=[instance.pk])
+
+    assert api_client.get(timeline_url, {'before': '2024-02-30T00:00'}).status_code == status.HTTP_400_BAD_REQUEST
+    assert api_client.get(state_url, {'at': '2024-02-30T00:00'}).status_code == status.HTTP_400_BAD_REQUEST
+    assert api_client.get(state_url, {'at': '2024-02-28T00:00'}).status_code == status.HTTP_200_OK
@@ -0,0 +1,44 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from apps.dpp.models import ChangeLogEntry, Organization, Product, ProductPassport
+
+
+@pytest.fixture
+def passport():
+    """Create a passport as the connector would"""
+    passport = ProductPassport(name='Kettle', qr_code='DPP-SHOP-1')
+    passport.set_sustainability_data({'carbon_footprint': 12.5, 'materials': ['steel', 'glass']})
+    passport.save()
+    return passport
+
+
+@pytest.mark.django_db
+def test_identical_passport_put_is_skipped(api_client, passport):
+    """Test that a PUT of the current content writes nothing and says so"""
+    url = reverse('productpassport-detail', kwargs={'pk': passport.pk})
+    payload = {'name': 'Kettle', 'qr_code': 'DPP-SHOP-1',
+               'sustainability_data': {'materials': ['steel', 'glass'], 'carbon_footprint': 12.5}}
+
+    response = api_client.put(url, payload, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response['X-DPP-Unchanged'] == 'true'
+    assert ProductPassport.objects.get(pk=passport.pk).updated_at == passport.updated_at
+
+    payload['sustainability_data']['carbon_footprint'] = 11.0
+    response = api_client.put(url, payload, format='json')
+    assert not response.has_header('X-DPP-Unchanged')
+    assert ProductPassport.objects.get(pk=passport.pk).get_sustainability_data()['carbon_footprint'] == 11.0
+
+
+@pytest.mark.django_db
+def test_unchanged_product_patch_skips_side_effects(api_client):
+    """Test that equal decimals and relations count as unchanged and log no change"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    bike = Product.objects.create(name='City e-bike', description='Commuter', manufacturer=maker, weight='21.50')
+    logged = ChangeLogEntry.objects.count()
+
+    response = api_client.patch(reverse('product-detail', args=[bike.pk]),
+                                {'name': 'City e-bike', 'weight': '21.5', 'manufacturer': maker.pk}, format='json')
+    assert response['X-DPP-Unchanged'] == 'true'
+    assert ChangeLogEntry.objects.count() == logged
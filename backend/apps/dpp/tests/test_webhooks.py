@@ -0,0 +1,135 @@
+import hashlib
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from asgiref.sync import async_to_sync
+from datetime import timedelta
+from django.utils import timezone
+from apps.dpp import webhooks
+from apps.dpp.models import Organization, Product, ProductInstance, WebhookDelivery, WebhookSubscription
+
+
+class StubEndpoint(BaseHTTPRequestHandler):
+    """Records requests and answers with the next queued status code"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((dict(self.headers), body))
+        self.send_response(self.server.statuses.pop(0) if self.server.statuses else 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(settings):
+    """Run a local HTTP server standing in for a subscriber"""
+    settings.DPP_WEBHOOK_ALLOW_PRIVATE_URLS = True
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubEndpoint)
+    server.requests, server.statuses = [], []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def subscription(endpoint):
+    """Subscribe a manufacturer to instance changes"""
+    maker = Organization.objects.create(name='E-Bikes Ltd')
+    return WebhookSubscription.objects.create(
+        organization=maker, url=f'http://127.0.0.1:{endpoint.server_port}/hook', resources=['instance'],
+    )
+
+
+def deliver_once():
+    async def round_trip():
+        async with webhooks.http_client() as client:
+            return await webhooks.deliver_due(client)
+
+    return async_to_sync(round_trip)()
+
+
+@pytest.mark.django_db
+def test_changes_are_batched_and_signed(endpoint, subscription, settings):
+    """Test that outbox rows written with the change are POSTed in signed batches"""
+    settings.DPP_WEBHOOK_BATCH_SIZE = 2
+    bike = Product.objects.create(name='City e-bike', description='Commuter', manufacturer=subscription.organization)
+    for number in range(3):
+        ProductInstance.objects.create(product=bike, serial_number=f'EB-{number}')
+    assert WebhookDelivery.objects.filter(subscription=subscription).count() == 3
+
+    assert deliver_once() == 3
+    assert len(endpoint.requests) == 2
+    headers, body = endpoint.requests[0]
+    expected = hmac.new(subscription.secret.encode(), f"{headers['X-DPP-Timestamp']}.".encode() + body,
+                        hashlib.sha256).hexdigest()
+    assert headers['X-DPP-Signature'] == f'sha256={expected}'
+    assert [d['resource'] for d in json.loads(body)['deliveries']] == ['instance', 'instance']
+    assert not WebhookDelivery.objects.filter(delivered_at__isnull=True).exists()
+
+
+@pytest.mark.django_db
+def test_failed_delivery_is_retried_with_backoff(endpoint, subscription, settings):
+    """Test that a failing subscriber is rescheduled and delivered on a later round"""
+    settings.DPP_WEBHOOK_MAX_ATTEMPTS = 2
+    webhooks.enqueue('instance', [1], 'upsert', [subscription.organization_id])
+    endpoint.statuses = [503]
+
+    deliver_once()
+    delivery = WebhookDelivery.objects.get()
+    assert delivery.delivered_at is None
+    assert delivery.last_error == 'HTTP 503'
+    assert delivery.next_attempt_at > timezone.now()
+    assert deliver_once() == 0
+
+    WebhookDelivery.objects.update(next_attempt_at=timezone.now())
+    deliver_once()
+    delivery.refresh_from_db()
+    assert delivery.delivered_at is not None
+    assert delivery.attempts == 2
+
+
+@pytest.mark.django_db
+def test_other_organizations_and_resources_are_not_queued(subscription):
+    """Test that only matching subscriptions get outbox rows"""
+    other = Organization.objects.create(name='Volt Works')
+    assert webhooks.enqueue('instance', [1], 'upsert', [other.pk]) == 0
+    assert webhooks.enqueue('product', [1], 'upsert', [subscription.organization_id]) == 0
+    assert webhooks.enqueue('passport', ['a'], 'upsert', [webhooks.EVERYONE]) == 0
+
+
+@pytest.mark.django_db
+def test_rows_wait_behind_a_retry(endpoint, subscription):
+    """Test that nothing overtakes a subscription's row that is waiting for a retry"""
+    for pk in (1, 2):
+        webhooks.enqueue('instance', [pk], 'upsert', [subscription.organization_id])
+    first, second = WebhookDelivery.objects.order_by('pk')
+    WebhookDelivery.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now() + timedelta(minutes=5))
+
+    assert deliver_once() == 0
+
+    WebhookDelivery.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+    assert deliver_once() == 2
+    _, body = endpoint.requests[0]
+    assert [d['delivery'] for d in json.loads(body)['deliveries']] == [first.pk, second.pk]
+
+
+@pytest.mark.django_db
+def test_private_addresses_are_refused(endpoint, subscription, settings):
+    """Test that URLs reaching internal addresses are rejected on save and never called"""
+    settings.DPP_WEBHOOK_ALLOW_PRIVATE_URLS = False
+    for url in ('http://127.0.0.1/hook', 'http://10.0.0.8/hook', 'http://169.254.169.254/latest', 'ftp://example.com'):
+        with pytest.raises(webhooks.UnsafeURLError):
+            webhooks.check_url(url)
+    webhooks.enqueue('instance', [1], 'upsert', [subscription.organization_id])
+
+    deliver_once()
+
+    assert endpoint.requests == []
+    assert WebhookDelivery.objects.get().last_error.startswith('UnsafeURLError')
@@ -0,0 +1,166 @@
+"""
+Supply chain timelines and the derived ownership history.
+
+Events are read through the (product_instance, date) index. Ownership is
+projected into ``OwnershipPeriod`` rows when events are written, so "who held
+this instance at time T" is a single index probe instead of a replay of the
+full event history.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from .models import OwnershipPeriod, ProductInstance, SupplyChainEvent
+
+
+def apply_event(event):
+    """
+    Fold a newly inserted event into its instance's ownership history.
+
+    Handles out-of-order (backdated) events by splitting the period that
+    contains the event date.
+    """
+    instance_id, organization_id, date = event.product_instance_id, event.organization_id, event.date
+    with transaction.atomic():
+        # Serialize history updates per instance
+        ProductInstance.objects.select_for_update().filter(pk=instance_id).values_list('pk', flat=True).first()
+        periods = OwnershipPeriod.objects.filter(product_instance_id=instance_id)
+        containing = periods.filter(valid_from__lte=date).order_by('-valid_from').first()
+        if containing and containing.organization_id == organization_id:
+            return
+        following = periods.filter(valid_from__gt=date).order_by('valid_from').first()
+
+        if containing and containing.valid_from == date:
+            # Simultaneous events: the later write wins the instant
+            containing.organization_id = organization_id
+            containing.event = event
+            containing.save(update_fields=['organization', 'event'])
+            return
+        if containing:
+            containing.valid_to = date
+            containing.save(update_fields=['valid_to'])
+        if following and following.organization_id == organization_id:
+            following.valid_from = date
+            following.event = event
+            following.save(update_fields=['valid_from', 'event'])
+            return
+        OwnershipPeriod.objects.create(
+            product_instance_id=instance_id,
+            organization_id=organization_id,
+            valid_from=date,
+            valid_to=following.valid_from if following else None,
+            event=event,
+        )
+
+
+def rebuild(instance_id):
+    """Recompute the ownership history of one instance from its events."""
+    events = (
+        SupplyChainEvent.objects
+        .filter(product_instance_id=instance_id)
+        .order_by('date', 'pk')
+        .only('pk', 'organization_id', 'date')
+    )
+    periods = []
+    for event in events:
+        if periods and periods[-1].organization_id == event.organization_id:
+            continue
+        if periods and periods[-1].valid_from == event.date:
+            periods[-1].organization_id = event.organization_id
+            periods[-1].event = event
+            continue
+        if periods:
+            periods[-1].valid_to = event.date
+        periods.append(OwnershipPeriod(
+            product_instance_id=instance_id,
+            organization_id=event.organization_id,
+            valid_from=event.date,
+            event=event,
+        ))
+    with transaction.atomic():
+        OwnershipPeriod.objects.filter(product_instance_id=instance_id).delete()
+        OwnershipPeriod.objects.bulk_create(periods)
+    return periods
+
+
+def append_transfer(instance_ids, organization_id, date, events):
+    """
+    Set-based version of ``apply_event`` for bulk transfers.
+
+    ``events`` are the freshly inserted events (one per instance). Instances
+    whose history already extends past ``date`` are rebuilt individually;
+    for all others the open period is closed and a new one opened with two
+    statements.
+    """
+    backdated = set(
+        SupplyChainEvent.objects
+        .filter(product_instance_id__in=instance_ids, date__gt=date)
+        .values_list('product_instance_id', flat=True)
+        .distinct()
+    )
+    current = [pk for pk in instance_ids if pk not in backdated]
+    already_held = set(
+        OwnershipPeriod.objects
+        .filter(product_instance_id__in=current, valid_to__isnull=True, organization_id=organization_id)
+        .values_list('product_instance_id', flat=True)
+    )
+    OwnershipPeriod.objects.filter(
+        product_instance_id__in=current, valid_to__isnull=True
+    ).exclude(organization_id=organization_id).update(valid_to=date)
+    events_by_instance = {event.product_instance_id: event for event in events}
+    OwnershipPeriod.objects.bulk_create([
+        OwnershipPeriod(
+            product_instance_id=pk,
+            organization_id=organization_id,
+            valid_from=date,
+            event=events_by_instance.get(pk),
+        )
+        for pk in current if pk not in already_held
+    ])
+    for pk in backdated:
+        rebuild(pk)
+
+
+def timeline(instance, before=None, before_id=None, limit=50):
+    """
+    Return up to ``limit`` events of ``instance`` newest first.
+
+    Pages are keyed on ``(date, id)`` since several events can share a date:
+    only events older than ``before``, or at ``before`` with an id below
+    ``before_id``, are returned.
+    """
+    events = (
+        SupplyChainEvent.objects
+        .filter(product_instance=instance)
+        .select_related('organization', 'product_instance')
+        .order_by('-date', '-pk')
+    )
+    if before is not None:
+        if before_id is not None:
+            events = events.filter(Q(date__lt=before) | Q(date=before, pk__lt=before_id))
+        else:
+            events = events.filter(date__lt=before)
+    return list(events[:limit])
+
+
+def state_at(instance, at):
+    """
+    Return ``(ownership_period, latest_event)`` for ``instance`` as of ``at``.
+
+    Both are single index probes; either may be ``None``. Of events at the
+    same time the later one wins, as in ``apply_event`` and ``rebuild``.
+    """
+    period = (
+        OwnershipPeriod.objects
+        .filter(product_instance=instance, valid_from__lte=at)
+        .select_related('organization')
+        .order_by('-valid_from', '-pk')
+        .first()
+    )
+    event = (
+        SupplyChainEvent.objects
+        .filter(product_instance=instance, date__lte=at)
+        .select_related('organization', 'product_instance')
+        .order_by('-date', '-pk')
+        .first()
+    )
+    return period, event
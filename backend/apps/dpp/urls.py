@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 
@@ -8,14 +8,29 @@ router.register(r'categories', views.ProductCategoryViewSet)
 router.register(r'materials', views.MaterialViewSet)
 router.register(r'certificates', views.CertificateViewSet)
 router.register(r'products', views.ProductViewSet)
+router.register(r'components', views.ProductComponentViewSet)
 router.register(r'instances', views.ProductInstanceViewSet)
 router.register(r'events', views.SupplyChainEventViewSet)
 router.register(r'repairs', views.RepairRecordViewSet)
 router.register(r'recycling', views.RecyclingInstructionViewSet)
 router.register(r'passports', views.ProductPassportViewSet)
+router.register(r'recalls', views.RecallViewSet)
+router.register(r'serial-series', views.SerialSeriesViewSet)
+router.register(r'webhooks', views.WebhookSubscriptionViewSet)
 
 urlpatterns = [
+    # Before the router, whose events/<pk>/ route would match them
+    path('events/stream/', views.EventStreamView.as_view(), name='event-stream'),
+    path('events/stream/ticket/', views.EventTicketView.as_view(), name='event-stream-ticket'),
     path('', include(router.urls)),
     path('product-passport/<str:serial_number>/', views.ProductPassportView.as_view(), name='product-passport-detail'),
+    path('product-scan-batch/', views.BatchProductScanView.as_view(), name='product-scan-batch'),
     path('product-scan/<str:serial_number>/', views.ProductScanView.as_view(), name='product-scan'),
+    path('analytics/products/<int:product_id>/scans/', views.ProductScanAnalyticsView.as_view(), name='product-scan-analytics'),
+    path('analytics/serials/<str:serial_number>/scans/', views.SerialScanAnalyticsView.as_view(), name='serial-scan-analytics'),
+    re_path(r'^gs1/(?P<path>.+?)/?$', views.GS1ResolverView.as_view(), name='gs1-resolver'),
+    path('changes/', views.ChangeFeedView.as_view(), name='change-feed'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('autocomplete/<str:kind>/', views.AutocompleteView.as_view(), name='autocomplete'),
+    path('anomalies/serials/', views.SuspiciousSerialListView.as_view(), name='suspicious-serials'),
 ] 
\ No newline at end of file
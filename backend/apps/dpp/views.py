@@ -1,10 +1,22 @@
 from rest_framework import viewsets, views, status, permissions, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views import View
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
+from django.db import DataError, IntegrityError
+from django.db.models import Prefetch, Sum
+from django.utils import timezone
+from datetime import timedelta
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from . import analytics, anomaly, autocomplete, bom, changes, dedup, events, gs1, recalls, search, serials, timeline
+from .serial_filter import serial_filter
 from .models import (
     Organization,
     ProductCategory,
@@ -12,11 +24,17 @@ from .models import (
     Certificate,
     Product,
     ProductMaterial,
+    ProductComponent,
     ProductInstance,
     SupplyChainEvent,
     RepairRecord,
     RecyclingInstruction,
-    ProductPassport
+    ProductPassport,
+    ProductScanRollup,
+    SerialScanRollup,
+    Recall,
+    SerialSeries,
+    WebhookSubscription
 )
 from .serializers import (
     OrganizationSerializer,
@@ -25,12 +43,36 @@ from .serializers import (
     CertificateSerializer,
     ProductSerializer,
     ProductMaterialSerializer,
+    ProductComponentSerializer,
     ProductInstanceSerializer,
     SupplyChainEventSerializer,
     RepairRecordSerializer,
     RecyclingInstructionSerializer,
-    ProductPassportSerializer
+    ProductPassportSerializer,
+    ProductScanRollupSerializer,
+    SerialScanRollupSerializer,
+    ScanRangeSerializer,
+    TimelinePageSerializer,
+    InstanceStateQuerySerializer,
+    BatchScanRequestSerializer,
+    BulkTransferSerializer,
+    RecallSerializer,
+    RecallNotificationSerializer,
+    OwnershipPeriodSerializer,
+    SerialSeriesSerializer,
+    SerialAllocationSerializer,
+    ManufactureSerializer,
+    BulkCertificateSerializer,
+    BulkMaterialSerializer,
+    BulkPassportUpsertSerializer,
+    WebhookSubscriptionSerializer,
+    WebhookDeliverySerializer
 )
+from . import bulk
+from .bulk import transfer_instances
+
+
+UNCHANGED_HEADER = 'X-DPP-Unchanged'
 
 
 class TrackedModelViewSetMixin:
@@ -46,6 +88,13 @@ class TrackedModelViewSetMixin:
             serializer.save(updated_by=self.request.user)
         else:
             serializer.save()
+        report_unchanged(self, serializer)
+
+
+def report_unchanged(view, serializer):
+    """Tell the client that an update changed nothing, see ``SkipUnchangedMixin``."""
+    if getattr(serializer, 'unchanged', False):
+        view.headers[UNCHANGED_HEADER] = 'true'
 
 
 class ProductPassportViewSet(viewsets.ModelViewSet):
@@ -66,6 +115,10 @@ class ProductPassportViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'qr_code']
     ordering_fields = ['name', 'created_at', 'updated_at']
     
+    def perform_update(self, serializer):
+        serializer.save()
+        report_unchanged(self, serializer)
+    
     @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
     def list(self, request, *args, **kwargs):
         """List all product passports, with caching for performance."""
@@ -76,6 +129,20 @@ class ProductPassportViewSet(viewsets.ModelViewSet):
         """Retrieve a specific product passport, with caching for performance."""
         return super().retrieve(request, *args, **kwargs)
     
+    @action(detail=False, methods=['post'])
+    def bulk_upsert(self, request):
+        """
+        Create or update a batch of passports by QR code in one transaction,
+        skipping those whose content is unchanged. Used by shop connectors.
+        """
+        serializer = BulkPassportUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk.upsert_passports(serializer.validated_data['passports'])
+        counts = dict.fromkeys(('created', 'updated', 'unchanged'), 0)
+        for result in results:
+            counts[result['status']] += 1
+        return Response({'results': results, **counts})
+    
     @action(detail=False, methods=['post'])
     def delete_all(self, request):
         """Delete all product passports (GDPR compliance action)."""
@@ -195,6 +262,90 @@ class ProductViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
         product = self.get_object()
         serializer = ProductPassportSerializer(product)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def bom(self, request, pk=None):
+        """Get the full bill of materials tree of this product"""
+        product = self.get_object()
+        return Response(bom.tree(product))
+    
+    @action(detail=True, methods=['get'])
+    def rollup(self, request, pk=None):
+        """Get the weight, carbon footprint and materials rolled up over the bill of materials"""
+        product = self.get_object()
+        return Response(bom.rollup(product))
+    
+    @action(detail=True, methods=['get'])
+    def where_used(self, request, pk=None):
+        """Get every product that contains this product, directly or through sub-assemblies"""
+        product = self.get_object()
+        return Response(bom.where_used(product))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_certificates(self, request):
+        """
+        Link or unlink certificates for every product in a selection, in
+        chunked transactions.
+        """
+        serializer = BulkCertificateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operation = (bulk.link_certificates if serializer.validated_data['operation'] == BulkCertificateSerializer.LINK
+                     else bulk.unlink_certificates)
+        result = operation(
+            serializer.get_queryset(),
+            serializer.validated_data['certificates'],
+            chunk_size=getattr(settings, 'DPP_BULK_CHUNK_SIZE', 1000),
+        )
+        return Response(result)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_materials(self, request):
+        """
+        Upsert, replace or remove the material composition of every product
+        in a selection, in chunked transactions.
+        """
+        serializer = BulkMaterialSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        chunk_size = getattr(settings, 'DPP_BULK_CHUNK_SIZE', 1000)
+        if data['operation'] == BulkMaterialSerializer.UNLINK:
+            result = bulk.unlink_materials(serializer.get_queryset(), [item['material'] for item in data['materials']],
+                                           chunk_size=chunk_size)
+        else:
+            result = bulk.set_materials(serializer.get_queryset(), data['materials'],
+                                        replace=data['operation'] == BulkMaterialSerializer.REPLACE,
+                                        user=request.user, chunk_size=chunk_size)
+        return Response(result)
+    
+    @action(detail=True, methods=['get'])
+    def duplicates(self, request, pk=None):
+        """Get products that are likely duplicates of this product (optional ?threshold=0..1)"""
+        product = self.get_object()
+        try:
+            threshold = float(request.query_params.get('threshold', settings.DPP_DEDUP_THRESHOLD))
+        except ValueError:
+            return Response({"error": "threshold must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        matches = dedup.likely_duplicates(product, threshold=threshold)
+        products = Product.objects.select_related('manufacturer').in_bulk([pk for pk, _ in matches])
+        return Response([
+            {
+                "id": match_pk,
+                "name": products[match_pk].name,
+                "model_number": products[match_pk].model_number,
+                "manufacturer": products[match_pk].manufacturer_id,
+                "manufacturer_name": products[match_pk].manufacturer.name,
+                "similarity": round(score, 3),
+            }
+            for match_pk, score in matches if match_pk in products
+        ])
+
+
+class ProductComponentViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
+    queryset = ProductComponent.objects.select_related('parent', 'component')
+    serializer_class = ProductComponentSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['parent', 'component']
+    ordering_fields = ['created_at', 'quantity']
 
 
 class ProductInstanceViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
@@ -209,10 +360,54 @@ class ProductInstanceViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
     def supply_chain(self, request, pk=None):
         """Get supply chain events for this product instance"""
         instance = self.get_object()
-        events = SupplyChainEvent.objects.filter(product_instance=instance)
+        events = (SupplyChainEvent.objects.filter(product_instance=instance)
+                  .select_related('organization', 'product_instance').order_by('-date'))
         serializer = SupplyChainEventSerializer(events, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """
+        Get supply chain events newest first, one page at a time.
+        
+        Pass the ``next_before`` and ``next_before_id`` values of a page as
+        ``before`` and ``before_id`` to get the next one.
+        """
+        instance = self.get_object()
+        query = TimelinePageSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        limit = query.validated_data['limit']
+        events = timeline.timeline(instance, before=query.validated_data.get('before'),
+                                   before_id=query.validated_data.get('before_id'), limit=limit)
+        more = len(events) == limit
+        return Response({
+            "results": SupplyChainEventSerializer(events, many=True).data,
+            "next_before": events[-1].date if more else None,
+            "next_before_id": events[-1].pk if more else None,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def ownership_history(self, request, pk=None):
+        """Get the periods during which each organization held this instance"""
+        instance = self.get_object()
+        periods = instance.ownership_periods.select_related('organization')
+        serializer = OwnershipPeriodSerializer(periods, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def state(self, request, pk=None):
+        """Get the holder and latest supply chain event as of ``at`` (default: now)"""
+        instance = self.get_object()
+        query = InstanceStateQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        at = query.validated_data.get('at') or timezone.now()
+        period, event = timeline.state_at(instance, at)
+        return Response({
+            "at": at,
+            "holder": OwnershipPeriodSerializer(period).data if period else None,
+            "latest_event": SupplyChainEventSerializer(event).data if event else None,
+        })
+    
     @action(detail=True, methods=['get'])
     def repairs(self, request, pk=None):
         """Get repair records for this product instance"""
@@ -220,6 +415,34 @@ class ProductInstanceViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
         repairs = RepairRecord.objects.filter(product_instance=instance)
         serializer = RepairRecordSerializer(repairs, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_transfer(self, request):
+        """
+        Transfer ownership and/or mark as sold every instance in a selection.
+
+        Instances are updated with set-based UPDATEs in chunks, and the
+        optional supply chain events are bulk inserted in the same chunk
+        transaction. Chunks commit one by one: if one fails, the response
+        says how much was applied, and sending the request again with
+        ``after`` set to its ``resume_after`` transfers the rest.
+        """
+        serializer = BulkTransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = transfer_instances(
+                serializer.get_queryset(),
+                serializer.get_changes(),
+                event=serializer.get_event(),
+                user=request.user,
+                chunk_size=getattr(settings, 'DPP_BULK_CHUNK_SIZE', 1000),
+                after=serializer.validated_data.get('after'),
+            )
+        except bulk.BulkOperationError as exc:
+            return Response(dict(exc.progress, error=f"Transfer stopped part way: {exc}",
+                                 resume_after=exc.resume_after),
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(result)
 
 
 class SupplyChainEventViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
@@ -249,6 +472,154 @@ class RecyclingInstructionViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSe
     ordering_fields = ['recyclability_rating', 'created_at']
 
 
+def serial_not_found():
+    return Response(
+        {"error": "Product instance with this serial number not found."},
+        status=status.HTTP_404_NOT_FOUND
+    )
+
+
+class RecallViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
+    queryset = Recall.objects.select_related('manufacturer')
+    serializer_class = RecallSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['manufacturer', 'product', 'manufacturing_batch', 'status']
+    ordering_fields = ['created_at', 'notified_at']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(manufacturer_id=self.request.user.organization_id)
+        return queryset
+    
+    @action(detail=True, methods=['get'])
+    def affected(self, request, pk=None):
+        """
+        Stream every affected instance with its current owner and latest
+        supply chain event, as newline-delimited JSON.
+        """
+        recall = self.get_object()
+        response = StreamingHttpResponse(recalls.stream_locations(recall),
+                                         content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'inline; filename="recall-{recall.pk}.ndjson"'
+        return response
+    
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """Get the number of affected instances per current owner"""
+        recall = self.get_object()
+        owners = recalls.owner_summary(recall)
+        unassigned = owners.pop(None, 0)
+        return Response({
+            "total": sum(owners.values()) + unassigned,
+            "unassigned": unassigned,
+            "owners": [{"organization": org_id, "count": count} for org_id, count in owners.items()],
+        })
+    
+    @action(detail=True, methods=['post'])
+    def notify(self, request, pk=None):
+        """Notify every organization holding affected instances"""
+        recall = self.get_object()
+        recalls.notify(recall)
+        serializer = RecallNotificationSerializer(
+            recall.notifications.select_related('organization'), many=True
+        )
+        return Response(serializer.data)
+
+
+class SerialSeriesViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
+    queryset = SerialSeries.objects.select_related('manufacturer')
+    serializer_class = SerialSeriesSerializer
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['manufacturer']
+    search_fields = ['name', 'template']
+    ordering_fields = ['name', 'created_at']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(manufacturer_id=self.request.user.organization_id)
+        return queryset
+    
+    @action(detail=True, methods=['post'])
+    def allocate(self, request, pk=None):
+        """Reserve a block of serial numbers, e.g. for labels printed ahead of production"""
+        series = self.get_object()
+        serializer = SerialAllocationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        batch = serializer.validated_data.get('manufacturing_batch', '')
+        try:
+            serial_numbers = serials.allocate_serials(series, serializer.validated_data['count'], batch)
+        except serials.SerialAllocationError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"serial_numbers": serial_numbers}, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def manufacture(self, request, pk=None):
+        """Create N instances of a product with serial numbers from this series"""
+        series = self.get_object()
+        serializer = ManufactureSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            result = serials.manufacture(series, data['product'], data['count'],
+                                         batch=data.get('manufacturing_batch') or None, user=request.user)
+        except serials.SerialAllocationError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except (IntegrityError, DataError) as exc:
+            # Only possible when the template overlaps serials created elsewhere
+            return Response({"error": f"Could not create the instances: {exc}"}, status=status.HTTP_409_CONFLICT)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+class WebhookSubscriptionViewSet(TrackedModelViewSetMixin, viewsets.ModelViewSet):
+    """
+    Webhook endpoints of the user's organization. Requests carry
+    ``X-DPP-Timestamp`` and ``X-DPP-Signature`` (HMAC-SHA256 of
+    ``"<timestamp>.<body>"`` with the subscription's ``secret``).
+    """
+    queryset = WebhookSubscription.objects.select_related('organization')
+    serializer_class = WebhookSubscriptionSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['organization', 'is_active']
+    ordering_fields = ['created_at']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(organization_id=self.request.user.organization_id)
+        return queryset
+    
+    @action(detail=True, methods=['get'])
+    def deliveries(self, request, pk=None):
+        """Recent deliveries of this subscription, newest first"""
+        subscription = self.get_object()
+        page = self.paginate_queryset(subscription.deliveries.order_by('-created_at'))
+        return self.get_paginated_response(WebhookDeliverySerializer(page, many=True).data)
+
+
+def instance_passport_data(instance):
+    """Full passport of a product instance: product, instance, events and repairs"""
+    serializer = ProductPassportSerializer(instance.product)
+    
+    # Add instance-specific data
+    data = serializer.data
+    instance_serializer = ProductInstanceSerializer(instance)
+    data['specific_instance'] = instance_serializer.data
+    
+    # Add supply chain events
+    events = (SupplyChainEvent.objects.filter(product_instance=instance)
+              .select_related('organization', 'product_instance').order_by('-date'))
+    events_serializer = SupplyChainEventSerializer(events, many=True)
+    data['supply_chain_events'] = events_serializer.data
+    
+    # Add repair records
+    repairs = RepairRecord.objects.filter(product_instance=instance).order_by('-repair_date')
+    repairs_serializer = RepairRecordSerializer(repairs, many=True)
+    data['repair_records'] = repairs_serializer.data
+    return data
+
+
 class ProductPassportView(views.APIView):
     """
     View to get a product passport by serial number
@@ -256,27 +627,11 @@ class ProductPassportView(views.APIView):
     permission_classes = [permissions.AllowAny]
     
     def get(self, request, serial_number):
+        if not serial_filter.might_exist(serial_number):
+            return serial_not_found()
         try:
             instance = ProductInstance.objects.get(serial_number=serial_number)
-            product = instance.product
-            serializer = ProductPassportSerializer(product)
-            
-            # Add instance-specific data
-            data = serializer.data
-            instance_serializer = ProductInstanceSerializer(instance)
-            data['specific_instance'] = instance_serializer.data
-            
-            # Add supply chain events
-            events = SupplyChainEvent.objects.filter(product_instance=instance).order_by('-date')
-            events_serializer = SupplyChainEventSerializer(events, many=True)
-            data['supply_chain_events'] = events_serializer.data
-            
-            # Add repair records
-            repairs = RepairRecord.objects.filter(product_instance=instance).order_by('-repair_date')
-            repairs_serializer = RepairRecordSerializer(repairs, many=True)
-            data['repair_records'] = repairs_serializer.data
-            
-            return Response(data)
+            return Response(instance_passport_data(instance))
         except ProductInstance.DoesNotExist:
             return Response(
                 {"error": "Product instance with this serial number not found."},
@@ -291,6 +646,8 @@ class ProductScanView(views.APIView):
     permission_classes = [permissions.AllowAny]
     
     def get(self, request, serial_number):
+        if not serial_filter.might_exist(serial_number):
+            return serial_not_found()
         try:
             instance = ProductInstance.objects.get(serial_number=serial_number)
             product = instance.product
@@ -309,9 +666,304 @@ class ProductScanView(views.APIView):
                 "passport_url": request.build_absolute_uri(f"/api/dpp/product-passport/{serial_number}/")
             }
             
+            analytics.record_scan(instance, request)
+            anomaly.observe_scan(instance.serial_number, request)
             return Response(data)
         except ProductInstance.DoesNotExist:
             return Response(
                 {"error": "Product instance with this serial number not found."},
                 status=status.HTTP_404_NOT_FOUND
-            ) 
\ No newline at end of file
+            ) 
+
+
+class BatchProductScanView(views.APIView):
+    """
+    Resolve many serial numbers at once, e.g. a pallet at a recycling facility.
+
+    Whatever the batch size, this runs two queries: the instances with
+    their products and manufacturers, then the product materials and their
+    materials. Product data is returned once per product and referenced from
+    the per-serial results.
+    """
+    def post(self, request):
+        serializer = BatchScanRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serial_numbers = list(dict.fromkeys(serializer.validated_data['serial_numbers']))
+
+        instances = (
+            ProductInstance.objects
+            .filter(serial_number__in=serial_numbers)
+            .select_related('product__manufacturer')
+            .prefetch_related(Prefetch(
+                'product__product_materials',
+                queryset=ProductMaterial.objects.select_related('material'),
+            ))
+        )
+
+        results = {}
+        products = {}
+        for instance in instances:
+            product = instance.product
+            if product.pk not in products:
+                materials = product.product_materials.all()
+                products[product.pk] = {
+                    "product_name": product.name,
+                    "manufacturer": product.manufacturer.name,
+                    "model_number": product.model_number,
+                    "manufacturing_date": product.manufacturing_date,
+                    "is_hazardous": product.is_hazardous,
+                    "is_recyclable": any(m.material.is_recyclable for m in materials),
+                    "materials": [m.material.name for m in materials],
+                }
+            results[instance.serial_number] = {
+                "product": product.pk,
+                "manufacturing_batch": instance.manufacturing_batch,
+                "is_sold": instance.is_sold,
+                "passport_url": request.build_absolute_uri(
+                    f"/api/dpp/product-passport/{instance.serial_number}/"
+                ),
+            }
+
+        return Response({
+            "results": results,
+            "products": products,
+            "not_found": [serial for serial in serial_numbers if serial not in results],
+        })
+
+
+class ScanAnalyticsMixin:
+    """
+    Shared helpers for reading the hourly scan rollups
+    """
+    default_range = timedelta(days=7)
+
+    def get_range(self, request):
+        serializer = ScanRangeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        until = serializer.validated_data.get('until') or timezone.now()
+        since = serializer.validated_data.get('since') or until - self.default_range
+        return since, until
+
+    def build_response(self, rollups, serializer_class, **extra):
+        totals = rollups.aggregate(total_scans=Sum('scan_count'))
+        data = dict(extra)
+        data['total_scans'] = totals['total_scans'] or 0
+        data['series'] = serializer_class(rollups, many=True).data
+        return Response(data)
+
+
+class ProductScanAnalyticsView(ScanAnalyticsMixin, views.APIView):
+    """
+    Hourly scan counts and unique-visitor estimates for a product.
+
+    Served from the rollup tables, the current hour is only visible once the
+    ``flush_scan_analytics`` job has run.
+    """
+    def get(self, request, product_id):
+        product = get_object_or_404(Product, pk=product_id)
+        since, until = self.get_range(request)
+        rollups = ProductScanRollup.objects.filter(product=product, hour__gte=since, hour__lt=until)
+        return self.build_response(rollups, ProductScanRollupSerializer,
+                                   product=product.pk, since=since, until=until)
+
+
+class SerialScanAnalyticsView(ScanAnalyticsMixin, views.APIView):
+    """
+    Hourly scan counts and unique-visitor estimates for a single serial number.
+    """
+    def get(self, request, serial_number):
+        instance = get_object_or_404(ProductInstance, serial_number=serial_number)
+        since, until = self.get_range(request)
+        rollups = SerialScanRollup.objects.filter(product_instance=instance, hour__gte=since, hour__lt=until)
+        return self.build_response(rollups, SerialScanRollupSerializer,
+                                   serial_number=instance.serial_number, since=since, until=until)
+
+
+class SuspiciousSerialListView(views.APIView):
+    """
+    Serial numbers recently flagged by the streaming scan anomaly detector.
+
+    Flags from every worker are read from Redis; if Redis is unavailable the
+    flags seen by the worker serving the request are returned instead.
+    """
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError:
+            limit = 100
+        try:
+            flags = anomaly.get_flagged_serials(limit=limit)
+            source = 'cluster'
+        except anomaly.RedisError:
+            flags = anomaly.get_detector().recent_flags()[:limit]
+            source = 'local'
+        return Response({'source': source, 'count': len(flags), 'results': flags})
+
+
+class AutocompleteView(views.APIView):
+    """
+    Type-ahead suggestions for product, material and organization names,
+    served from the Redis prefix index.
+    """
+    
+    def get(self, request, kind):
+        if kind not in autocomplete.INDEXES:
+            return Response({"error": f"Unknown autocomplete type '{kind}'."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        query = request.query_params.get('q', '')
+        return Response({"results": autocomplete.suggest(kind, query, limit)})
+
+
+class ChangeFeedView(views.APIView):
+    """
+    Changes to every resource since ``cursor``, oldest first, including
+    deletions. Start without a cursor, then pass the returned ``cursor`` on
+    every call; ``has_more`` means the next page is ready immediately.
+    ``resource`` takes a comma-separated list of resource names.
+    """
+    
+    def get(self, request):
+        resources = [r for r in request.query_params.get('resource', '').split(',') if r]
+        unknown = set(resources) - set(changes.DETAIL_ROUTES)
+        if unknown:
+            return Response({"error": f"Unknown resource: {', '.join(sorted(unknown))}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 500)), 1), settings.DPP_CHANGES_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = changes.feed(request.query_params.get('cursor'), resources, limit)
+        except changes.ChangeFeedError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+
+class EventTicketView(views.APIView):
+    """
+    Issue a short-lived, single-use ticket for opening the event stream.
+    """
+    
+    def post(self, request):
+        try:
+            ticket = events.issue_ticket(request.user)
+        except events.RedisError:
+            return Response({"error": "Live events are unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"ticket": ticket, "expires_in": settings.DPP_EVENTS_TICKET_TIMEOUT})
+
+
+class EventStreamView(View):
+    """
+    Server-Sent Events stream of product, instance and passport changes
+    visible to the user's organization.
+    
+    ``EventSource`` cannot send headers, so it authenticates with
+    ``?ticket=`` from ``EventTicketView``; session authentication works too.
+    Needs the ASGI server, where an idle connection does not hold a worker
+    thread.
+    """
+    
+    async def get(self, request):
+        user = await sync_to_async(self.authenticate)(request)
+        if user is None:
+            return JsonResponse({"error": "Authentication credentials were not provided or are invalid."},
+                                status=status.HTTP_401_UNAUTHORIZED)
+        response = StreamingHttpResponse(events.stream(user.organization_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def authenticate(self, request):
+        ticket = request.GET.get('ticket')
+        if not ticket:
+            user = request.user
+            return user if user.is_authenticated and user.is_active else None
+        try:
+            user_id = events.redeem_ticket(ticket)
+        except events.RedisError:
+            return None
+        if user_id is None:
+            return None
+        return get_user_model().objects.filter(pk=user_id, is_active=True).first()
+
+
+class SearchView(views.APIView):
+    """
+    Search products, serial numbers, repairs, certificates and organizations
+    at once. Returns ranked hits and facet counts by type, manufacturer and
+    category; ``type``, ``manufacturer`` and ``category`` narrow both.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        doc_type = request.query_params.get('type') or None
+        if doc_type and doc_type not in search.SOURCES:
+            return Response({"error": f"Unknown type '{doc_type}'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            manufacturer = int(request.query_params['manufacturer']) if request.query_params.get('manufacturer') else None
+            category = int(request.query_params['category']) if request.query_params.get('category') else None
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({"error": "manufacturer, category, limit and offset must be integers."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(search.search(query, doc_type=doc_type, manufacturer=manufacturer,
+                                      category=category, limit=limit, offset=offset))
+
+
+class GS1ResolverView(views.APIView):
+    """
+    GS1 Digital Link resolver, e.g. ``/01/09506000134352/21/ABC123``.
+    
+    Browsers are redirected to the passport page; API clients (and
+    ``?format=json``) get the passport itself. A GTIN without a serial number
+    resolves to the product passport.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, path):
+        query = request.META.get('QUERY_STRING', '')
+        try:
+            link = gs1.parse(f"{path}?{query}" if query else path)
+        except gs1.GS1Error as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        product = gs1.resolve_product(link['gtin'])
+        if product is None:
+            return Response({"error": "No product with this GTIN."}, status=status.HTTP_404_NOT_FOUND)
+        
+        serial = link.get('serial')
+        instance = None
+        if serial:
+            if not serial_filter.might_exist(serial):
+                return serial_not_found()
+            instance = ProductInstance.objects.filter(serial_number=serial, product=product).first()
+            if instance is None:
+                return serial_not_found()
+            analytics.record_scan(instance, request)
+            anomaly.observe_scan(instance.serial_number, request)
+        
+        if self._wants_html(request):
+            target = {'gtin': link['gtin'], 'product': product.pk}
+            if instance:
+                return HttpResponseRedirect(settings.DPP_GS1_INSTANCE_URL.format(
+                    serial=quote(instance.serial_number, safe=''), **target))
+            return HttpResponseRedirect(settings.DPP_GS1_PRODUCT_URL.format(**target))
+        if instance:
+            instance.product = product
+            return Response(instance_passport_data(instance))
+        return Response(ProductPassportSerializer(product).data)
+    
+    @staticmethod
+    def _wants_html(request):
+        if request.query_params.get('format') == 'json':
+            return False
+        accept = request.META.get('HTTP_ACCEPT', '')
+        return 'text/html' in accept
@@ -0,0 +1,251 @@
+"""
+Outbound webhooks.
+
+Changes are written to the ``WebhookDelivery`` outbox in the transaction
+that makes them, one row per interested subscription, so a notification
+exists exactly when its change committed and API writes never wait for a
+subscriber. The ``deliver_webhooks`` worker claims due rows with
+``FOR UPDATE SKIP LOCKED`` (several workers can run side by side), sends
+each subscription's rows as batched, HMAC signed POSTs over a pooled async
+HTTP client, and reschedules failures with exponential back-off.
+
+Each subscription's notifications go out in the order they were written.
+A round only claims a subscription whose oldest pending row is due, takes
+its rows oldest first, and locks the subscription while claiming, so no two
+workers deliver for one subscription at once and nothing overtakes a row
+waiting for a retry. A failure stops the rest of the subscription's rows
+until that retry; other subscriptions are delivered concurrently, so one
+slow endpoint only delays itself. A row given up on after
+``DPP_WEBHOOK_MAX_ATTEMPTS`` no longer holds back the ones after it.
+
+Subscription URLs must resolve to public addresses only, so webhooks cannot
+be pointed at internal services. The check runs when a subscription is saved
+and again before every delivery, and requests connect to the address that
+was checked, so a DNS change in between cannot redirect them.
+"""
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import socket
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from apps.core.outbox import Outbox
+from .models import WebhookDelivery, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ('passport', 'product', 'instance', 'event')
+# Organization key of changes every subscriber (and signed-in user) may see
+EVERYONE = '*'
+
+# Subscriptions whose oldest pending row is due, locked against other
+# workers; their pending rows are leased oldest first, the limit spread
+# across subscriptions. The leased head row keeps the subscription out of
+# other rounds until it is delivered or the lease runs out.
+CLAIM_SQL = """
+WITH claimable AS (
+    SELECT s.id FROM {subscription} s
+    WHERE (
+        SELECT d.next_attempt_at FROM {table} d
+        WHERE d.subscription_id = s.id AND d.delivered_at IS NULL AND d.failed_at IS NULL
+        ORDER BY d.id
+        LIMIT 1
+    ) <= %(now)s
+    FOR UPDATE OF s SKIP LOCKED
+)
+UPDATE {table} SET attempts = attempts + 1, next_attempt_at = %(lease_until)s
+WHERE id IN (
+    SELECT id FROM (
+        SELECT d.id, row_number() OVER (PARTITION BY d.subscription_id ORDER BY d.id) AS position
+        FROM {table} d JOIN claimable c ON c.id = d.subscription_id
+        WHERE d.delivered_at IS NULL AND d.failed_at IS NULL
+    ) pending
+    ORDER BY position, id
+    LIMIT %(limit)s
+)
+RETURNING id
+"""
+
+
+queue = Outbox(WebhookDelivery, 'delivered_at', 'DPP_WEBHOOK', claim_sql=CLAIM_SQL,
+               tables={'subscription': WebhookSubscription})
+
+
+class UnsafeURLError(ValueError):
+    """Raised for webhook URLs that are not http(s) or reach non-public addresses."""
+
+
+def enqueue(resource, ids, action, organizations):
+    """
+    Write outbox rows for every active subscription of ``organizations``
+    (``EVERYONE`` for all) that wants ``resource``. Must run inside the
+    transaction making the change.
+    """
+    if resource not in RESOURCES:
+        return 0
+    organizations = [str(org) for org in organizations if org is not None]
+    if not organizations:
+        return 0
+    subscriptions = WebhookSubscription.objects.filter(is_active=True)
+    if EVERYONE not in organizations:
+        subscriptions = subscriptions.filter(organization_id__in=organizations)
+    now = timezone.now()
+    payload = {'resource': resource, 'ids': list(ids), 'action': action, 'occurred_at': now.isoformat()}
+    rows = [
+        WebhookDelivery(subscription=subscription, payload=payload, next_attempt_at=now)
+        for subscription in subscriptions.only('pk', 'resources')
+        if subscription.wants(resource)
+    ]
+    WebhookDelivery.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _check_address(address):
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if not settings.DPP_WEBHOOK_ALLOW_PRIVATE_URLS and (not ip.is_global or ip.is_multicast):
+        raise UnsafeURLError(f"{address} is not a public address.")
+    return ip
+
+
+def _split(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise UnsafeURLError("Webhook URLs must be absolute http or https URLs.")
+    return parts, parts.port or (443 if parts.scheme == 'https' else 80)
+
+
+def check_url(url):
+    """Raise ``UnsafeURLError`` unless ``url``'s host only resolves to public addresses."""
+    parts, port = _split(url)
+    try:
+        infos = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as exc:
+        raise UnsafeURLError(f"Cannot resolve {parts.hostname}.") from exc
+    for info in infos:
+        _check_address(info[4][0])
+
+
+async def pin(url):
+    """
+    Resolve and check ``url``'s host; return the URL with the host replaced
+    by the checked address, plus the headers and request extensions that
+    keep the Host header and TLS server name of the original.
+    """
+    parts, port = _split(url)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as exc:
+        raise UnsafeURLError(f"Cannot resolve {parts.hostname}.") from exc
+    addresses = [_check_address(info[4][0]) for info in infos]
+    ip = addresses[0]
+    host = f'[{ip}]' if ip.version == 6 else str(ip)
+    netloc = f'{host}:{parts.port}' if parts.port else host
+    host_header = f'{parts.hostname}:{parts.port}' if parts.port else parts.hostname
+    return urlunsplit(parts._replace(netloc=netloc)), {'Host': host_header}, {'sni_hostname': parts.hostname}
+
+
+def sign(secret, timestamp, body):
+    """Return the ``X-DPP-Signature`` header value for a request body."""
+    message = f"{timestamp}.".encode() + body
+    return 'sha256=' + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def claim(limit):
+    """
+    Lease up to ``limit`` due deliveries, see ``apps.core.outbox``, and
+    return them grouped by subscription.
+    """
+    groups = defaultdict(list)
+    for delivery in queue.claim(limit).select_related('subscription'):
+        groups[delivery.subscription].append(delivery)
+    return groups
+
+
+def complete(delivered, failed):
+    """Record delivered rows and reschedule or give up on ``failed`` ``(row, error)`` pairs."""
+    queue.complete(delivered, failed)
+
+
+def purge(before):
+    """Drop delivered and abandoned rows older than ``before``."""
+    return queue.purge(before)
+
+
+async def deliver_subscription(client, subscription, rows):
+    """POST ``rows`` in batches; returns ``(delivered, failed)``."""
+    size = settings.DPP_WEBHOOK_BATCH_SIZE
+    delivered, failed = [], []
+    try:
+        url, host_headers, extensions = await pin(subscription.url)
+    except (UnsafeURLError, OSError) as exc:
+        return delivered, [(row, f"{type(exc).__name__}: {exc}") for row in rows]
+    for start in range(0, len(rows), size):
+        batch = rows[start:start + size]
+        body = json.dumps(
+            {'deliveries': [dict(row.payload, delivery=row.pk) for row in batch]},
+            cls=DjangoJSONEncoder,
+        ).encode()
+        timestamp = str(int(time.time()))
+        try:
+            response = await client.post(url, content=body, extensions=extensions, headers={
+                **host_headers,
+                'Content-Type': 'application/json',
+                'X-DPP-Timestamp': timestamp,
+                'X-DPP-Signature': sign(subscription.secret, timestamp, body),
+            })
+            error = None if response.is_success else f"HTTP {response.status_code}"
+        except Exception as exc:  # noqa: BLE001 - any transport error is a failed attempt
+            error = f"{type(exc).__name__}: {exc}"
+        if error:
+            # Keep the subscription's order: the rest waits for the retry too
+            failed.extend((row, error) for row in rows[start:])
+            break
+        delivered.extend(batch)
+    return delivered, failed
+
+
+async def deliver_due(client, limit=None):
+    """Deliver one round of due rows; returns the number of rows claimed."""
+    groups = await sync_to_async(claim)(limit or settings.DPP_WEBHOOK_CLAIM_SIZE)
+    if not groups:
+        return 0
+    results = await asyncio.gather(*(
+        deliver_subscription(client, subscription, rows) for subscription, rows in groups.items()
+    ))
+    delivered = [row for ok, _ in results for row in ok]
+    failed = [item for _, bad in results for item in bad]
+    await sync_to_async(complete)(delivered, failed)
+    if failed:
+        logger.info("Webhook round: %d delivered, %d failed", len(delivered), len(failed))
+    return sum(len(rows) for rows in groups.values())
+
+
+def http_client():
+    return httpx.AsyncClient(
+        timeout=settings.DPP_WEBHOOK_TIMEOUT,
+        limits=httpx.Limits(max_connections=settings.DPP_WEBHOOK_CONNECTIONS,
+                            max_keepalive_connections=settings.DPP_WEBHOOK_CONNECTIONS),
+        follow_redirects=False,
+    )
+
+
+async def run(poll_interval=1.0, once=False):
+    """Deliver until cancelled (or one round with ``once``)."""
+    async with http_client() as client:
+        while True:
+            claimed = await deliver_due(client)
+            if once:
+                return claimed
+            if claimed < settings.DPP_WEBHOOK_CLAIM_SIZE:
+                await asyncio.sleep(poll_interval)
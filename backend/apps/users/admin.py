@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
-from .models import User, UserProfile, MagicLink
+from django.utils import timezone
+from .models import APIKey, OutgoingEmail, User, UserProfile, MagicLink
 
 
 class UserProfileInline(admin.StackedInline):
@@ -44,4 +45,33 @@ class MagicLinkAdmin(admin.ModelAdmin):
     def token_short(self, obj):
         """Display a shortened version of the token in the admin list"""
         return f"{obj.token[:8]}..."
-    token_short.short_description = 'Token' 
\ No newline at end of file
+    token_short.short_description = 'Token'
+
+
+@admin.register(APIKey)
+class APIKeyAdmin(admin.ModelAdmin):
+    list_display = ('name', 'prefix', 'organization', 'user', 'created_at', 'expires_at', 'revoked_at')
+    list_filter = ('organization', 'revoked_at')
+    search_fields = ('name', 'prefix', 'user__email')
+    readonly_fields = ('prefix', 'created_at')
+    actions = ['revoke']
+    
+    def has_add_permission(self, request):
+        # Keys are shown once on creation, which only the API can do
+        return False
+    
+    @admin.action(description='Revoke selected API keys')
+    def revoke(self, request, queryset):
+        for api_key in queryset.filter(revoked_at__isnull=True):
+            api_key.revoked_at = timezone.now()
+            api_key.save(update_fields=['revoked_at'])
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'created_at', 'attempts', 'next_attempt_at', 'sent_at', 'failed_at')
+    list_filter = ('sent_at', 'failed_at')
+    search_fields = ('subject', 'to')
+    # The body may hold a login link, and is cleared once sent
+    readonly_fields = ('body', 'created_at', 'sent_at', 'failed_at', 'last_error')
+    ordering = ('-created_at',)
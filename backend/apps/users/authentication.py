@@ -0,0 +1,277 @@
+"""
+API key authentication for machine clients.
+
+Clients send ``Authorization: Bearer dpp_<prefix>_<secret>``. Tokens without
+the ``dpp_`` prefix are left to the JWT authentication that follows.
+
+Verified keys are kept in a bounded, per-process LRU cache, so a request
+with a known key costs a hash and no database query. Revocations reach all
+processes over a Redis pub/sub channel that each process follows in a daemon
+thread. Keys are only cached while that subscription is up, and cached
+entries expire after ``API_KEY_CACHE_TTL`` seconds regardless, so a missed
+message cannot keep a revoked key working for long.
+
+JWT requests resolve their user through ``CachedJWTAuthentication``, which
+keeps the user's ``PRINCIPAL_FIELDS`` and the name of their organization in
+the shared cache for ``AUTH_USER_CACHE_TTL`` seconds. Secrets such as the
+password hash are never cached: each request gets a fresh instance built
+from the entry, and the fields left out are loaded on first access like
+deferred fields. Saving the user or saving or deleting their organization
+drops the entry, so an authenticated request normally costs one cache read
+instead of user and organization queries.
+"""
+import copy
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.core.redis_client import get_redis, RedisError, Subscription
+from apps.dpp.models import Organization
+from . import blacklist
+from .models import APIKey, User
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'users:api-key-revocations'
+
+CachedKey = namedtuple('CachedKey', ['api_key', 'user', 'stale_at'])
+
+
+class KeyCache:
+    """
+    Thread-safe LRU cache of verified keys by prefix, emptied whenever the
+    revocation subscription is not connected.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.listening = False
+        # Bumped on every eviction, so a lookup racing a revocation is not cached
+        self.generation = 0
+        self.subscription = Subscription(CHANNEL, 'api-key-revocations', self.evict,
+                                         on_ready=self._connected, on_disconnect=self._disconnected)
+
+    def get(self, prefix):
+        with self.lock:
+            entry = self.entries.get(prefix)
+            if entry is None:
+                return None
+            if entry.stale_at <= time.monotonic():
+                del self.entries[prefix]
+                return None
+            self.entries.move_to_end(prefix)
+            return entry
+
+    def put(self, prefix, api_key, generation):
+        with self.lock:
+            if not self.listening or generation != self.generation:
+                return
+            self.entries[prefix] = CachedKey(api_key, api_key.user, time.monotonic() + settings.API_KEY_CACHE_TTL)
+            self.entries.move_to_end(prefix)
+            while len(self.entries) > settings.API_KEY_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def evict(self, prefix=None):
+        """Drop ``prefix``, or every entry if it is ``None``."""
+        with self.lock:
+            self.generation += 1
+            if prefix is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(prefix, None)
+
+    def start(self):
+        """Follow revocations from this process, once."""
+        self.subscription.start()
+
+    def _connected(self):
+        self.listening = True
+
+    def _disconnected(self):
+        # Revocations sent while disconnected are lost
+        self.listening = False
+        self.evict()
+
+
+key_cache = KeyCache()
+
+
+def revoke(prefixes):
+    """Evict keys from every process's cache once the transaction commits."""
+    prefixes = list(prefixes)
+    if not prefixes:
+        return
+
+    def send():
+        for prefix in prefixes:
+            key_cache.evict(prefix)
+        try:
+            client = get_redis()
+            for prefix in prefixes:
+                client.publish(CHANNEL, prefix)
+        except RedisError:
+            logger.warning("Could not publish API key revocation", exc_info=True)
+
+    transaction.on_commit(send)
+
+
+class APIKeyAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticate ``Bearer`` API keys as the key's user; ``request.auth`` is
+    the ``APIKey``.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            return None
+        prefix = APIKey.split(key)
+        if prefix is None:
+            return None
+        return self.authenticate_key(prefix, key)
+
+    def authenticate_key(self, prefix, key):
+        key_cache.start()
+        entry = key_cache.get(prefix)
+        if entry is None:
+            generation = key_cache.generation
+            api_key = APIKey.objects.select_related('user__organization').filter(prefix=prefix).first()
+            if api_key is None or not api_key.is_valid():
+                raise exceptions.AuthenticationFailed('Invalid API key.')
+            key_cache.put(prefix, api_key, generation)
+            entry = CachedKey(api_key, api_key.user, None)
+
+        api_key, user = entry.api_key, entry.user
+        if not hmac.compare_digest(api_key.hashed_key, APIKey.hash(key)):
+            raise exceptions.AuthenticationFailed('Invalid API key.')
+        if api_key.expires_at is not None and api_key.expires_at <= timezone.now():
+            raise exceptions.AuthenticationFailed('API key has expired.')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User is inactive.')
+        # A key acts within its organization, which the user may have left
+        if user.organization_id != api_key.organization_id:
+            raise exceptions.AuthenticationFailed('API key does not belong to the user\'s organization.')
+
+        # Cached instances are shared by every thread, each request gets copies
+        user = copy.deepcopy(user)
+        api_key = copy.copy(api_key)
+        api_key.user = user
+        return user, api_key
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+# User fields kept in the cache; the rest, e.g. the password, are loaded when read
+PRINCIPAL_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser',
+    'is_verified', 'organization_id', 'phone', 'position', 'date_joined',
+)
+
+
+def principal_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def principal_entry(user):
+    """Return the cache entry of ``user``."""
+    organization = user.organization
+    return {
+        'user': {name: getattr(user, name) for name in PRINCIPAL_FIELDS},
+        'organization': None if organization is None else {'id': organization.pk, 'name': organization.name},
+    }
+
+
+def _from_values(model, db, values):
+    # from_db expects the loaded fields in model order
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(db, names, [values[name] for name in names])
+
+
+def principal_from_entry(entry):
+    """Build an unshared ``User`` from a cache entry, with uncached fields deferred."""
+    db = router.db_for_read(User)
+    user = _from_values(User, db, entry['user'])
+    if entry['organization'] is not None:
+        user.organization = _from_values(Organization, db, entry['organization'])
+    return user
+
+
+def invalidate_principals(user_ids):
+    """Drop cached users once the transaction commits."""
+    keys = [principal_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+
+    def delete():
+        try:
+            cache.delete_many(keys)
+        except RedisError:
+            logger.warning("Could not invalidate cached users", exc_info=True)
+
+    transaction.on_commit(delete)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that loads the user from the cache, see the
+    module docstring, and rejects blacklisted tokens.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        try:
+            revoked = blacklist.is_revoked(token)
+        except RedisError:
+            # Access tokens are short-lived; an outage must not log everyone out
+            logger.warning("Token blacklist unavailable", exc_info=True)
+            revoked = False
+        if revoked:
+            raise InvalidToken('Token is blacklisted')
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        key = principal_cache_key(user_id)
+        try:
+            entry = cache.get(key)
+        except RedisError:
+            logger.warning("User cache unavailable", exc_info=True)
+            entry = None
+        if entry is not None:
+            user = principal_from_entry(entry)
+        else:
+            user = User.objects.select_related('organization').filter(
+                **{api_settings.USER_ID_FIELD: user_id}
+            ).first()
+            if user is None:
+                raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+            try:
+                cache.set(key, principal_entry(user), settings.AUTH_USER_CACHE_TTL)
+            except RedisError:
+                logger.warning("Could not cache user", exc_info=True)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
@@ -0,0 +1,144 @@
+"""
+JWT blacklist kept in Redis.
+
+A revoked token is a ``auth:blacklist:jti:<jti>`` key that expires with the
+token. "Log out everywhere" stores the revocation time under
+``auth:blacklist:user:<id>`` for one refresh token lifetime; tokens of that
+user whose login was at or before it are rejected. Logins are stamped with
+the sub-second ``auth_time`` claim, which refreshed tokens inherit, because
+``iat`` has whole seconds and would reject a login right after the
+revocation.
+
+Nearly every token checked is not revoked, so each process keeps a Bloom
+filter of revoked jtis and user ids and only asks Redis when the filter
+matches. Revocations are published on a Redis channel that a daemon thread
+in every process follows; after (re)subscribing it rebuilds the filter from
+the keys in Redis. Until it is ready every check goes to Redis. The filter
+has one generation per refresh token lifetime, and the last two are kept,
+which covers every revocation whose key can still exist.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.core.redis_client import get_redis, RedisError, Subscription
+from apps.core.sketches import LocalBloomFilter
+
+KEY_PREFIX = 'auth:blacklist:'
+CHANNEL = 'auth:blacklist'
+LOGIN_CLAIM = 'auth_time'
+
+__all__ = ['is_revoked', 'revoke_token', 'revoke_user', 'stamp_login', 'RedisError']
+
+
+def _lifetime():
+    return api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+
+
+class RevocationFilter:
+    """
+    Process-local Bloom filters of revoked members (``jti:<jti>`` and
+    ``user:<id>``), fed by the revocation channel.
+    """
+
+    def __init__(self):
+        self.filters = {}
+        self.lock = threading.Lock()
+        self.ready = False
+        # Subscribed before the rebuild, so nothing revoked during the scan is missed
+        self.subscription = Subscription(CHANNEL, 'jwt-blacklist', self.add, on_connect=self._rebuild,
+                                         on_ready=self._ready, on_disconnect=self.reset)
+
+    def add(self, member):
+        window = int(time.time() // _lifetime())
+        with self.lock:
+            bloom = self.filters.get(window)
+            if bloom is None:
+                bloom = self.filters[window] = LocalBloomFilter.for_capacity(
+                    settings.AUTH_BLACKLIST_FILTER_CAPACITY, settings.AUTH_BLACKLIST_FILTER_ERROR_RATE
+                )
+                for old in [key for key in self.filters if key < window - 1]:
+                    del self.filters[old]
+            bloom.add(member)
+
+    def might_contain(self, member):
+        """Return ``False`` only if ``member`` is definitely not revoked."""
+        if not self.ready:
+            return True
+        return any(member in bloom for bloom in list(self.filters.values()))
+
+    def reset(self):
+        with self.lock:
+            self.ready = False
+            self.filters = {}
+
+    def start(self):
+        self.subscription.start()
+
+    def _rebuild(self, redis):
+        for key in redis.scan_iter(match=KEY_PREFIX + '*', count=1000):
+            self.add(key.decode()[len(KEY_PREFIX):])
+
+    def _ready(self):
+        self.ready = True
+
+
+revocations = RevocationFilter()
+
+
+def _revoke(member, value, ttl, only_new=False):
+    redis = get_redis()
+    stored = redis.set(KEY_PREFIX + member, value, ex=max(int(math.ceil(ttl)), 1), nx=only_new)
+    if stored:
+        redis.publish(CHANNEL, member)
+        revocations.add(member)
+    return bool(stored)
+
+
+def revoke_token(token):
+    """
+    Blacklist ``token`` until it expires. Returns ``False`` if it already
+    was, which lets token rotation reject a second use of the same token.
+    Raises ``RedisError`` if the blacklist is unavailable.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    return _revoke(f'jti:{jti}', 1, token['exp'] - time.time(), only_new=True)
+
+
+def stamp_login(token):
+    """Record the login time on a newly issued ``token``."""
+    token[LOGIN_CLAIM] = time.time()
+
+
+def revoke_user(user_id):
+    """Revoke every token issued to ``user_id`` so far."""
+    _revoke(f'user:{user_id}', time.time(), _lifetime())
+
+
+def is_revoked(token):
+    """
+    Return whether ``token`` or all its user's tokens were revoked. Raises
+    ``RedisError`` if that has to be asked and Redis is unavailable.
+    """
+    revocations.start()
+    members = [f'jti:{token[api_settings.JTI_CLAIM]}']
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is not None:
+        members.append(f'user:{user_id}')
+    members = [member for member in members if revocations.might_contain(member)]
+    if not members:
+        return False
+
+    values = get_redis().mget([KEY_PREFIX + member for member in members])
+    for member, value in zip(members, values):
+        if value is None:
+            continue
+        if member.startswith('jti:'):
+            return True
+        # Tokens issued before logins were stamped only have whole seconds
+        if token.get(LOGIN_CLAIM, token.get('iat', 0)) <= float(value):
+            return True
+    return False
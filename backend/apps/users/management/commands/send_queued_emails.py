@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.users import outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued emails (runs until interrupted)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send one round of due emails and exit")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait when nothing is due (default: 1)")
+        parser.add_argument('--purge', action='store_true',
+                            help="Delete sent and abandoned emails older than EMAIL_OUTBOX_RETENTION_DAYS and exit")
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            removed = outbox.purge(timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS))
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} emails"))
+            return
+        try:
+            claimed = outbox.run(options['poll_interval'], once=options['once'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f"Processed {claimed} emails"))
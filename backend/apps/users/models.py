@@ -1,5 +1,9 @@
+import hashlib
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from apps.core.models import TimeStampedModel
 
@@ -77,4 +81,95 @@ class MagicLink(models.Model):
     def is_valid(self):
         """Check if the magic link is still valid"""
         from django.utils import timezone
-        return not self.is_used and self.expires_at > timezone.now() 
\ No newline at end of file
+        return not self.is_used and self.expires_at > timezone.now()
+
+
+class APIKey(models.Model):
+    """
+    Long-lived credential for machine clients such as shop connectors.
+
+    Keys look like ``dpp_<prefix>_<secret>``. Only the prefix, which
+    identifies the key, and a SHA-256 hash of the whole key are stored;
+    the key itself is shown once, when it is created. Requests made with a
+    key act as ``user`` within ``organization``.
+    """
+    PREFIX = 'dpp_'
+
+    name = models.CharField(_('name'), max_length=100)
+    prefix = models.CharField(_('prefix'), max_length=16, unique=True, editable=False)
+    hashed_key = models.CharField(_('hashed key'), max_length=64, editable=False)
+    organization = models.ForeignKey(
+        'dpp.Organization',
+        on_delete=models.CASCADE,
+        related_name='api_keys',
+        verbose_name=_('Organization')
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='api_keys',
+        verbose_name=_('user')
+    )
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    expires_at = models.DateTimeField(_('expires at'), blank=True, null=True)
+    revoked_at = models.DateTimeField(_('revoked at'), blank=True, null=True)
+    
+    class Meta:
+        verbose_name = _('API key')
+        verbose_name_plural = _('API keys')
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"{self.name} ({self.PREFIX}{self.prefix}_...)"
+    
+    @staticmethod
+    def hash(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+    
+    @classmethod
+    def generate(cls, **fields):
+        """Create a key; returns the saved instance and the key to hand out."""
+        prefix = secrets.token_hex(4)
+        key = f"{cls.PREFIX}{prefix}_{secrets.token_urlsafe(32)}"
+        api_key = cls.objects.create(prefix=prefix, hashed_key=cls.hash(key), **fields)
+        return api_key, key
+    
+    @classmethod
+    def split(cls, key):
+        """Return the prefix of a well-formed key, else ``None``."""
+        if not key.startswith(cls.PREFIX):
+            return None
+        prefix, _sep, secret = key[len(cls.PREFIX):].partition('_')
+        return prefix if prefix and secret else None
+    
+    def is_valid(self):
+        return self.revoked_at is None and (self.expires_at is None or self.expires_at > timezone.now())
+
+
+class OutgoingEmail(models.Model):
+    """
+    Outbox row: an email queued by a request and sent by the
+    ``send_queued_emails`` worker.
+    """
+    subject = models.CharField(_('subject'), max_length=255)
+    body = models.TextField(_('body'))
+    from_email = models.CharField(_('from'), max_length=255)
+    to = models.JSONField(_('to'))
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    next_attempt_at = models.DateTimeField(_('next attempt at'))
+    sent_at = models.DateTimeField(_('sent at'), blank=True, null=True)
+    failed_at = models.DateTimeField(_('given up at'), blank=True, null=True)
+    last_error = models.TextField(_('last error'), blank=True)
+    
+    class Meta:
+        verbose_name = _('outgoing email')
+        verbose_name_plural = _('outgoing emails')
+        indexes = [
+            # Only pending rows are ever scanned by the sender
+            models.Index(fields=['next_attempt_at'], name='users_email_pending_idx',
+                         condition=models.Q(sent_at__isnull=True, failed_at__isnull=True)),
+        ]
+        
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)}"
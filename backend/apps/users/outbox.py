@@ -0,0 +1,115 @@
+"""
+Email outbox.
+
+Requests do not talk to the mail relay: ``enqueue`` stores the message in the
+``OutgoingEmail`` table, in the caller's transaction, and the
+``send_queued_emails`` worker sends it. The worker claims due rows with
+``FOR UPDATE SKIP LOCKED`` (several workers can run side by side), sends a
+round of up to ``EMAIL_OUTBOX_BATCH_SIZE`` messages over one SMTP connection
+that stays open while there is mail to send, and reschedules failures with
+exponential back-off (see ``apps.core.outbox``). The body of a sent message
+is cleared, since it may hold a login link.
+"""
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from apps.core.outbox import Outbox
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+queue = Outbox(OutgoingEmail, 'sent_at', 'EMAIL_OUTBOX')
+
+
+def enqueue(subject, body, to, from_email=None):
+    """Queue an email; it is sent once the current transaction commits."""
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        next_attempt_at=timezone.now(),
+    )
+
+
+def enqueue_many(messages):
+    """
+    Queue ``(subject, body, from_email, to)`` tuples, as taken by
+    ``send_mass_mail``, with one INSERT.
+    """
+    now = timezone.now()
+    return OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(subject=subject, body=body, from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+                      to=list(to), next_attempt_at=now)
+        for subject, body, from_email, to in messages
+    ])
+
+
+def claim(limit):
+    """Lease up to ``limit`` due emails, see ``apps.core.outbox``."""
+    return list(queue.claim(limit))
+
+
+def complete(sent, failed):
+    """Record sent rows, dropping their body, and reschedule ``failed`` ``(row, error)`` pairs."""
+    # Magic links and other secrets do not outlive the send
+    queue.complete(sent, failed, body='')
+
+
+def purge(before):
+    """Drop sent and abandoned emails older than ``before``."""
+    return queue.purge(before)
+
+
+def send_rows(mail_connection, rows):
+    """Send ``rows`` over ``mail_connection``; returns ``(sent, failed)``."""
+    sent, failed = [], []
+    for row in rows:
+        message = EmailMessage(row.subject, row.body, row.from_email, row.to, connection=mail_connection)
+        try:
+            # Opened here, the connection outlives send_messages(); no-op while open
+            mail_connection.open()
+            mail_connection.send_messages([message])
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as exc:
+            # Refused message, the connection is still usable
+            failed.append((row, f"{type(exc).__name__}: {exc}"))
+        except Exception as exc:  # noqa: BLE001 - any relay error is a failed attempt
+            # The connection may be broken; the next row reconnects
+            mail_connection.close()
+            failed.append((row, f"{type(exc).__name__}: {exc}"))
+        else:
+            sent.append(row)
+    return sent, failed
+
+
+def send_due(mail_connection, limit=None):
+    """Send one round of due emails; returns the number of rows claimed."""
+    rows = claim(limit or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not rows:
+        return 0
+    sent, failed = send_rows(mail_connection, rows)
+    complete(sent, failed)
+    if failed:
+        logger.info("Email round: %d sent, %d failed", len(sent), len(failed))
+    return len(rows)
+
+
+def run(poll_interval=1.0, once=False):
+    """Send until interrupted (or one round with ``once``)."""
+    mail_connection = get_connection(fail_silently=False)
+    try:
+        while True:
+            claimed = send_due(mail_connection)
+            if once:
+                return claimed
+            if claimed < settings.EMAIL_OUTBOX_BATCH_SIZE:
+                # Nothing more due: release the relay while idle
+                mail_connection.close()
+                time.sleep(poll_interval)
+    finally:
+        mail_connection.close()
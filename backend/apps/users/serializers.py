@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
-from .models import UserProfile
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import blacklist
+from .models import APIKey, UserProfile
 
 User = get_user_model()
 
@@ -65,4 +70,63 @@ class MagicLinkVerifySerializer(serializers.Serializer):
 
 
 class VerifyEmailSerializer(serializers.Serializer):
-    token = serializers.CharField(required=True) 
\ No newline at end of file
+    token = serializers.CharField(required=True)
+
+
+class APIKeySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = APIKey
+        fields = ('id', 'name', 'prefix', 'organization', 'user', 'created_at', 'expires_at', 'revoked_at')
+        read_only_fields = ('prefix', 'organization', 'user', 'created_at', 'revoked_at')
+
+
+class DPPTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Adds the user's organization and verification status to the token
+    claims, so clients need not look them up, and the login time used by
+    the blacklist. Access tokens issued on refresh copy the claims of the
+    refresh token.
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        blacklist.stamp_login(token)
+        token['organization_id'] = user.organization_id
+        token['is_verified'] = user.is_verified
+        return token
+
+
+class DPPTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh against the Redis blacklist. With ``BLACKLIST_AFTER_ROTATION``
+    the old refresh token is blacklisted atomically, so of two refreshes
+    with the same token only one succeeds.
+    """
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        try:
+            if blacklist.is_revoked(refresh):
+                raise TokenError('Token is blacklisted')
+            if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+                if not blacklist.revoke_token(refresh):
+                    raise TokenError('Token is blacklisted')
+        except blacklist.RedisError:
+            raise TokenError('Token blacklist unavailable, try again')
+        
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+    
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as e:
+            raise serializers.ValidationError(str(e))
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.dpp.models import Organization
+from .authentication import invalidate_principals, revoke
+from .models import APIKey, User
+
+
+@receiver([post_save, post_delete], sender=APIKey)
+def revoke_cached_key(sender, instance, **kwargs):
+    revoke([instance.prefix])
+
+
+@receiver(post_save, sender=User)
+def revoke_cached_user_keys(sender, instance, raw=False, **kwargs):
+    # Cached keys hold a copy of the user, e.g. of is_active and organization
+    if not raw:
+        revoke(instance.api_keys.values_list('prefix', flat=True))
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_principals([instance.pk])
+
+
+@receiver(post_save, sender=Organization)
+def invalidate_cached_members(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_principals(instance.users.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Organization)
+def invalidate_deleted_organization_members(sender, instance, **kwargs):
+    # Before the delete detaches the members with an UPDATE that sends no signals
+    invalidate_principals(list(instance.users.values_list('pk', flat=True)))
@@ -0,0 +1,110 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.dpp.models import Organization
+from apps.users import authentication
+from apps.users.authentication import APIKeyAuthentication, KeyCache
+from apps.users.models import APIKey
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user():
+    """Create a user belonging to an organization"""
+    organization = Organization.objects.create(name='Webshop GmbH')
+    return User.objects.create_user(email='shop@example.com', username='shop', password='pass12345!',
+                                    organization=organization)
+
+
+@pytest.fixture
+def api_key(user):
+    """Create an API key via the API and return the key"""
+    client = APIClient()
+    client.force_authenticate(user)
+    response = client.post(reverse('apikey-list'), {'name': 'WooCommerce'}, format='json')
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.data['key']
+
+
+@pytest.mark.django_db
+def test_key_is_stored_hashed(user, api_key):
+    """Test that only the prefix and a hash of the key are stored"""
+    stored = APIKey.objects.get()
+    assert stored.organization_id == user.organization_id
+    assert api_key.startswith(f'dpp_{stored.prefix}_')
+    assert stored.hashed_key == APIKey.hash(api_key) != api_key
+
+
+@pytest.mark.django_db
+def test_key_authenticates_until_revoked(user, api_key):
+    """Test authenticating with a key, a wrong secret and after revocation"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {api_key}')
+    response = client.get(reverse('apikey-list'))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['results'][0]['name'] == 'WooCommerce'
+
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {api_key[:-4]}xxxx')
+    assert client.get(reverse('apikey-list')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {api_key}')
+    client.delete(reverse('apikey-detail', args=[APIKey.objects.get().pk]))
+    assert APIKey.objects.get().revoked_at is not None
+    assert client.get(reverse('apikey-list')).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_key_stops_working_when_user_leaves_organization(user, api_key):
+    """Test that a key is rejected once its user belongs to another organization"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {api_key}')
+    assert client.get(reverse('apikey-list')).status_code == status.HTTP_200_OK
+
+    user.organization = Organization.objects.create(name='Competitor AG')
+    user.save()
+    assert client.get(reverse('apikey-list')).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_key_cache_is_bounded_and_evicts(settings):
+    """Test LRU bounding, revocation and that nothing is cached while not listening"""
+    settings.API_KEY_CACHE_SIZE = 2
+    cache = KeyCache()
+    keys = {prefix: APIKey(prefix=prefix, user=User(email=f'{prefix}@example.com')) for prefix in 'abc'}
+
+    cache.put('a', keys['a'], cache.generation)
+    assert cache.get('a') is None
+
+    cache.listening = True
+    for prefix in 'abc':
+        cache.put(prefix, keys[prefix], cache.generation)
+    assert cache.get('a') is None
+    assert cache.get('b').api_key is keys['b']
+
+    generation = cache.generation
+    cache.evict('b')
+    assert cache.get('b') is None
+    # A lookup that started before the revocation is not cached
+    cache.put('b', keys['b'], generation)
+    assert cache.get('b') is None
+
+
+def test_cached_key_hands_out_copies(monkeypatch):
+    """Test that requests authenticated from the cache do not share the cached instances"""
+    cache = KeyCache()
+    cache.listening = True
+    monkeypatch.setattr(cache, 'start', lambda: None)
+    monkeypatch.setattr(authentication, 'key_cache', cache)
+    key = 'dpp_abcdefgh_secret'
+    cached = APIKey(prefix='abcdefgh', hashed_key=APIKey.hash(key), organization_id=1,
+                    user=User(email='shop@example.com', organization_id=1))
+    cache.put('abcdefgh', cached, cache.generation)
+
+    user, api_key = APIKeyAuthentication().authenticate_key('abcdefgh', key)
+    user.first_name = 'Changed'
+
+    assert user is not cached.user and api_key is not cached and api_key.user is user
+    assert cached.user.first_name == ''
+    assert APIKeyAuthentication().authenticate_key('abcdefgh', key)[0].first_name == ''
@@ -0,0 +1,58 @@
+import smtplib
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import get_connection
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.users import outbox
+from apps.users.models import OutgoingEmail
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user():
+    """Create a user who can request magic links"""
+    return User.objects.create_user(email='magic@example.com', username='magic', password='pass12345!')
+
+
+@pytest.mark.django_db
+def test_magic_link_is_queued_not_sent(user, mailoutbox):
+    """Test that the request only queues the email and the worker sends it"""
+    response = APIClient().post('/api/auth/magic-link/request/', {'email': user.email}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert mailoutbox == []
+    queued = OutgoingEmail.objects.get()
+    assert queued.to == [user.email]
+    assert user.magic_links.get().token in queued.body
+
+    assert outbox.send_due(get_connection()) == 1
+    assert [message.to for message in mailoutbox] == [[user.email]]
+    queued.refresh_from_db()
+    assert queued.sent_at is not None
+    # The login link is not kept once delivered
+    assert queued.body == ''
+    assert outbox.send_due(get_connection()) == 0
+
+
+@pytest.mark.django_db
+def test_failed_send_is_retried_later(user, monkeypatch):
+    """Test that a relay failure reschedules the email with back-off"""
+    outbox.enqueue('Hello', 'Body', [user.email])
+    connection = get_connection()
+
+    def refuse(messages):
+        raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+    monkeypatch.setattr(connection, 'send_messages', refuse)
+    assert outbox.send_due(connection) == 1
+
+    queued = OutgoingEmail.objects.get()
+    assert queued.sent_at is None and queued.attempts == 1
+    assert 'SMTPServerDisconnected' in queued.last_error
+    # Not due again until the back-off has passed
+    assert outbox.send_due(get_connection()) == 0
+    assert len(mail.outbox) == 0
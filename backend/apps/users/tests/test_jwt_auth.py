@@ -0,0 +1,69 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.dpp.models import Organization
+from apps.users.authentication import principal_cache_key
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user(settings):
+    """Create a user in an organization, with an in-memory user cache"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    organization = Organization.objects.create(name='Cycle Works')
+    return User.objects.create_user(email='jwt@example.com', username='jwt', password='pass12345!',
+                                    organization=organization, is_verified=True)
+
+
+@pytest.fixture
+def api_client(user):
+    """Return an API client holding an access token obtained at login"""
+    client = APIClient()
+    response = client.post('/api/token/', {'email': 'jwt@example.com', 'password': 'pass12345!'}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+    client.login_response = response
+    return client
+
+
+@pytest.mark.django_db
+def test_login_returns_claims_and_user(api_client, user):
+    """Test that tokens carry organization and verification claims"""
+    response = api_client.login_response
+    token = AccessToken(response.data['access'])
+
+    assert token['organization_id'] == user.organization_id
+    assert token['is_verified'] is True
+    assert response.data['user']['organization_name'] == 'Cycle Works'
+
+
+@pytest.mark.django_db
+def test_authenticated_reads_are_served_from_cache(api_client, user, django_assert_num_queries,
+                                                   django_capture_on_commit_callbacks):
+    """Test that a cached user costs no user or organization queries and changes invalidate it"""
+    api_client.get('/api/users/me/')
+    # The profile is not cached
+    with django_assert_num_queries(1):
+        response = api_client.get('/api/users/me/')
+    assert response.data['organization_name'] == 'Cycle Works'
+    assert 'password' not in cache.get(principal_cache_key(user.pk))['user']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        organization = user.organization
+        organization.name = 'Cycle Works AG'
+        organization.save()
+    assert api_client.get('/api/users/me/').data['organization_name'] == 'Cycle Works AG'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        organization.delete()
+    assert api_client.get('/api/users/me/').data['organization_name'] is None
+
+    user.refresh_from_db()
+    with django_capture_on_commit_callbacks(execute=True):
+        user.is_active = False
+        user.save()
+    assert api_client.get('/api/users/me/').status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,78 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.test import APIClient
+from apps.core.redis_client import get_redis
+from apps.users import blacklist
+from apps.users.blacklist import RevocationFilter
+
+User = get_user_model()
+
+
+@pytest.fixture
+def tokens():
+    """Log a user in and return the token pair; blacklist keys are removed afterwards"""
+    user = User.objects.create_user(email='rotate@example.com', username='rotate', password='pass12345!')
+    response = APIClient().post('/api/token/', {'email': 'rotate@example.com', 'password': 'pass12345!'},
+                                format='json')
+    assert response.status_code == status.HTTP_200_OK
+    yield response.data
+    redis = get_redis()
+    for key in redis.scan_iter(match=f'{blacklist.KEY_PREFIX}*'):
+        redis.delete(key)
+
+
+def test_filter_answers_maybe_until_ready(settings):
+    """Test that an unsynchronized filter never claims a token is clean"""
+    settings.AUTH_BLACKLIST_FILTER_CAPACITY = 1000
+    revocations = RevocationFilter()
+    assert revocations.might_contain('jti:abc')
+
+    revocations.ready = True
+    revocations.add('jti:abc')
+    assert revocations.might_contain('jti:abc')
+    assert not revocations.might_contain('jti:def')
+    assert not revocations.might_contain('user:1')
+
+
+@pytest.mark.django_db
+def test_rotated_refresh_token_cannot_be_reused(tokens):
+    """Test that rotation blacklists the old refresh token"""
+    client = APIClient()
+    response = client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['refresh'] != tokens['refresh']
+
+    reuse = client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+    assert reuse.status_code == status.HTTP_401_UNAUTHORIZED
+
+    rotated = client.post('/api/token/refresh/', {'refresh': response.data['refresh']}, format='json')
+    assert rotated.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_revoke_all_rejects_existing_tokens(tokens):
+    """Test that logging out everywhere invalidates access and refresh tokens"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+    assert client.get('/api/users/me/').status_code == status.HTTP_200_OK
+
+    assert client.post('/api/auth/token/revoke-all/').status_code == status.HTTP_204_NO_CONTENT
+    assert client.get('/api/users/me/').status_code == status.HTTP_401_UNAUTHORIZED
+    refresh = APIClient().post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+    assert refresh.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_login_right_after_revoke_all_is_accepted(tokens):
+    """Test that a login in the same second as logging out everywhere is not rejected"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+    assert client.post('/api/auth/token/revoke-all/').status_code == status.HTTP_204_NO_CONTENT
+
+    response = APIClient().post('/api/token/', {'email': 'rotate@example.com', 'password': 'pass12345!'},
+                                format='json')
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+    assert client.get('/api/users/me/').status_code == status.HTTP_200_OK
+    refresh = APIClient().post('/api/token/refresh/', {'refresh': response.data['refresh']}, format='json')
+    assert refresh.status_code == status.HTTP_200_OK
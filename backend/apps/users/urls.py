@@ -1,16 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import UserViewSet, RegisterView, CustomTokenObtainPairView
+from .views import (
+    UserViewSet, RegisterView, CustomTokenObtainPairView, APIKeyViewSet, TokenRevokeView, TokenRevokeAllView
+)
 
 # Create a router for viewsets
 router = DefaultRouter()
+# Before the catch-all user routes
+router.register(r'api-keys', APIKeyViewSet, basename='apikey')
 router.register(r'', UserViewSet)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/revoke/', TokenRevokeView.as_view(), name='token_revoke'),
+    path('token/revoke-all/', TokenRevokeAllView.as_view(), name='token_revoke_all'),
     path('magic-link/request/', UserViewSet.as_view({'post': 'magic_link_request'}), name='magic_link_request'),
     path('magic-link/verify/', UserViewSet.as_view({'post': 'magic_link_verify'}), name='magic_link_verify'),
     path('', include(router.urls)),
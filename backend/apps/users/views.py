@@ -1,14 +1,17 @@
-from rest_framework import viewsets, permissions, status, generics
+from rest_framework import viewsets, permissions, status, generics, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.crypto import get_random_string
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
+import logging
 import uuid
 import datetime
 from .serializers import (
@@ -17,18 +20,23 @@ from .serializers import (
     ChangePasswordSerializer,
     UserProfileSerializer,
     MagicLinkRequestSerializer,
-    MagicLinkVerifySerializer
+    MagicLinkVerifySerializer,
+    APIKeySerializer,
+    DPPTokenObtainPairSerializer,
+    TokenRevokeSerializer
 )
-from .models import UserProfile, MagicLink
+from . import blacklist, outbox
+from .models import APIKey, UserProfile, MagicLink
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 class UserViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
     """
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('organization', 'profile')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -69,6 +77,12 @@ class UserViewSet(viewsets.ModelViewSet):
         # Set new password
         user.set_password(serializer.validated_data['new_password'])
         user.save()
+        
+        # Sign out sessions that used the old password
+        try:
+            blacklist.revoke_user(user.pk)
+        except blacklist.RedisError:
+            logger.warning("Could not revoke tokens after password change", exc_info=True)
         return Response({"status": "password set"}, status=status.HTTP_200_OK)
     
     @action(detail=False, methods=['put'], serializer_class=UserProfileSerializer)
@@ -109,31 +123,23 @@ class UserViewSet(viewsets.ModelViewSet):
         token = str(uuid.uuid4())
         expires_at = timezone.now() + datetime.timedelta(minutes=15)
         
-        magic_link, created = MagicLink.objects.update_or_create(
-            user=user,
-            defaults={
-                'token': token,
-                'expires_at': expires_at,
-                'is_used': False
-            }
-        )
-        
         # Create the magic link URL
         magic_link_url = f"{settings.FRONTEND_URL}/magic-login/{token}"
         
-        # Send email with magic link
+        # Queue the email with the magic link; send_queued_emails sends it
         subject = "Your Magic Login Link"
         message = f"Click the link below to log in:\n\n{magic_link_url}\n\nThis link will expire in 15 minutes."
-        from_email = settings.DEFAULT_FROM_EMAIL
-        recipient_list = [email]
         
-        try:
-            send_mail(subject, message, from_email, recipient_list)
-        except Exception as e:
-            return Response(
-                {"detail": "Failed to send magic link email."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        with transaction.atomic():
+            MagicLink.objects.update_or_create(
+                user=user,
+                defaults={
+                    'token': token,
+                    'expires_at': expires_at,
+                    'is_used': False
+                }
             )
+            outbox.enqueue(subject, message, [email])
         
         return Response(
             {"detail": "If an account with this email exists, a magic link has been sent."},
@@ -168,9 +174,8 @@ class UserViewSet(viewsets.ModelViewSet):
         # Get the user
         user = magic_link.user
         
-        # Generate JWT tokens using CustomTokenObtainPairView
-        from rest_framework_simplejwt.tokens import RefreshToken
-        refresh = RefreshToken.for_user(user)
+        # Generate JWT tokens with the same claims as CustomTokenObtainPairView
+        refresh = DPPTokenObtainPairSerializer.get_token(user)
         
         # Return tokens and user data
         return Response({
@@ -191,33 +196,28 @@ class RegisterView(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
         
         # Create magic link for email verification
         token = str(uuid.uuid4())
         expires_at = timezone.now() + datetime.timedelta(days=1)
         
-        MagicLink.objects.create(
-            user=user,
-            token=token,
-            expires_at=expires_at,
-            is_used=False,
-            is_registration=True
-        )
-        
         # Create verification link
         verification_url = f"{settings.FRONTEND_URL}/verify-email/{token}"
         
-        # Send email verification
+        # Queue the verification email along with the new account
         subject = "Verify Your Email Address"
         message = f"Welcome to the Digital Product Passport System! Please verify your email by clicking the link below:\n\n{verification_url}\n\nThis link will expire in 24 hours."
-        from_email = settings.DEFAULT_FROM_EMAIL
-        recipient_list = [user.email]
         
-        try:
-            send_mail(subject, message, from_email, recipient_list)
-        except Exception as e:
-            pass  # Still allow registration to succeed
+        with transaction.atomic():
+            user = serializer.save()
+            MagicLink.objects.create(
+                user=user,
+                token=token,
+                expires_at=expires_at,
+                is_used=False,
+                is_registration=True
+            )
+            outbox.enqueue(subject, message, [user.email])
         
         return Response(
             {"detail": "Registration successful. Please check your email to verify your account."},
@@ -229,13 +229,83 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     """
     Custom token view that also returns user information
     """
+    serializer_class = DPPTokenObtainPairSerializer
+    
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        
-        # If the login was successful, add user data to the response
-        if response.status_code == 200:
-            user = User.objects.get(email=request.data['email'])
-            user_data = UserSerializer(user).data
-            response.data['user'] = user_data
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
         
-        return response 
\ No newline at end of file
+        # The serializer has already loaded the authenticated user
+        return Response(dict(serializer.validated_data, user=UserSerializer(serializer.user).data))
+
+
+class APIKeyViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                    mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    API keys of the user's organization for machine clients.
+    
+    The key itself is only part of the response that creates it. Deleting a
+    key revokes it.
+    """
+    serializer_class = APIKeySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return APIKey.objects.filter(organization_id=self.request.user.organization_id)
+    
+    def create(self, request, *args, **kwargs):
+        if request.user.organization_id is None:
+            return Response({"error": "API keys belong to an organization; join one first."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        api_key, key = APIKey.generate(
+            organization_id=request.user.organization_id, user=request.user, **serializer.validated_data
+        )
+        return Response(dict(self.get_serializer(api_key).data, key=key), status=status.HTTP_201_CREATED)
+    
+    def perform_destroy(self, instance):
+        if instance.revoked_at is None:
+            instance.revoked_at = timezone.now()
+            instance.save(update_fields=['revoked_at'])
+
+
+class TokenRevokeView(generics.GenericAPIView):
+    """
+    Log out: blacklist a refresh token, and the access token of the request
+    if it was made with one.
+    """
+    serializer_class = TokenRevokeSerializer
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens = [serializer.validated_data['refresh']]
+        if isinstance(request.auth, AccessToken):
+            tokens.append(request.auth)
+        try:
+            for token in tokens:
+                blacklist.revoke_token(token)
+        except blacklist.RedisError:
+            return Response({"error": "Token blacklist unavailable, try again."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TokenRevokeAllView(generics.GenericAPIView):
+    """
+    Log out everywhere: revoke every token issued to the user so far.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, *args, **kwargs):
+        try:
+            blacklist.revoke_user(request.user.pk)
+        except blacklist.RedisError:
+            return Response({"error": "Token blacklist unavailable, try again."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -2,6 +2,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -35,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -57,6 +60,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.idempotency.IdempotencyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -167,7 +171,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Before JWT, which would reject API keys as malformed tokens
+        'apps.users.authentication.APIKeyAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
@@ -191,6 +197,9 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.users.serializers.DPPTokenObtainPairSerializer',
+    # Blacklists in Redis (apps.users.blacklist) instead of token_blacklist
+    'TOKEN_REFRESH_SERIALIZER': 'apps.users.serializers.DPPTokenRefreshSerializer',
 }
 
 # DRF Spectacular settings for Swagger documentation
@@ -221,9 +230,139 @@ CORS_ALLOWED_ORIGINS = [
     'http://127.0.0.1',
     'http://127.0.0.1:3000',
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'X-DPP-Unchanged']
 
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
 # Field Encryption settings for GDPR compliance
-FIELD_ENCRYPTION_KEY = os.environ.get('FIELD_ENCRYPTION_KEY', 'f164ec6bd6fbc4aef5647abc15199da0f9badcc1d2127bde2087ae0d794a9a0b') 
\ No newline at end of file
+FIELD_ENCRYPTION_KEY = os.environ.get('FIELD_ENCRYPTION_KEY', 'f164ec6bd6fbc4aef5647abc15199da0f9badcc1d2127bde2087ae0d794a9a0b') 
+
+# Scan analytics: counters are buffered in Redis and flushed into hourly
+# rollup tables by the flush_scan_analytics management command
+DPP_SCAN_ANALYTICS_ENABLED = os.environ.get('DPP_SCAN_ANALYTICS_ENABLED', 'True') == 'True'
+DPP_SCAN_ANALYTICS_FLUSH_GRACE = int(os.environ.get('DPP_SCAN_ANALYTICS_FLUSH_GRACE', 60))
+
+# Streaming detection of cloned serial numbers on the public scan path.
+# Thresholds apply per worker process within the sliding window.
+DPP_ANOMALY_DETECTION_ENABLED = os.environ.get('DPP_ANOMALY_DETECTION_ENABLED', 'True') == 'True'
+DPP_ANOMALY_WINDOW = int(os.environ.get('DPP_ANOMALY_WINDOW', 600))
+DPP_ANOMALY_MAX_SCANS = int(os.environ.get('DPP_ANOMALY_MAX_SCANS', 50))
+DPP_ANOMALY_MAX_LOCATIONS = int(os.environ.get('DPP_ANOMALY_MAX_LOCATIONS', 5))
+DPP_ANOMALY_RETENTION = int(os.environ.get('DPP_ANOMALY_RETENTION', 60 * 60 * 24))
+
+# Bloom filter of valid serial numbers, shared through Redis. Rebuild with
+# the rebuild_serial_filter management command after changing the capacity.
+DPP_SERIAL_FILTER_ENABLED = os.environ.get('DPP_SERIAL_FILTER_ENABLED', 'True') == 'True'
+DPP_SERIAL_FILTER_CAPACITY = int(os.environ.get('DPP_SERIAL_FILTER_CAPACITY', 10_000_000))
+DPP_SERIAL_FILTER_ERROR_RATE = float(os.environ.get('DPP_SERIAL_FILTER_ERROR_RATE', 0.01))
+DPP_SERIAL_FILTER_REFRESH = int(os.environ.get('DPP_SERIAL_FILTER_REFRESH', 300))
+
+# Upper bound on serial numbers per batch scan request
+DPP_BATCH_SCAN_MAX_SERIALS = int(os.environ.get('DPP_BATCH_SCAN_MAX_SERIALS', 5000))
+
+# Rows per transaction for bulk operations; keeps row locks short-lived
+DPP_BULK_CHUNK_SIZE = int(os.environ.get('DPP_BULK_CHUNK_SIZE', 1000))
+
+# Upper bound on serial numbers listed in one bulk operation's selection;
+# larger sets are selected with a serial range or filters
+DPP_BULK_MAX_SERIALS = int(os.environ.get('DPP_BULK_MAX_SERIALS', 10_000))
+
+# Upper bound on passports per bulk upsert request (shop connector batches)
+DPP_PASSPORT_UPSERT_MAX_BATCH = int(os.environ.get('DPP_PASSPORT_UPSERT_MAX_BATCH', 500))
+
+# Bill of materials: recursion limit for component trees and cache lifetime
+# of tree/rollup/where-used results (invalidated on every BOM change anyway)
+DPP_BOM_MAX_DEPTH = int(os.environ.get('DPP_BOM_MAX_DEPTH', 20))
+DPP_BOM_CACHE_TIMEOUT = int(os.environ.get('DPP_BOM_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Autocomplete: members kept per prefix sorted set by a build. Build or
+# refresh the popularity ranking, and trim, with the build_autocomplete
+# management command.
+DPP_AUTOCOMPLETE_MAX_PER_PREFIX = int(os.environ.get('DPP_AUTOCOMPLETE_MAX_PER_PREFIX', 200))
+
+# Unified search: text search configuration of the search index ('simple'
+# keeps serial numbers and mixed-language text intact), how many matching
+# documents are ranked (the first ones the index returns, not the best ones,
+# when a query matches more) and how many matches facet counts cover
+DPP_SEARCH_CONFIG = os.environ.get('DPP_SEARCH_CONFIG', 'simple')
+DPP_SEARCH_RANK_CANDIDATES = int(os.environ.get('DPP_SEARCH_RANK_CANDIDATES', 5000))
+DPP_SEARCH_FACET_LIMIT = int(os.environ.get('DPP_SEARCH_FACET_LIMIT', 10000))
+
+# Near-duplicate detection: MinHash signatures of BANDS x ROWS slots; pairs
+# at or above THRESHOLD estimated Jaccard similarity are reported
+DPP_DEDUP_BANDS = int(os.environ.get('DPP_DEDUP_BANDS', 20))
+DPP_DEDUP_ROWS = int(os.environ.get('DPP_DEDUP_ROWS', 6))
+DPP_DEDUP_THRESHOLD = float(os.environ.get('DPP_DEDUP_THRESHOLD', 0.6))
+
+# GS1 Digital Link resolver: lifetime of cached GTIN -> product lookups
+# (unknown GTINs are cached briefly) and where browsers are redirected. The
+# URLs may use {serial}, {gtin} and {product} (the product's id)
+DPP_GS1_CACHE_TIMEOUT = int(os.environ.get('DPP_GS1_CACHE_TIMEOUT', 60 * 60))
+DPP_GS1_NEGATIVE_CACHE_TIMEOUT = int(os.environ.get('DPP_GS1_NEGATIVE_CACHE_TIMEOUT', 60))
+DPP_GS1_INSTANCE_URL = os.environ.get('DPP_GS1_INSTANCE_URL', FRONTEND_URL + '/instances/{serial}')
+DPP_GS1_PRODUCT_URL = os.environ.get('DPP_GS1_PRODUCT_URL', FRONTEND_URL + '/products/{gtin}')
+
+# Upper bound on instances created (or serials allocated) per request. A
+# request writes its instances in one transaction, so bigger runs are split
+# into several requests
+DPP_MANUFACTURE_MAX_COUNT = int(os.environ.get('DPP_MANUFACTURE_MAX_COUNT', 50_000))
+
+# Change feed: largest page a client may request, and how long entries are
+# kept by the prune_change_log command (clients must sync at least this often)
+DPP_CHANGES_MAX_PAGE_SIZE = int(os.environ.get('DPP_CHANGES_MAX_PAGE_SIZE', 5000))
+DPP_CHANGES_RETENTION_DAYS = int(os.environ.get('DPP_CHANGES_RETENTION_DAYS', 90))
+
+# Server-Sent Events: seconds between keep-alive comments, reconnect delay
+# suggested to browsers, messages buffered per client before it is told to
+# resync, and seconds a stream ticket stays valid
+DPP_EVENTS_HEARTBEAT = int(os.environ.get('DPP_EVENTS_HEARTBEAT', 15))
+DPP_EVENTS_RETRY_MS = int(os.environ.get('DPP_EVENTS_RETRY_MS', 3000))
+DPP_EVENTS_QUEUE_SIZE = int(os.environ.get('DPP_EVENTS_QUEUE_SIZE', 100))
+DPP_EVENTS_TICKET_TIMEOUT = int(os.environ.get('DPP_EVENTS_TICKET_TIMEOUT', 30))
+
+# Outbound webhooks (deliver_webhooks worker): rows claimed per round, events
+# per POST, pooled connections, request timeout, how long a claimed row is
+# leased to a worker, and the retry schedule (seconds, doubling up to MAX)
+DPP_WEBHOOK_CLAIM_SIZE = int(os.environ.get('DPP_WEBHOOK_CLAIM_SIZE', 1000))
+DPP_WEBHOOK_BATCH_SIZE = int(os.environ.get('DPP_WEBHOOK_BATCH_SIZE', 100))
+DPP_WEBHOOK_CONNECTIONS = int(os.environ.get('DPP_WEBHOOK_CONNECTIONS', 50))
+DPP_WEBHOOK_TIMEOUT = float(os.environ.get('DPP_WEBHOOK_TIMEOUT', 10))
+DPP_WEBHOOK_LEASE = int(os.environ.get('DPP_WEBHOOK_LEASE', 120))
+DPP_WEBHOOK_BACKOFF_BASE = int(os.environ.get('DPP_WEBHOOK_BACKOFF_BASE', 30))
+DPP_WEBHOOK_BACKOFF_MAX = int(os.environ.get('DPP_WEBHOOK_BACKOFF_MAX', 60 * 60 * 6))
+DPP_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('DPP_WEBHOOK_MAX_ATTEMPTS', 15))
+DPP_WEBHOOK_RETENTION_DAYS = int(os.environ.get('DPP_WEBHOOK_RETENTION_DAYS', 14))
+# Allow webhook URLs on private, loopback and link-local addresses (local
+# development only: it lets subscribers reach internal services)
+DPP_WEBHOOK_ALLOW_PRIVATE_URLS = os.environ.get('DPP_WEBHOOK_ALLOW_PRIVATE_URLS', 'False') == 'True'
+
+# Idempotency-Key support: how long responses are replayable, how long the key
+# of a request whose worker died stays locked (running requests renew it), and
+# how long duplicates wait for the first response
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 10))
+
+# API keys: verified keys cached per process, and for how long at most
+API_KEY_CACHE_SIZE = int(os.environ.get('API_KEY_CACHE_SIZE', 10000))
+API_KEY_CACHE_TTL = int(os.environ.get('API_KEY_CACHE_TTL', 300))
+
+# How long an authenticated user is served from the cache; saving the user,
+# profile or organization invalidates it earlier
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 300))
+
+# JWT blacklist: revocations per refresh token lifetime each process's Bloom
+# filter is sized for; beyond that it only gets less selective
+AUTH_BLACKLIST_FILTER_CAPACITY = int(os.environ.get('AUTH_BLACKLIST_FILTER_CAPACITY', 1_000_000))
+AUTH_BLACKLIST_FILTER_ERROR_RATE = float(os.environ.get('AUTH_BLACKLIST_FILTER_ERROR_RATE', 0.01))
+
+# Email outbox (send_queued_emails): messages per round and connection, how
+# long a claimed message is leased, retry back-off and retention
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 100))
+EMAIL_OUTBOX_LEASE = int(os.environ.get('EMAIL_OUTBOX_LEASE', 300))
+EMAIL_OUTBOX_BACKOFF_BASE = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_BASE', 30))
+EMAIL_OUTBOX_BACKOFF_MAX = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_MAX', 60 * 60))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get('EMAIL_OUTBOX_RETENTION_DAYS', 30))
@@ -1,12 +1,12 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from rest_framework_simplejwt.views import TokenRefreshView
 
-from apps.dpp.views import ProductPassportViewSet
+from apps.dpp.views import ProductPassportViewSet, GS1ResolverView
 from apps.users.views import UserViewSet, CustomTokenObtainPairView
 
 # Create a router and register our viewsets
@@ -37,6 +37,9 @@ urlpatterns = [
     
     # DPP-specific API endpoints for Digital Product Passports
     path('api/passports/', include('apps.dpp.urls')),
+    
+    # GS1 Digital Link URIs encoded in retail barcodes, e.g. /01/<gtin>/21/<serial>
+    re_path(r'^(?P<path>01/.+?)/?$', GS1ResolverView.as_view(), name='gs1-digital-link'),
 ]
 
 # Serve media files in development
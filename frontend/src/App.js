@@ -4,6 +4,7 @@ import Header from './components/Header';
 import Footer from './components/Footer';
 import HomePage from './pages/HomePage';
 import PassportViewerPage from './pages/PassportViewerPage';
+import ScannedPassportPage from './pages/ScannedPassportPage';
 import LoginPage from './pages/LoginPage';
 import RegisterPage from './pages/RegisterPage';
 import MagicLoginPage from './pages/MagicLoginPage';
@@ -22,6 +23,9 @@ function App() {
             {/* Public routes */}
             <Route path="/" element={<HomePage />} />
             <Route path="/passports/:id" element={<PassportViewerPage />} />
+            {/* GS1 Digital Link scans are redirected here */}
+            <Route path="/instances/:serial" element={<ScannedPassportPage />} />
+            <Route path="/products/:gtin" element={<ScannedPassportPage />} />
             <Route path="/login" element={<LoginPage />} />
             <Route path="/register" element={<RegisterPage />} />
             <Route path="/magic-login/:token" element={<MagicLoginPage />} />
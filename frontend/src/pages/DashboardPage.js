@@ -1,6 +1,10 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { subscribeToChanges } from '../services/api';
+
+const RELOAD_DELAY_MS = 1000;
+const RELOAD_JITTER_MS = 4000;
 
 /**
  * DashboardPage Component
@@ -13,6 +17,7 @@ const DashboardPage = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [user, setUser] = useState(null);
+  const [refreshKey, setRefreshKey] = useState(0);
   const navigate = useNavigate();
 
   // Check if user is authenticated
@@ -72,6 +77,30 @@ const DashboardPage = () => {
     if (user) {
       fetchCompanyPassports();
     }
+  }, [user, refreshKey]);
+
+  // Reload when a passport changes instead of polling. Passport changes go
+  // to every dashboard, so a burst of them is folded into one reload, and
+  // the delay is spread so dashboards do not all refetch at the same moment
+  useEffect(() => {
+    if (!user) return undefined;
+    let reloadTimer = null;
+    const reload = () => {
+      if (reloadTimer) return;
+      reloadTimer = setTimeout(() => {
+        reloadTimer = null;
+        setRefreshKey((key) => key + 1);
+      }, RELOAD_DELAY_MS + Math.random() * RELOAD_JITTER_MS);
+    };
+    const unsubscribe = subscribeToChanges((change) => {
+      if (change.resource === 'passport') {
+        reload();
+      }
+    }, reload);
+    return () => {
+      clearTimeout(reloadTimer);
+      unsubscribe();
+    };
   }, [user]);
 
   const handleLogout = () => {
@@ -0,0 +1,92 @@
+import React, { useState, useEffect } from 'react';
+import { useParams, Link } from 'react-router-dom';
+import axios from 'axios';
+
+/**
+ * ScannedPassportPage Component
+ *
+ * Landing page of a scanned GS1 Digital Link. The backend resolver redirects
+ * browsers here with either the serial number of a product instance
+ * (/instances/:serial) or the GTIN of a product (/products/:gtin).
+ */
+const ScannedPassportPage = () => {
+  const { serial, gtin } = useParams();
+  const [passport, setPassport] = useState(null);
+  const [error, setError] = useState(null);
+
+  useEffect(() => {
+    const url = serial
+      ? `/api/dpp/product-passport/${encodeURIComponent(serial)}/`
+      : `/01/${encodeURIComponent(gtin)}?format=json`;
+    setPassport(null);
+    setError(null);
+    axios.get(url)
+      .then((response) => setPassport(response.data))
+      .catch(() => setError('No passport was found for this product.'));
+  }, [serial, gtin]);
+
+  if (error) {
+    return (
+      <div className="bg-red-100 border-l-4 border-red-500 p-4 mb-4">
+        <p className="text-red-700">{error}</p>
+      </div>
+    );
+  }
+
+  if (!passport) {
+    return (
+      <div className="flex justify-center items-center py-12">
+        <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-blue-600"></div>
+      </div>
+    );
+  }
+
+  const instance = passport.specific_instance;
+
+  return (
+    <div>
+      <div className="mb-4">
+        <Link to="/" className="text-blue-600 hover:text-blue-800">
+          &larr; Back to all passports
+        </Link>
+      </div>
+
+      <div className="bg-white rounded shadow-md p-6 mb-6">
+        <div className="border-b-2 border-blue-600 pb-4 mb-4">
+          <h1 className="text-3xl font-bold text-blue-600">{passport.name}</h1>
+          {instance && <p className="text-gray-600">Serial number: {instance.serial_number}</p>}
+          {gtin && <p className="text-gray-600">GTIN: {gtin}</p>}
+        </div>
+
+        {passport.supply_chain_events && passport.supply_chain_events.length > 0 && (
+          <div className="mb-6">
+            <h2 className="text-xl font-semibold text-blue-600 mb-2">Supply chain</h2>
+            <ul>
+              {passport.supply_chain_events.map((event) => (
+                <li key={event.id} className="border-t py-2">
+                  {new Date(event.date).toLocaleDateString()} &ndash; {event.event_type}
+                  {event.location && ` (${event.location})`}
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
+
+        {passport.repair_records && passport.repair_records.length > 0 && (
+          <div>
+            <h2 className="text-xl font-semibold text-blue-600 mb-2">Repairs</h2>
+            <ul>
+              {passport.repair_records.map((repair) => (
+                <li key={repair.id} className="border-t py-2">
+                  {new Date(repair.repair_date).toLocaleDateString()} &ndash; {repair.issue}
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
+      </div>
+    </div>
+  );
+};
+
+export default ScannedPassportPage;
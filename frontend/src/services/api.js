@@ -81,6 +81,69 @@ export const callApi = async (method, endpoint, data = null, options = {}) => {
   }
 };
 
+// Type-ahead suggestions for 'products', 'materials' or 'organizations' names
+export const autocomplete = async (kind, query, limit = 10) => {
+  const data = await callApi('get', `/dpp/autocomplete/${kind}/`, { q: query, limit });
+  return data.results;
+};
+
+// Live change notifications (Server-Sent Events) for the user's organization.
+// onChange receives {resource, ids, action}; onResync is called when events
+// were missed and lists should be reloaded. Returns a function that closes
+// the stream.
+//
+// EventSource cannot send the access token as a header, and a token in the
+// URL would end up in server logs, so each connection uses a single-use
+// ticket. The browser's own reconnect would reuse a spent ticket, so a lost
+// connection is reopened here with a fresh one.
+export const subscribeToChanges = (onChange, onResync = () => {}) => {
+  let source = null;
+  let retryTimer = null;
+  let closed = false;
+
+  const connect = async () => {
+    const token = localStorage.getItem('accessToken') || localStorage.getItem('token');
+    let query = '';
+    if (token) {
+      try {
+        const response = await api.post('/api/dpp/events/stream/ticket/', null, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+        query = `?ticket=${encodeURIComponent(response.data.ticket)}`;
+      } catch (error) {
+        if (!closed) retryTimer = setTimeout(reconnect, 30000);
+        return;
+      }
+    }
+    if (closed) return;
+    source = new EventSource(`${BACKEND_URL}/api/dpp/events/stream/${query}`, { withCredentials: !token });
+    source.addEventListener('change', (event) => onChange(JSON.parse(event.data)));
+    source.addEventListener('resync', () => {
+      // The server dropped this stream; reload and reconnect
+      source.close();
+      reconnect();
+    });
+    source.addEventListener('error', () => {
+      source.close();
+      retryTimer = setTimeout(reconnect, 3000);
+    });
+  };
+
+  const reconnect = () => {
+    if (closed) return;
+    // Changes made while disconnected were missed
+    onResync();
+    connect();
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (source) source.close();
+  };
+};
+
 // Function to test backend connectivity
 export const testBackendConnection = async () => {
   try {
@@ -94,11 +94,13 @@ class DPP_Connector {
         // Admin includes
         if (is_admin()) {
             include_once DPP_CONNECTOR_PLUGIN_DIR . 'includes/admin/class-dpp-admin.php';
+            new DPP_Admin();
         }
 
         // Core includes
         include_once DPP_CONNECTOR_PLUGIN_DIR . 'includes/class-dpp-api.php';
         include_once DPP_CONNECTOR_PLUGIN_DIR . 'includes/class-dpp-product-sync.php';
+        include_once DPP_CONNECTOR_PLUGIN_DIR . 'includes/class-dpp-batch-sync.php';
     }
 
     /**
@@ -119,6 +121,9 @@ class DPP_Connector {
         
         // Product save hook
         add_action('woocommerce_process_product_meta', array($this, 'sync_product_on_save'), 10, 1);
+        
+        // Background batch sync
+        add_action(DPP_Batch_Sync::ACTION, array($this, 'sync_products'), 10, 1);
     }
 
     /**
@@ -178,18 +183,26 @@ class DPP_Connector {
      * @param int $product_id
      */
     public function sync_product_on_save($product_id) {
-        // Get the product
-        $product = wc_get_product($product_id);
-        
         // Check if passport sync is enabled for this product
         $sync_enabled = get_post_meta($product_id, '_dpp_sync_enabled', true);
         
         if ($sync_enabled === 'yes') {
-            // Create or update the passport
-            $this->sync_product($product);
+            // Create or update the passport in the background
+            DPP_Batch_Sync::schedule(array($product_id));
         }
     }
 
+    /**
+     * Sync products with DPP API in batches
+     *
+     * @param array $product_ids
+     * @return array
+     */
+    public function sync_products($product_ids) {
+        $sync = new DPP_Batch_Sync();
+        return $sync->sync_products($product_ids);
+    }
+
     /**
      * Sync product with DPP API
      *
@@ -169,14 +169,7 @@ class DPP_Admin {
             update_post_meta($post_id, '_dpp_materials', sanitize_textarea_field($_POST['_dpp_materials']));
         }
         
-        // If sync is enabled, trigger sync
-        if ($sync_enabled === 'yes') {
-            $product = wc_get_product($post_id);
-            DPP_Connector()->sync_product($product);
-            
-            // Update last sync time
-            update_post_meta($post_id, '_dpp_last_sync', time());
-        }
+        // The sync itself is queued by DPP_Connector::sync_product_on_save()
     }
 
     /**
@@ -210,23 +203,15 @@ class DPP_Admin {
             return $redirect_to;
         }
         
-        $synced_count = 0;
-        
         foreach ($post_ids as $post_id) {
             // Enable DPP sync for the product
             update_post_meta($post_id, '_dpp_sync_enabled', 'yes');
-            
-            // Sync the product
-            $product = wc_get_product($post_id);
-            $synced = DPP_Connector()->sync_product($product);
-            
-            if ($synced) {
-                $synced_count++;
-                update_post_meta($post_id, '_dpp_last_sync', time());
-            }
         }
         
-        $redirect_to = add_query_arg('dpp_synced_count', $synced_count, $redirect_to);
+        // Sync the products in the background
+        $queued_count = DPP_Batch_Sync::schedule($post_ids);
+        
+        $redirect_to = add_query_arg('dpp_queued_count', $queued_count, $redirect_to);
         
         return $redirect_to;
     }
@@ -235,13 +220,13 @@ class DPP_Admin {
      * Bulk action admin notice
      */
     public function bulk_action_admin_notice() {
-        if (!empty($_REQUEST['dpp_synced_count'])) {
-            $count = intval($_REQUEST['dpp_synced_count']);
+        if (!empty($_REQUEST['dpp_queued_count'])) {
+            $count = intval($_REQUEST['dpp_queued_count']);
             
             $message = sprintf(
                 _n(
-                    'Synced %s product with Digital Product Passport.',
-                    'Synced %s products with Digital Product Passport.',
+                    'Queued %s product for sync with Digital Product Passport.',
+                    'Queued %s products for sync with Digital Product Passport.',
                     $count,
                     'dpp-connector'
                 ),
@@ -16,6 +16,19 @@ if (!defined('ABSPATH')) {
  * DPP_API class
  */
 class DPP_API {
+    /**
+     * Number of attempts for mutating requests
+     *
+     * Retries reuse the request's Idempotency-Key, so the API replays the
+     * first response instead of e.g. creating a second passport.
+     */
+    const MAX_ATTEMPTS = 3;
+
+    /**
+     * Number of bulk upsert requests sent in parallel
+     */
+    const BATCH_CONCURRENCY = 4;
+
     /**
      * API base URL
      *
@@ -44,46 +57,150 @@ class DPP_API {
      * @param string $endpoint
      * @param string $method
      * @param array $data
+     * @param string|null $idempotency_key Reuse to make a repeated call safe; generated if omitted
      * @return array|WP_Error
      */
-    public function request($endpoint, $method = 'GET', $data = array()) {
-        $url = trailingslashit($this->api_url) . ltrim($endpoint, '/');
+    public function request($endpoint, $method = 'GET', $data = array(), $idempotency_key = null) {
+        $url = $this->get_url($endpoint);
         
         $args = array(
             'method'    => $method,
             'timeout'   => 30,
-            'headers'   => array(
-                'Content-Type'  => 'application/json',
-                'Accept'        => 'application/json',
-            ),
+            'headers'   => $this->get_headers(),
         );
         
-        // Add authentication if API key is available
-        if (!empty($this->api_key)) {
-            $args['headers']['Authorization'] = 'Bearer ' . $this->api_key;
-        }
-        
         // Add data for POST, PUT requests
-        if (in_array($method, array('POST', 'PUT')) && !empty($data)) {
+        if (in_array($method, array('POST', 'PUT', 'PATCH')) && !empty($data)) {
             $args['body'] = json_encode($data);
         }
         
-        // Make the request
-        $response = wp_remote_request($url, $args);
+        // Mutating requests are retried under one Idempotency-Key
+        $attempts = 1;
+        if (in_array($method, array('POST', 'PUT', 'PATCH'))) {
+            $args['headers']['Idempotency-Key'] = $idempotency_key ? $idempotency_key : wp_generate_uuid4();
+            $attempts = self::MAX_ATTEMPTS;
+        }
+        
+        for ($attempt = 1; $attempt <= $attempts; $attempt++) {
+            $response = wp_remote_request($url, $args);
+            $code = is_wp_error($response) ? 0 : wp_remote_retrieve_response_code($response);
+            
+            if ($attempt < $attempts && $this->is_retryable($code)) {
+                usleep(250000 * $attempt);
+                continue;
+            }
+            break;
+        }
         
         // Check for errors
         if (is_wp_error($response)) {
             return $response;
         }
         
-        // Parse response
-        $code = wp_remote_retrieve_response_code($response);
-        $body = wp_remote_retrieve_body($response);
+        return $this->parse_response($code, wp_remote_retrieve_body($response));
+    }
+
+    /**
+     * Send several bulk upserts of passports concurrently
+     *
+     * Batches go out in groups of BATCH_CONCURRENCY parallel requests on one
+     * cURL multi handle, which reuses its keep-alive connections to the API
+     * for the batches of a group. A batch that fails in transport or with a
+     * retryable status is retried by request() under the same
+     * Idempotency-Key, so a batch the API did apply is not applied twice.
+     *
+     * @param array $batches Lists of passport data, see bulk_upsert_passports()
+     * @return array Result or WP_Error for each batch, keyed like $batches
+     */
+    public function bulk_upsert_passports_multiple($batches) {
+        $requests_class = class_exists('\WpOrg\Requests\Requests') ? '\WpOrg\Requests\Requests' : 'Requests';
+        $results = array();
+        
+        foreach (array_chunk($batches, self::BATCH_CONCURRENCY, true) as $group) {
+            $keys = array();
+            $requests = array();
+            foreach ($group as $index => $passports) {
+                $keys[$index] = wp_generate_uuid4();
+                $requests[$index] = array(
+                    'url'     => $this->get_url('passports/bulk_upsert/'),
+                    'type'    => 'POST',
+                    'headers' => array_merge($this->get_headers(), array('Idempotency-Key' => $keys[$index])),
+                    'data'    => json_encode(array('passports' => $passports)),
+                );
+            }
+            
+            $responses = $requests_class::request_multiple($requests, array('timeout' => 30));
+            
+            foreach ($group as $index => $passports) {
+                $response = isset($responses[$index]) ? $responses[$index] : null;
+                // Failed transfers come back as exceptions instead of responses
+                $code = is_object($response) && isset($response->status_code) ? (int) $response->status_code : 0;
+                if ($this->is_retryable($code)) {
+                    $results[$index] = $this->bulk_upsert_passports($passports, $keys[$index]);
+                } else {
+                    $results[$index] = $this->parse_response($code, $response->body);
+                }
+            }
+        }
+        
+        return $results;
+    }
+
+    /**
+     * Build the URL of an API endpoint
+     *
+     * @param string $endpoint
+     * @return string
+     */
+    private function get_url($endpoint) {
+        return trailingslashit($this->api_url) . ltrim($endpoint, '/');
+    }
+
+    /**
+     * Get the headers sent with every request
+     *
+     * @return array
+     */
+    private function get_headers() {
+        $headers = array(
+            'Content-Type'  => 'application/json',
+            'Accept'        => 'application/json',
+        );
+        
+        // Add authentication if API key is available
+        if (!empty($this->api_key)) {
+            $headers['Authorization'] = 'Bearer ' . $this->api_key;
+        }
+        
+        return $headers;
+    }
+
+    /**
+     * Whether a request that ended with $code may succeed when repeated
+     *
+     * Covers transport errors (0), server errors and a still running
+     * first attempt under the same Idempotency-Key (409).
+     *
+     * @param int $code HTTP status, 0 if no response arrived
+     * @return bool
+     */
+    private function is_retryable($code) {
+        return $code === 0 || $code >= 500 || $code === 409;
+    }
+
+    /**
+     * Decode a response body, turning error statuses into a WP_Error
+     *
+     * @param int $code
+     * @param string $body
+     * @return array|WP_Error
+     */
+    private function parse_response($code, $body) {
         $data = json_decode($body, true);
         
         // Handle error responses
         if ($code >= 400) {
-            $error_message = isset($data['detail']) ? $data['detail'] : 'Unknown API error';
+            $error_message = isset($data['detail']) ? $data['detail'] : (isset($data['error']) ? $data['error'] : 'Unknown API error');
             return new WP_Error('dpp_api_error', $error_message, array('status' => $code));
         }
         
@@ -99,6 +216,29 @@ class DPP_API {
         return $this->request('passports/');
     }
 
+    /**
+     * Get changes since a cursor from the change feed
+     *
+     * Returns array('changes' => ..., 'cursor' => ..., 'has_more' => bool).
+     * Store the returned cursor and pass it on the next call; deleted
+     * objects are reported with action 'delete'.
+     *
+     * @param string $cursor Cursor from the previous call, empty to start over
+     * @param array $resources Resource names, e.g. array('passport', 'product')
+     * @param int $limit
+     * @return array|WP_Error
+     */
+    public function get_changes($cursor = '', $resources = array(), $limit = 500) {
+        $query = array('limit' => $limit);
+        if (!empty($cursor)) {
+            $query['cursor'] = $cursor;
+        }
+        if (!empty($resources)) {
+            $query['resource'] = implode(',', $resources);
+        }
+        return $this->request('changes/?' . http_build_query($query));
+    }
+
     /**
      * Get a single passport
      *
@@ -130,6 +270,21 @@ class DPP_API {
         return $this->request('passports/' . $id . '/', 'PUT', $data);
     }
 
+    /**
+     * Create or update passports by QR code in one request
+     *
+     * Returns array('results' => ..., 'created' => ..., 'updated' => ...,
+     * 'unchanged' => ...) with one array('qr_code', 'id', 'status') result per
+     * passport. The API accepts up to 500 passports per request.
+     *
+     * @param array $passports List of passport data
+     * @param string|null $idempotency_key
+     * @return array|WP_Error
+     */
+    public function bulk_upsert_passports($passports, $idempotency_key = null) {
+        return $this->request('passports/bulk_upsert/', 'POST', array('passports' => $passports), $idempotency_key);
+    }
+
     /**
      * Delete a passport
      *
@@ -0,0 +1,160 @@
+<?php
+/**
+ * DPP Batch Sync Class
+ *
+ * Synchronizes many WooCommerce products with the DPP API in the background.
+ *
+ * @package DPP_Connector
+ */
+
+// Exit if accessed directly
+if (!defined('ABSPATH')) {
+    exit;
+}
+
+/**
+ * DPP_Batch_Sync class
+ *
+ * Products are queued as background jobs (Action Scheduler, or WP-Cron
+ * without WooCommerce's scheduler), so saving a product or running the bulk
+ * action does not wait for the API. A job skips products whose passport
+ * data hash matches the one stored at their last sync, and sends the rest
+ * as bulk upserts of BATCH_SIZE passports, several batches at a time.
+ */
+class DPP_Batch_Sync {
+    /**
+     * Hook run by the background jobs
+     */
+    const ACTION = 'dpp_connector_sync_products';
+
+    /**
+     * Action Scheduler group of the jobs
+     */
+    const GROUP = 'dpp-connector';
+
+    /**
+     * Passports per bulk upsert request
+     */
+    const BATCH_SIZE = 100;
+
+    /**
+     * Products per background job
+     */
+    const PRODUCTS_PER_JOB = 1000;
+
+    /**
+     * API instance
+     *
+     * @var DPP_API
+     */
+    private $api;
+
+    /**
+     * Product sync instance
+     *
+     * @var DPP_Product_Sync
+     */
+    private $product_sync;
+
+    /**
+     * Constructor
+     */
+    public function __construct() {
+        $this->api = new DPP_API();
+        $this->product_sync = new DPP_Product_Sync();
+    }
+
+    /**
+     * Queue products for a background sync
+     *
+     * @param array $product_ids
+     * @return int Number of queued products
+     */
+    public static function schedule($product_ids) {
+        $product_ids = array_values(array_unique(array_map('intval', $product_ids)));
+        
+        foreach (array_chunk($product_ids, self::PRODUCTS_PER_JOB) as $chunk) {
+            $args = array($chunk);
+        
+            if (function_exists('as_enqueue_async_action')) {
+                if (!as_has_scheduled_action(self::ACTION, $args, self::GROUP)) {
+                    as_enqueue_async_action(self::ACTION, $args, self::GROUP);
+                }
+            } elseif (!wp_next_scheduled(self::ACTION, $args)) {
+                wp_schedule_single_event(time(), self::ACTION, $args);
+            }
+        }
+        
+        return count($product_ids);
+    }
+
+    /**
+     * Sync products with the DPP API
+     *
+     * Products without DPP sync enabled are ignored.
+     *
+     * @param array $product_ids
+     * @return array Counts of 'synced', 'skipped' and 'failed' products
+     */
+    public function sync_products($product_ids) {
+        $stats = array('synced' => 0, 'skipped' => 0, 'failed' => 0);
+        $pending = array();
+        $batches = array();
+        $batch = array();
+        
+        // Load the meta of all products in one query
+        update_meta_cache('post', $product_ids);
+        
+        foreach ($product_ids as $product_id) {
+            if (get_post_meta($product_id, '_dpp_sync_enabled', true) !== 'yes') {
+                continue;
+            }
+        
+            $product = wc_get_product($product_id);
+            if (!$product) {
+                continue;
+            }
+        
+            $passport_data = $this->product_sync->prepare_passport_data($product);
+            $sync_hash = $this->product_sync->get_sync_hash($passport_data);
+        
+            if ($this->product_sync->is_synced($product_id, $sync_hash)) {
+                $stats['skipped']++;
+                continue;
+            }
+        
+            $pending[$passport_data['qr_code']] = array($product_id, $sync_hash);
+            $batch[] = $passport_data;
+        
+            if (count($batch) >= self::BATCH_SIZE) {
+                $batches[] = $batch;
+                $batch = array();
+            }
+        }
+        
+        if (!empty($batch)) {
+            $batches[] = $batch;
+        }
+        
+        if (empty($batches)) {
+            return $stats;
+        }
+        
+        foreach ($this->api->bulk_upsert_passports_multiple($batches) as $index => $result) {
+            if (is_wp_error($result)) {
+                // Failed products keep their old hash and are sent again next time
+                error_log('DPP Batch Sync Error: ' . $result->get_error_message());
+                $stats['failed'] += count($batches[$index]);
+                continue;
+            }
+        
+            foreach ($result['results'] as $item) {
+                list($product_id, $sync_hash) = $pending[$item['qr_code']];
+                $this->product_sync->mark_synced($product_id, $item['id'], $sync_hash);
+                $stats['synced']++;
+            }
+        }
+        
+        return $stats;
+    }
+}
@@ -47,17 +47,18 @@ class DPP_Product_Sync {
         
         // Prepare passport data
         $passport_data = $this->prepare_passport_data($product);
+        $sync_hash = $this->get_sync_hash($passport_data);
+        
+        // Nothing changed since the last successful sync
+        if ($this->is_synced($product_id, $sync_hash)) {
+            return true;
+        }
         
         // If we have a passport ID, update it, otherwise create a new one
         if ($passport_id) {
             $result = $this->api->update_passport($passport_id, $passport_data);
         } else {
             $result = $this->api->create_passport($passport_data);
-            
-            // Store the passport ID in the product meta
-            if (!is_wp_error($result) && isset($result['id'])) {
-                update_post_meta($product_id, '_dpp_passport_id', $result['id']);
-            }
         }
         
         // Check if the request was successful
@@ -67,19 +68,58 @@ class DPP_Product_Sync {
             return false;
         }
         
-        // Update last sync time
-        update_post_meta($product_id, '_dpp_last_sync', time());
+        $this->mark_synced($product_id, isset($result['id']) ? $result['id'] : $passport_id, $sync_hash);
         
         return true;
     }
 
+    /**
+     * Get the hash of the passport data last sent for a product
+     *
+     * @param array $passport_data
+     * @return string
+     */
+    public function get_sync_hash($passport_data) {
+        return md5(wp_json_encode($passport_data));
+    }
+
+    /**
+     * Check whether a product's passport is up to date with $sync_hash
+     *
+     * Delete the _dpp_sync_hash meta to force the next sync.
+     *
+     * @param int $product_id
+     * @param string $sync_hash
+     * @return bool
+     */
+    public function is_synced($product_id, $sync_hash) {
+        return get_post_meta($product_id, '_dpp_passport_id', true)
+            && get_post_meta($product_id, '_dpp_sync_hash', true) === $sync_hash;
+    }
+
+    /**
+     * Record a successful sync of a product
+     *
+     * @param int $product_id
+     * @param string $passport_id
+     * @param string $sync_hash
+     */
+    public function mark_synced($product_id, $passport_id, $sync_hash) {
+        // Store the passport ID in the product meta
+        update_post_meta($product_id, '_dpp_passport_id', $passport_id);
+        update_post_meta($product_id, '_dpp_sync_hash', $sync_hash);
+        
+        // Update last sync time
+        update_post_meta($product_id, '_dpp_last_sync', time());
+    }
+
     /**
      * Prepare passport data from product
      *
      * @param WC_Product $product
      * @return array
      */
-    private function prepare_passport_data($product) {
+    public function prepare_passport_data($product) {
         $product_id = $product->get_id();
         
         // Generate a unique QR code if not already set